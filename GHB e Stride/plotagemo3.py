@@ -7,7 +7,7 @@ print("Diretório atual:", os.getcwd())
 print("Arquivo encontrado?", os.path.exists("resultados.txt"))
 # Verifica se o arquivo de resultados existe
 if not os.path.exists("resultados.txt"):
-    print("Erro: O arquivo 'resultados.txt' não foi encontrado. Execute o código em C primeiro.")
+    print("Erro: O arquivo 'resultados.txt' não foi encontrado. Execute python/prefetchers.py primeiro.")
     exit()
 
 # Inicializar variáveis
@@ -16,6 +16,8 @@ ghb_miss_rate = 0
 stride_miss_count = 0
 ghb_miss_count = 0
 num_instr = 0
+# Métricas medidas pelo simulador (python/prefetchers.py), em %
+medidas = {}
 
 # Ler os dados do arquivo `resultados.txt`
 with open("resultados.txt", "r") as file:
@@ -32,6 +34,8 @@ with open("resultados.txt", "r") as file:
             ghb_miss_count = int(parts[1])
         elif parts[0] == "Total_Instrucoes":
             num_instr = int(parts[1])
+        elif parts[0].startswith(("Precisao_", "Cobertura_", "Pontualidade_", "Trafego_Extra_")):
+            medidas[parts[0]] = float(parts[1])
 
 # Criar fontes de dados para gráficos interativos
 protocolos = ["Stride", "GHB"]
@@ -80,6 +84,27 @@ p2.y_range.start = 0
 p2.yaxis.axis_label = "Quantidade"
 p2.xaxis.axis_label = "Métodos e Métricas"
 
+# Criar o gráfico de precisão, cobertura e pontualidade de cada método
+metricas = ["Precisao", "Cobertura", "Pontualidade"]
+data_qualidade = [(metodo, metrica) for metodo in protocolos for metrica in metricas]
+source_qualidade = ColumnDataSource(data=dict(
+    categorias=data_qualidade,
+    valores=[medidas.get(f"{metrica}_{metodo}", 0) for metodo, metrica in data_qualidade],
+    cores=[cor for cor in cores for _ in metricas]
+))
+
+p3 = figure(x_range=FactorRange(*data_qualidade), height=500, width=600,
+            title=f"Qualidade do Prefetch (tráfego extra: Stride {medidas.get('Trafego_Extra_Stride', 0):.0f}, "
+                  f"GHB {medidas.get('Trafego_Extra_GHB', 0):.0f} transações)",
+            tools="pan,box_zoom,reset,save,hover", tooltips=[("Valor", "@valores%")])
+
+p3.vbar(x='categorias', top='valores', width=0.6, source=source_qualidade, color='cores')
+
+p3.xgrid.grid_line_color = None
+p3.y_range.start = 0
+p3.yaxis.axis_label = "%"
+p3.xaxis.axis_label = "Métodos e Métricas"
+
 # **📌 Criar o HTML para Visualização Offline**
 output_file("cache_miss_comparacao.html")
-show(row(p1, p2))  # Abre o navegador automaticamente com os gráficos
+show(row(p1, p2, p3))  # Abre o navegador automaticamente com os gráficos
@@ -1,6 +1,11 @@
-from random import randint
-import matplotlib.pyplot as plt
+from random import randint, Random
+from array import array
+from protocolos import (PROTOCOLS, LOCAL_EVENTS, BUS_ACTIONS, SNOOP_RESPONSES, BUS_EVENTS, HIT, NONE, BUS_RD,
+                        BUS_RDX, BUS_UPGR, BUS_UPD, BUS_RD_UPD, FLUSH)
 NULL = None
+# Versão da semântica da simulação: mude quando uma alteração mudar as métricas produzidas
+# (invalida resultados guardados em cache_resultados.py)
+SIMULATOR_VERSION = "1"
 
 
 class Metrics:
@@ -14,28 +19,206 @@ class Metrics:
         self.cache_misses = 0  # Número de cache misses
         self.total_instructions = 0  # Total de instruções executadas
 
+        # Substituições de linhas (misses de capacidade e de conflito)
+        self.evictions = 0  # Linhas removidas da cache para abrir espaço
+        self.capacity_evictions = 0  # Substituições com a cache inteira cheia
+        self.conflict_evictions = 0  # Substituições com linhas livres em outros conjuntos
+        self.writebacks = 0  # Linhas sujas (M/O) escritas na memória ao serem substituídas
+
+        # Snoops
+        self.bus_transactions = 0  # Transações no bus (BusRd, BusRdX, BusUpgr, BusUpd)
+        self.snoop_lookups = 0  # Consultas feitas às caches dos outros processadores
+        self.snoop_lookups_avoided = 0  # Consultas evitadas pelo diretório
+
         # Custos em ciclos para diferentes operações
         self.memory_access_cycles = 100  # Acesso à memória principal
         self.cache_access_cycles = 1  # Acesso à cache
         self.bus_cycles = 2  # Operações no bus
         self.compute_cost = 1  # Custo de computação
 
-# Protocolo de coerência de cache (MESI ou MOESI)
+        # Tráfego de coerência por processador e por endereço
+        self.traffic = TrafficCounters()
+
+
+# Contadores de tráfego de coerência (índices em TrafficCounters)
+TRAFFIC_FIELDS = [
+    "bus_reads",  # BusRd enviados
+    "bus_read_exclusives",  # BusRdX enviados
+    "bus_upgrades",  # BusUpgr enviados
+    "bus_updates",  # BusUpd enviados (protocolos de atualização)
+    "invalidations_sent",  # Cópias de outras caches invalidadas pelos snoops deste processador
+    "invalidations_received",  # Cópias deste processador invalidadas por snoops de outros
+    "dirty_writebacks",  # Linhas sujas escritas na memória (flush em snoop ou substituição)
+    "cache_to_cache_transfers",  # Dados fornecidos por esta cache a outra
+    "writebacks_avoided",  # BusRd atendidos por uma linha suja que continuou suja (O) sem ir à memória
+]
+BUS_READS, BUS_READ_EXCLUSIVES, BUS_UPGRADES, BUS_UPDATES, INVALIDATIONS_SENT, INVALIDATIONS_RECEIVED, \
+    DIRTY_WRITEBACKS, CACHE_TO_CACHE_TRANSFERS, WRITEBACKS_AVOIDED = range(len(TRAFFIC_FIELDS))
+EVENT_TRAFFIC = [NULL, BUS_READS, BUS_READ_EXCLUSIVES, BUS_UPGRADES, BUS_UPDATES]  # Indexado pelo evento de bus
+
+
+class AddressRows(dict):
+    # Endereço -> contadores, criados no primeiro acesso (a consulta de um endereço já
+    # visto não passa por código Python)
+    def __missing__(self, address):
+        row = self[address] = [0] * len(TRAFFIC_FIELDS)
+        return row
+
+
+class TrafficCounters:
+    # Uma lista de contadores por processador e outra por endereço tocado pelo bus. Só é
+    # atualizado em transações de bus, nunca em hits, então o custo fica fora do caminho comum.
+    def __init__(self, track_addresses=True):
+        self.track_addresses = track_addresses
+        self.per_processor = []
+        self.per_address = AddressRows()
+        self.untracked = [0] * len(TRAFFIC_FIELDS)  # Linha descartável quando não há rastreio por endereço
+
+    def add_processor(self):
+        self.per_processor.append([0] * len(TRAFFIC_FIELDS))
+
+    def address_row(self, address):
+        # Contadores do endereço, criados no primeiro uso
+        return self.per_address[address] if self.track_addresses else self.untracked
+
+    def add(self, processor_no, address, field):
+        self.per_processor[processor_no][field] += 1
+        if self.track_addresses:
+            self.per_address[address][field] += 1
+
+    def totals(self):
+        return {name: sum(counters[field] for counters in self.per_processor)
+                for field, name in enumerate(TRAFFIC_FIELDS)}
+
+    def report(self, per_address=True):
+        report = {
+            "totals": self.totals(),
+            "per_processor": [dict(zip(TRAFFIC_FIELDS, counters)) for counters in self.per_processor],
+        }
+        if per_address:
+            report["per_address"] = {address: dict(zip(TRAFFIC_FIELDS, counters))
+                                     for address, counters in sorted(self.per_address.items())}
+        return report
+
+# Nomes dos custos em ciclos configuráveis do Metrics
+COST_FIELDS = ["memory_access_cycles", "cache_access_cycles", "bus_cycles", "compute_cost"]
+
+# Bits de Bus.last_bus_action: ações de bus realizadas pela instrução atual
+ACTION_BITS = {BUS_RD: 1, BUS_RDX: 2, BUS_UPGR: 4, BUS_UPD: 8}
+FLUSH_BIT = 16  # Linha suja escrita na memória ao responder um snoop
+WRITEBACK_BIT = 32  # Linha suja escrita na memória ao ser substituída
+ACTION_BIT_NAMES = [(1, "BusRd"), (2, "BusRdX"), (4, "BusUpgr"), (8, "BusUpd"), (FLUSH_BIT, "Flush"),
+                    (WRITEBACK_BIT, "WB")]
+
+
+def describe_actions(actions):
+    # Converte os bits de last_bus_action em texto, ex.: "BusRd+Flush"
+    return "+".join(name for bit, name in ACTION_BIT_NAMES if actions & bit) or NULL
+
+
+# Protocolo de coerência de cache. Carrega a tabela de transições de protocolos.py
+# compilada em listas planas indexadas por estado * 2 + evento (locais) e
+# estado * BUS_EVENTS + evento de bus (snoops), com os estados codificados como inteiros.
 class Protocol:
     def __init__(self, protocol_type="MESI"):
+        if protocol_type not in PROTOCOLS:
+            raise ValueError(f"Protocolo desconhecido: {protocol_type}")
+        table = PROTOCOLS[protocol_type]
         self.type = protocol_type
-        # Estados válidos para cada protocolo
-        # MESI: Modified, Exclusive, Shared, Invalid
-        # MOESI: Modified, Owned, Exclusive, Shared, Invalid
-        self.valid_states = ["M", "E", "S", "I"] if protocol_type == "MESI" else ["M", "O", "E", "S", "I"]
+        # Estados válidos para cada protocolo (ex.: MESI: I, S, E, M; MOESI: I, S, E, O, M)
+        self.valid_states = list(table["states"])
+        self.state_codes = {name: code for code, name in enumerate(self.valid_states)}
+        codes = self.state_codes
+        size = len(self.valid_states)
+
+        self.dirty = [name in table["dirty"] for name in self.valid_states]
+        self.action = [NONE] * (size * 2)
+        self.next_shared = [0] * (size * 2)
+        self.next_alone = [0] * (size * 2)
+        self.cost_field = [HIT] * (size * 2)
+        self.cost = [0] * (size * 2)
+        for (state, event), (action, next_shared, next_alone, cost) in table["local"].items():
+            index = codes[state] * 2 + LOCAL_EVENTS[event]
+            self.action[index] = BUS_ACTIONS[action]
+            self.next_shared[index] = codes[next_shared]
+            self.next_alone[index] = codes[next_alone]
+            self.cost_field[index] = cost
+
+        # Sem entrada na tabela o snoop mantém o estado e não responde
+        self.snoop_next = [state for state in range(size) for _ in range(BUS_EVENTS)]
+        self.snoop_response = [0] * (size * BUS_EVENTS)
+        for (state, event), (next_state, response) in table["snoop"].items():
+            index = codes[state] * BUS_EVENTS + BUS_ACTIONS[event]
+            self.snoop_next[index] = codes[next_state]
+            self.snoop_response[index] = SNOOP_RESPONSES[response]
+
+    def bind_costs(self, metrics):
+        # Resolve os custos da tabela com os valores do Metrics (refeito quando os custos mudam)
+        self.cost = [getattr(metrics, field) for field in self.cost_field]
 
 
 class sharedMemory:
-    def __init__(self):
-        # Status de cada bloco (limpo/sujo)
-        self.data = [randint(0, 1000) for x in range(4)]
-        # Status de cada bloco (limpo/sujo)
-        self.status = ["clean" for x in range(4)]
+    # Memória paginada e alocada sob demanda: só as páginas tocadas existem. Cada página guarda
+    # os valores dos blocos em um array e o status (limpo/sujo) em um bitset, então um espaço
+    # de endereços grande (ex.: 2**48 blocos) só custa memória pelas páginas usadas. O valor
+    # inicial aleatório de cada bloco só é sorteado no primeiro acesso (-1 = ainda não sorteado).
+    def __init__(self, size=4, page_size=512):
+        if page_size < 8 or page_size & (page_size - 1):
+            raise ValueError("O tamanho da página deve ser uma potência de 2 (mínimo 8)")
+        self.size = size
+        # Memórias pequenas usam uma página só do tamanho necessário
+        self.page_size = min(page_size, max(8, 1 << (size - 1).bit_length()))
+        self.shift = self.page_size.bit_length() - 1
+        self.mask = self.page_size - 1
+        self.pages = {}  # Número da página -> valores dos blocos
+        self.dirty = {}  # Número da página -> bitset de blocos sujos
+
+    def _page(self, number):
+        if number << self.shift >= self.size:
+            raise IndexError(f"Endereço fora da memória (página {number})")
+        page = self.pages[number] = array("q", [-1]) * self.page_size
+        self.dirty[number] = bytearray(self.page_size >> 3)
+        return page
+
+    def read(self, address):
+        page = self.pages.get(address >> self.shift)
+        if page is None:
+            page = self._page(address >> self.shift)
+        value = page[address & self.mask]
+        if value < 0:
+            # Valor inicial aleatório, como na memória original
+            value = page[address & self.mask] = randint(0, 1000)
+        return value
+
+    def write(self, address, value):
+        # Escrita de uma linha suja de volta na memória: o bloco fica limpo
+        number = address >> self.shift
+        page = self.pages.get(number)
+        if page is None:
+            page = self._page(number)
+        offset = address & self.mask
+        page[offset] = value
+        self.dirty[number][offset >> 3] &= ~(1 << (offset & 7))
+
+    def set_dirty(self, address):
+        # Uma cache passou a ter a linha suja: o valor da memória está desatualizado
+        number = address >> self.shift
+        if number not in self.pages:
+            self._page(number)
+        offset = address & self.mask
+        self.dirty[number][offset >> 3] |= 1 << (offset & 7)
+
+    def is_dirty(self, address):
+        bits = self.dirty.get(address >> self.shift)
+        offset = address & self.mask
+        return bool(bits and bits[offset >> 3] >> (offset & 7) & 1)
+
+    def blocks(self, count=16):
+        # Valores dos primeiros blocos (para exibição)
+        return [self.read(address) for address in range(min(count, self.size))]
+
+    def allocated_bytes(self):
+        return sum(page.itemsize * len(page) + len(self.dirty[number]) for number, page in self.pages.items())
 
 
 class Bus:
@@ -43,161 +226,482 @@ class Bus:
         self.memory = memory
         self.protocol = protocol
         self.processors = [] # Lista de processadores
+        self.others = []  # Para cada processador, a lista dos demais (alvos do broadcast)
         # Informações da instrução atual
         self.instruction_processor = NULL
         self.instruction_type = NULL
         self.instruction_address = NULL
         self.instruction_value = NULL
+        # Ações de bus da instrução atual (bits de ACTION_BITS, FLUSH_BIT e WRITEBACK_BIT)
+        self.last_bus_action = 0
         self.metrics = Metrics()
+        protocol.bind_costs(self.metrics)
 
     def instruction(self, processor, r_w, address, value):
         self.instruction_processor = processor
         self.instruction_type = "reads" if r_w == 0 else "writes"
         self.instruction_address = address
         self.instruction_value = value
+        self.last_bus_action = 0
 
         self.metrics.total_instructions += 1
         # Executa instrução de leitura (r_w=0) ou escrita (r_w=1)
         if r_w:
             self.metrics.store_instructions += 1
-            self.processors[processor].writeValue(address, value)
         else:
             self.metrics.load_instructions += 1
-            self.processors[processor].readValue(address)
-
-    def bus_snoop(self, processor_no, address):
-        self.metrics.total_cycles += self.metrics.bus_cycles
-        invalidate_others = False
-        for proc in range(len(self.processors)):
-            if proc != processor_no and self.processors[proc].cache.address == address:
-                if self.protocol.type == "MOESI" and self.processors[proc].cache.state == "M":
-                    self.processors[proc].cache.state = "O"
+        self.processors[processor].access(r_w, address, value)
+
+    def connect(self, processor):
+        self.processors.append(processor)
+        self.metrics.traffic.add_processor()
+        # O novo processador entra nas listas dos demais e ganha a sua: O(P) por conexão
+        number = len(self.processors) - 1
+        for others in self.others:
+            others.append(number)
+        self.others.append(list(range(number)))
+
+    def snoop_targets(self, processor_no, address):
+        # Broadcast: todas as outras caches precisam ser consultadas
+        targets = self.others[processor_no]
+        self.metrics.snoop_lookups += len(targets)
+        return targets
+
+    def track_fill(self, processor_no, address):
+        # Chamado quando uma linha entra em uma cache (usado pelo diretório)
+        pass
+
+    def track_drop(self, processor_no, address):
+        # Chamado quando uma linha sai de uma cache (usado pelo diretório)
+        pass
+
+    def transaction(self, processor_no, action, address, value):
+        # Executa a ação de bus pedida pela tabela. Retorna se outra cache tinha a linha
+        # e o valor a carregar (de uma cache que forneceu o dado ou da memória).
+        if action == BUS_RD_UPD:
+            return self.read_update(self.snoop, processor_no, address, value)
+        return self.snoop(processor_no, action, address, value)
+
+    def read_update(self, snoop, processor_no, address, value):
+        # BusRd seguido de BusUpd se outra cache tinha a linha (write miss no Dragon)
+        shared, data = snoop(processor_no, BUS_RD, address, value)
+        if shared:
+            snoop(processor_no, BUS_UPD, address, value)
+        return shared, data
+
+    def snoop(self, processor_no, event, address, value):
+        metrics = self.metrics
+        metrics.total_cycles += metrics.bus_cycles
+        metrics.bus_transactions += 1
+        self.last_bus_action |= ACTION_BITS[event]
+        traffic = metrics.traffic
+        field = EVENT_TRAFFIC[event]
+        traffic.per_processor[processor_no][field] += 1
+        if traffic.track_addresses:
+            row = traffic.per_address[address]
+            row[field] += 1
+        else:
+            row = traffic.untracked
+        return self.snoop_caches(processor_no, event, address, value, self.snoop_targets(processor_no, address),
+                                 traffic.per_processor, row)
+
+    def snoop_caches(self, processor_no, event, address, value, targets, traffic, row):
+        # Aplica o evento de bus às caches alvo pela tabela de snoop do protocolo. traffic e row
+        # são os contadores do processador e do endereço; None no caminho funcional, que
+        # escreve flushes direto na memória sem ciclos nem contadores.
+        protocol = self.protocol
+        processors = self.processors
+        shared = False
+        data = NULL
+        for proc in targets:
+            cache = processors[proc].cache
+            slot = cache.slots.get(address, -1)
+            if slot == -1:
+                continue
+            shared = True
+            state = cache.states[slot]
+            index = state * BUS_EVENTS + event
+            response = protocol.snoop_response[index]
+            if response:
+                data = cache.values[slot]
+                if traffic is NULL:
+                    if response == FLUSH:
+                        self.memory.write(address, data)
                 else:
-                    self.processors[proc].cache.state = "I"
-                invalidate_others = True
-        return invalidate_others
-
-    def read_bus_snoop(self, processor_number, address):
-        self.metrics.total_cycles += self.metrics.bus_cycles
-        shared_copy_exists = False
-        for proc in range(len(self.processors)):
-            if proc != processor_number and self.processors[proc].cache.address == address:
-                if self.processors[proc].cache.state != "I":
-                    if self.protocol.type == "MOESI" and self.processors[proc].cache.state == "M":
-                        self.processors[proc].cache.state = "O"
-                    else:
-                        self.processors[proc].cache.state = "S"
-
-                    if self.memory.status[self.processors[proc].cache.address] == "dirty":
-                        self.metrics.total_cycles += self.metrics.memory_access_cycles
-                        self.memory.data[self.processors[proc].cache.address] = self.processors[proc].cache.value
-                        self.memory.status[self.processors[proc].cache.address] = "clean"
-                    shared_copy_exists = True
-        return shared_copy_exists
+                    traffic[proc][CACHE_TO_CACHE_TRANSFERS] += 1
+                    row[CACHE_TO_CACHE_TRANSFERS] += 1
+                    if response == FLUSH:
+                        self.flush(address, data, proc)
+                    elif event == BUS_RD and protocol.dirty[state]:
+                        traffic[proc][WRITEBACKS_AVOIDED] += 1
+                        row[WRITEBACKS_AVOIDED] += 1
+            elif event == BUS_UPD:
+                cache.values[slot] = value
+            next_state = protocol.snoop_next[index]
+            if next_state:
+                cache.states[slot] = next_state
+            else:
+                cache.invalidate(slot)
+                self.track_drop(proc, address)
+                if traffic is not NULL:
+                    traffic[processor_no][INVALIDATIONS_SENT] += 1
+                    traffic[proc][INVALIDATIONS_RECEIVED] += 1
+                    row[INVALIDATIONS_SENT] += 1
+                    row[INVALIDATIONS_RECEIVED] += 1
+        # BusUpgr e BusUpd não trazem dados: a linha já está na cache de quem pediu
+        if data is NULL and event <= BUS_RDX:
+            data = self.memory.read(address)
+        return shared, data
+
+    def flush(self, address, value, processor_no):
+        # Uma cache com a linha suja responde ao snoop e atualiza a memória
+        self.last_bus_action |= FLUSH_BIT
+        self.metrics.traffic.add(processor_no, address, DIRTY_WRITEBACKS)
+        self.metrics.total_cycles += self.metrics.memory_access_cycles
+        self.memory.write(address, value)
+
+    def writeback(self, address, value, processor_no):
+        # Escrita de uma linha suja substituída de volta na memória principal
+        self.last_bus_action |= WRITEBACK_BIT
+        self.metrics.traffic.add(processor_no, address, DIRTY_WRITEBACKS)
+        self.metrics.writebacks += 1
+        self.metrics.total_cycles += self.metrics.memory_access_cycles
+        self.memory.write(address, value)
+
+    # Caminho funcional (aquecimento da amostragem): mesmo efeito de transaction/snoop nos
+    # estados, valores e memória, sem ciclos, contadores nem tráfego
+    def warm_targets(self, processor_no, address):
+        return self.others[processor_no]
+
+    def warm_transaction(self, processor_no, action, address, value):
+        if action == BUS_RD_UPD:
+            return self.read_update(self.warm_snoop, processor_no, address, value)
+        return self.warm_snoop(processor_no, action, address, value)
+
+    def warm_snoop(self, processor_no, event, address, value):
+        return self.snoop_caches(processor_no, event, address, value, self.warm_targets(processor_no, address),
+                                 NULL, NULL)
+
+
+class DirectoryBus(Bus):
+    # Coerência por diretório: um bitmask por endereço guarda quais processadores têm a linha,
+    # e os snoops consultam apenas essas caches em vez de todas
+    def __init__(self, memory, protocol):
+        super().__init__(memory, protocol)
+        self.sharers = {}
+
+    def snoop_targets(self, processor_no, address):
+        targets = self.warm_targets(processor_no, address)
+        self.metrics.snoop_lookups += len(targets)
+        self.metrics.snoop_lookups_avoided += len(self.processors) - 1 - len(targets)
+        return targets
+
+    def warm_targets(self, processor_no, address):
+        # Processadores com a linha, exceto o próprio
+        mask = self.sharers.get(address, 0) & ~(1 << processor_no)
+        targets = []
+        while mask:
+            lowest = mask & -mask
+            targets.append(lowest.bit_length() - 1)
+            mask ^= lowest
+        return targets
+
+    def track_fill(self, processor_no, address):
+        self.sharers[address] = self.sharers.get(address, 0) | (1 << processor_no)
+
+    def track_drop(self, processor_no, address):
+        mask = self.sharers[address] & ~(1 << processor_no)
+        if mask:
+            self.sharers[address] = mask
+        else:
+            del self.sharers[address]
+
+
+COHERENCE_MODES = {"broadcast": Bus, "directory": DirectoryBus}
 
 
 class Processor:
-    def __init__(self, processor_number, bus, memory, protocol):
-        self.cache = Cache(protocol)
+    def __init__(self, processor_number, bus, memory, protocol, num_sets=1, ways=1, replacement="LRU", seed=None):
+        self.cache = Cache(protocol, num_sets, ways, replacement, seed)
         self.processor_number = processor_number
         self.bus = bus
         self.memory = memory
         self.protocol = protocol
-        self.bus.processors.append(self)
+        # Relógio local e ciclos parados, usados pelo modelo temporizado (temporizacao.py)
+        self.clock = 0
+        self.stall_cycles = 0
+        self.bus.connect(self)
+
+    def allocate(self, address):
+        # Escolhe a via para o novo endereço, substituindo uma linha se o conjunto estiver cheio
+        cache = self.cache
+        slot = cache.victim_slot(address)
+        if cache.addresses[slot] != -1:
+            self.evict(slot)
+        cache.fill(slot, address)
+        self.bus.track_fill(self.processor_number, address)
+        return slot
+
+    def evict(self, slot):
+        metrics = self.bus.metrics
+        cache = self.cache
+        metrics.evictions += 1
+        if cache.valid_lines == cache.size:
+            metrics.capacity_evictions += 1
+        else:
+            metrics.conflict_evictions += 1
+        if self.protocol.dirty[cache.states[slot]]:
+            self.bus.writeback(cache.addresses[slot], cache.values[slot], self.processor_number)
+        self.bus.track_drop(self.processor_number, cache.addresses[slot])
+        cache.invalidate(slot)
+
+    def access(self, r_w, address, value=0):
+        # Leitura (r_w=0) ou escrita (r_w=1) guiada pela tabela do protocolo. Retorna o valor da linha.
+        metrics = self.bus.metrics
+        cache = self.cache
+        metrics.compute_cycles += metrics.compute_cost
+        slot = cache.slots.get(address, -1)
+        if slot == -1:
+            metrics.cache_misses += 1
+            index = r_w  # Estado I
+        else:
+            index = cache.states[slot] * 2 + r_w
+        metrics.total_cycles += self.protocol.cost[index]
+        return self.transition(r_w, index, slot, address, value, False)
+
+    def transition(self, r_w, index, slot, address, value, warm):
+        # Parte comum de access e warm: ação de bus, alocação, próximo estado e escrita. Os
+        # dois caminhos só diferem na contabilidade, que fica nas versões warm_* do bus e da alocação.
+        protocol = self.protocol
+        cache = self.cache
+        action = protocol.action[index]
+        if action:
+            bus = self.bus
+            shared, data = (bus.warm_transaction if warm else bus.transaction)(self.processor_number, action,
+                                                                               address, value)
+            next_state = protocol.next_shared[index] if shared else protocol.next_alone[index]
+            if slot == -1:
+                slot = self.warm_allocate(address) if warm else self.allocate(address)
+                cache.values[slot] = data
+        else:
+            next_state = protocol.next_alone[index]
+        cache.states[slot] = next_state
 
-    def writeValue(self, address, value):
-        self.bus.metrics.compute_cycles += self.bus.metrics.compute_cost
+        if r_w:
+            cache.values[slot] = value
+            # Enquanto a linha estiver suja em alguma cache o bloco continua sujo na memória,
+            # então só a transição de limpo para sujo precisa marcar (index >> 1 é o estado anterior)
+            if protocol.dirty[next_state] and not protocol.dirty[index >> 1]:
+                self.memory.set_dirty(address)
+        cache.touch(slot)
+        return cache.values[slot]
+
+    def prefetch(self, address):
+        # Traz a linha para a cache como um read miss do protocolo (BusRd e snoops), sem contar
+        # como acesso do processador. Retorna False se a linha já estava na cache.
+        cache = self.cache
+        if address in cache.slots:
+            return False
+        protocol = self.protocol
+        shared, data = self.bus.transaction(self.processor_number, protocol.action[0], address, 0)
+        slot = self.allocate(address)
+        cache.values[slot] = data
+        cache.states[slot] = protocol.next_shared[0] if shared else protocol.next_alone[0]  # Estado I, leitura
+        cache.touch(slot)
+        return True
+
+    def warm(self, r_w, address, value=0):
+        # Mesma transição de access sem contabilidade de ciclos nem contadores: só atualiza
+        # caches, coerência e memória (aquecimento funcional da amostragem)
+        cache = self.cache
+        slot = cache.slots.get(address, -1)
+        index = r_w if slot == -1 else cache.states[slot] * 2 + r_w
+        self.transition(r_w, index, slot, address, value, True)
+
+    def warm_allocate(self, address):
+        # allocate sem contadores: uma vítima suja vai direto para a memória
+        cache = self.cache
+        slot = cache.victim_slot(address)
+        victim = cache.addresses[slot]
+        if victim != -1:
+            if self.protocol.dirty[cache.states[slot]]:
+                self.memory.write(victim, cache.values[slot])
+            self.bus.track_drop(self.processor_number, victim)
+            cache.invalidate(slot)
+        cache.fill(slot, address)
+        self.bus.track_fill(self.processor_number, address)
+        return slot
 
-        # Conta miss apenas se endereço não está na cache e estado é Invalid
-        if (self.cache.address != address) and (self.cache.state == "I"):
-            self.bus.metrics.cache_misses += 1
-            self.bus.metrics.total_cycles += self.bus.metrics.memory_access_cycles
-        else:
-            self.bus.metrics.total_cycles += self.bus.metrics.cache_access_cycles
+    def writeValue(self, address, value):
+        self.access(1, address, value)
 
-        if self.cache.address == NULL:
-            if self.bus.bus_snoop(self.processor_number, address):
-                self.cache.state = "E"
+    def readValue(self, address):
+        return self.access(0, address)
+
+
+# Políticas de substituição. Cada uma guarda seu estado em um array plano por conjunto/via;
+# touch recebe o slot acessado e victim devolve a via a substituir no conjunto.
+class LRUReplacement:
+    def __init__(self, num_sets, ways, seed=None):
+        self.ways = ways
+        self.clock = 0
+        self.stamps = array("Q", [0]) * (num_sets * ways)  # Último acesso de cada linha
+
+    def touch(self, slot):
+        self.clock += 1
+        self.stamps[slot] = self.clock
+
+    def victim(self, set_index):
+        base = set_index * self.ways
+        stamps = self.stamps[base:base + self.ways]
+        return stamps.index(min(stamps))
+
+
+class PLRUReplacement:
+    # Pseudo-LRU em árvore: ways - 1 bits por conjunto, cada bit aponta para a metade menos recente
+    def __init__(self, num_sets, ways, seed=None):
+        if ways & (ways - 1) or ways > 64:
+            raise ValueError("O pseudo-LRU exige um número de vias potência de 2 (até 64)")
+        self.ways = ways
+        self.levels = ways.bit_length() - 1
+        self.bits = array("Q", [0]) * num_sets
+
+    def touch(self, slot):
+        set_index, way = divmod(slot, self.ways)
+        bits = self.bits[set_index]
+        node = 1
+        for level in range(self.levels - 1, -1, -1):
+            direction = (way >> level) & 1
+            # O bit passa a apontar para o lado oposto ao acessado
+            if direction:
+                bits &= ~(1 << node)
             else:
-                self.cache.state = "M"
-            self.cache.address = address
-            self.cache.value = value
-            self.memory.status[address] = "dirty"
-
-        elif self.cache.address == address:
-            if self.cache.state in ["S", "E", "O"]:
-                self.cache.state = "M"
-                self.cache.value = value
-                self.memory.status[address] = "dirty"
-                self.bus.bus_snoop(self.processor_number, address)
-            elif self.cache.state == "M":
-                self.cache.value = value
+                bits |= 1 << node
+            node = 2 * node + direction
+        self.bits[set_index] = bits
 
-        else:
-            if self.cache.state in ["M", "O"]:
-                self.memory.data[self.cache.address] = self.cache.value
-                self.memory.status[self.cache.address] = "clean"
+    def victim(self, set_index):
+        bits = self.bits[set_index]
+        node = 1
+        for _ in range(self.levels):
+            node = 2 * node + ((bits >> node) & 1)
+        return node - self.ways
 
-            if self.bus.bus_snoop(self.processor_number, address):
-                self.cache.state = "E"
-            else:
-                self.cache.state = "M"
-            self.cache.value = value
-            self.cache.address = address
-            self.memory.status[address] = "dirty"
 
-    def readValue(self, address):
-        self.bus.metrics.compute_cycles += self.bus.metrics.compute_cost
-
-        # Similar à escrita, conta miss nas mesmas condições
-        if (self.cache.address != address) and (self.cache.state == "I"):
-            self.bus.metrics.cache_misses += 1
-            self.bus.metrics.total_cycles += self.bus.metrics.memory_access_cycles
-            if self.bus.read_bus_snoop(self.processor_number, address):
-                self.cache.state = "S"
-            else:
-                self.cache.state = "E"
-            self.cache.address = address
-            self.cache.value = self.memory.data[address]
-        else:
-            self.bus.metrics.total_cycles += self.bus.metrics.cache_access_cycles
+class RandomReplacement:
+    def __init__(self, num_sets, ways, seed=None):
+        self.ways = ways
+        self.rng = Random(seed)
+
+    def touch(self, slot):
+        pass
+
+    def victim(self, set_index):
+        return self.rng.randrange(self.ways)
 
-        if self.protocol.type == "MOESI" and self.cache.state == "O":
-            return self.cache.value
 
-        return self.cache.value
+REPLACEMENT_POLICIES = {"LRU": LRUReplacement, "PLRU": PLRUReplacement, "RANDOM": RandomReplacement}
 
 
 class Cache:
-    def __init__(self, protocol):
+    # Cache associativa por conjunto (num_sets x ways). As linhas ficam em arrays planos
+    # indexados por slot = conjunto * ways + via, sem um objeto por linha; `slots` mapeia
+    # apenas os endereços presentes para o slot, para que as buscas não varram as vias.
+    def __init__(self, protocol, num_sets=1, ways=1, replacement="LRU", seed=None):
+        if replacement.upper() not in REPLACEMENT_POLICIES:
+            raise ValueError(f"Política de substituição inválida: {replacement}")
         self.protocol = protocol
-        self.state = "I"
-        self.value = NULL
-        self.address = NULL
+        self.num_sets = num_sets
+        self.ways = ways
+        self.size = num_sets * ways
+        self.valid_lines = 0
+        self.addresses = array("q", [-1]) * self.size  # -1 indica linha vazia
+        self.values = array("q", [0]) * self.size
+        self.states = bytearray(self.size)  # Códigos de estado do protocolo (0 = I)
+        self.slots = {}
+        self.replacement = REPLACEMENT_POLICIES[replacement.upper()](num_sets, ways, seed)
+        self.touch = self.replacement.touch
+
+    def victim_slot(self, address):
+        # Usa uma via livre do conjunto se houver; senão pergunta à política de substituição
+        set_index = address % self.num_sets
+        base = set_index * self.ways
+        addresses = self.addresses
+        for slot in range(base, base + self.ways):
+            if addresses[slot] == -1:
+                return slot
+        return base + self.replacement.victim(set_index)
+
+    def fill(self, slot, address):
+        self.addresses[slot] = address
+        self.slots[address] = slot
+        self.valid_lines += 1
+
+    def invalidate(self, slot):
+        del self.slots[self.addresses[slot]]
+        self.addresses[slot] = -1
+        self.states[slot] = 0
+        self.valid_lines -= 1
+
+    def lines(self):
+        # Linhas válidas como (endereço, nome do estado, valor)
+        names = self.protocol.valid_states
+        for slot in range(self.size):
+            if self.addresses[slot] != -1:
+                yield self.addresses[slot], names[self.states[slot]], self.values[slot]
+
+
+def uniform_instructions(n, num_processors, memory_size, seed=None):
+    # Fluxo uniforme de instruções (processador, r_w, endereço, valor) gerado sob demanda
+    randint = Random(seed).randint
+    last_processor = num_processors - 1
+    last_address = memory_size - 1
+    for _ in range(n):
+        yield randint(0, last_processor), randint(0, 1), randint(0, last_address), randint(0, 1000)
 
 
 class CPU:
-    def __init__(self, protocol_type="MESI"):
+    def __init__(self, protocol_type="MESI", num_sets=4, ways=2, replacement="LRU", memory_size=4, seed=None,
+                 num_processors=4, coherence="broadcast", costs=None, page_size=512, track_addresses=True):
+        if coherence not in COHERENCE_MODES:
+            raise ValueError(f"Modo de coerência inválido: {coherence}")
         self.protocol = Protocol(protocol_type)
-        self.memory = sharedMemory()
-        self.bus = Bus(self.memory, self.protocol)
+        self.memory = sharedMemory(memory_size, page_size)
+        self.bus = COHERENCE_MODES[coherence](self.memory, self.protocol)
+        # Sem rastreio por endereço o tráfego só é contado por processador (varreduras)
+        self.bus.metrics.traffic.track_addresses = track_addresses
+        if costs:
+            self.set_costs(costs)
         self.processors = []
         self.instructions = []
-
-        for processor_number in range(4):
-            self.processors.append(Processor(processor_number, self.bus, self.memory, self.protocol))
-
-    def generate_instructions(self, n):
-        self.instructions = [
-            (randint(0, 3), randint(0, 1), randint(0, 3), randint(0, 1000))
-            for _ in range(n)
-        ]
-
-    def run_simulation(self):
-        for proc, r_w, addr, val in self.instructions:
+        self.seed = NULL
+
+        for processor_number in range(num_processors):
+            cache_seed = NULL if seed is NULL else seed + processor_number
+            self.processors.append(Processor(processor_number, self.bus, self.memory, self.protocol,
+                                             num_sets, ways, replacement, cache_seed))
+
+    def set_costs(self, costs):
+        # Substitui os custos em ciclos padrão do Metrics (ex.: {"memory_access_cycles": 200})
+        for name, value in costs.items():
+            if name not in COST_FIELDS:
+                raise ValueError(f"Custo desconhecido: {name}")
+            setattr(self.bus.metrics, name, value)
+        self.protocol.bind_costs(self.bus.metrics)
+
+    def generate_instructions(self, n, seed=None):
+        self.seed = seed
+        self.instructions = list(uniform_instructions(n, len(self.processors), self.memory.size, seed))
+
+    def run_simulation(self, instructions=None):
+        # Sem argumento executa self.instructions; aceita qualquer iterável de
+        # (processador, r_w, endereço, valor), como os blocos lidos de um trace
+        if instructions is None:
+            instructions = self.instructions
+        for proc, r_w, addr, val in instructions:
             self.bus.instruction(proc, r_w, addr, val)
 
-    def get_metrics(self):
+    def get_metrics(self, per_address=True):
         metrics = self.bus.metrics
         metrics.idle_cycles = metrics.total_cycles - metrics.compute_cycles
         miss_rate = metrics.cache_misses / metrics.total_instructions if metrics.total_instructions > 0 else 0
@@ -207,7 +711,16 @@ class CPU:
             "idle_cycles": metrics.idle_cycles,
             "load_instructions": metrics.load_instructions,
             "store_instructions": metrics.store_instructions,
-            "miss_rate": miss_rate
+            "cache_misses": metrics.cache_misses,
+            "evictions": metrics.evictions,
+            "capacity_evictions": metrics.capacity_evictions,
+            "conflict_evictions": metrics.conflict_evictions,
+            "writebacks": metrics.writebacks,
+            "bus_transactions": metrics.bus_transactions,
+            "snoop_lookups": metrics.snoop_lookups,
+            "snoop_lookups_avoided": metrics.snoop_lookups_avoided,
+            "miss_rate": miss_rate,
+            "traffic": metrics.traffic.report(per_address)
         }
 
     '''
@@ -235,55 +748,23 @@ class CPU:
         print(f"Instruções de Leitura: {metrics['load_instructions']}")
         print(f"Instruções de Escrita: {metrics['store_instructions']}")
         print(f"Taxa de Cache Miss: {metrics['miss_rate']:.2%}")
+        print(f"Substituições (capacidade/conflito): {metrics['evictions']} "
+              f"({metrics['capacity_evictions']}/{metrics['conflict_evictions']})")
+        print(f"Write-backs por substituição: {metrics['writebacks']}")
+        print(f"Consultas de snoop: {metrics['snoop_lookups']} (evitadas: {metrics['snoop_lookups_avoided']})")
+        traffic = metrics["traffic"]["totals"]
+        print(f"Invalidações: {traffic['invalidations_sent']}")
+        print(f"Transferências cache-a-cache: {traffic['cache_to_cache_transfers']}")
+        print(f"Write-backs de linhas sujas: {traffic['dirty_writebacks']} "
+              f"(evitados pelo estado O: {traffic['writebacks_avoided']})")
         return metrics  # Retorna as métricas
 
 
-def plot_comparison(mesi_metrics, moesi_metrics):
-   """
-    labels = ['Ciclos Totais', 'Ciclos Computados', 'Ciclos em Idle', 'Instruções de Leitura', 'Instruções de Escrita',
-              'Taxa de Cache Miss']
-
-    mesi_values = [mesi_metrics['total_cycles'], mesi_metrics['compute_cycles'], mesi_metrics['idle_cycles'],
-                   mesi_metrics['load_instructions'], mesi_metrics['store_instructions'], mesi_metrics['miss_rate']]
-    moesi_values = [moesi_metrics['total_cycles'], moesi_metrics['compute_cycles'], moesi_metrics['idle_cycles'],
-                    moesi_metrics['load_instructions'], moesi_metrics['store_instructions'], moesi_metrics['miss_rate']]
-
-    x = range(len(labels))
-#Esse é o código pro negócio completo!! Os gráficos de todos os parametros
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.bar(x, mesi_values, width=0.4, label='MESI', align='center')
-    ax.bar(x, moesi_values, width=0.4, label='MOESI', align='edge')
-
-    ax.set_ylabel('Valores de Métricas')
-    ax.set_title('Comparação entre MESI e MOESI')
-    ax.set_xticks(x)
-    ax.set_xticklabels(labels, rotation=45, ha="right")
-    ax.legend()
-
-    plt.tight_layout()
-    plt.show()
-"""
-   labels = ['MESI', 'MOESI']
-   miss_rates = [mesi_metrics['miss_rate'], moesi_metrics['miss_rate']]
-
-   x = range(len(labels))
-
-   fig, ax = plt.subplots(figsize=(6, 6))
-   ax.bar(x, miss_rates, width=0.4, color=['blue', 'orange'], label='Taxa de Cache Miss')
-
-   ax.set_ylabel('Taxa de Cache Miss')
-   ax.set_title('Comparação da Taxa de Cache Miss entre MESI e MOESI')
-   ax.set_xticks(x)
-   ax.set_xticklabels(labels)
-   ax.legend()
-
-   plt.tight_layout()
-   plt.show()
 if __name__ == "__main__":
     var = int(input("Digite 1 para testar individualmente e 2 para comparar ambos:"))
     if var == 1:
-        protocol = input("Entre o tipo de protocolo (MESI/MOESI): ").upper()
-        if protocol not in ["MESI", "MOESI"]:
+        protocol = input(f"Entre o tipo de protocolo ({'/'.join(PROTOCOLS)}): ").upper()
+        if protocol not in PROTOCOLS:
             print("Protocolo Inválido. Padrão é o MESI.")
             protocol = "MESI"
 
@@ -294,22 +775,19 @@ if __name__ == "__main__":
         cpu.run_simulation()
         cpu.print_final_metrics()
     elif var == 2:
-        # Simulando com MESI
+        from comparacao import compare_protocols, print_divergences
+
+        # MESI e MOESI rodam em lockstep sobre o mesmo fluxo de instruções
         n = int(input("Número de instruções para simular: "))
+        comparison = compare_protocols(n)
         print("Simulando com o protocolo MESI...")
-        cpu_mesi = CPU(protocol_type="MESI")
-        cpu_mesi.generate_instructions(n)
-        cpu_mesi.run_simulation()
-        mesi_metrics = cpu_mesi.print_final_metrics()
-
-        # Simulando com MOESI
+        mesi_metrics = comparison.cpus["MESI"].print_final_metrics()
         print("\nSimulando com o protocolo MOESI...")
-        cpu_moesi = CPU(protocol_type="MOESI")
-        cpu_moesi.generate_instructions(n)
-        cpu_moesi.run_simulation()
-        moesi_metrics = cpu_moesi.print_final_metrics()
+        moesi_metrics = comparison.cpus["MOESI"].print_final_metrics()
+        print_divergences(comparison.report())
 
-        # Gerando gráfico de comparação
+        # Gerando gráfico de comparação (matplotlib só é importado aqui)
+        from graficos import plot_comparison
         plot_comparison(mesi_metrics, moesi_metrics)
     else:
         print("Retorne uma variável existente")
@@ -0,0 +1,136 @@
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from MOESIeMESIcomrelatorionofinal import CPU
+from cargas import WORKLOADS, make_workload
+
+# Benchmark de vazão do núcleo do simulador. Cada caso (protocolo, carga, núcleos) usa
+# sementes fixas, então duas execuções simulam exatamente as mesmas instruções; mede
+# instruções por segundo, pico de memória e o tempo de cada fase (geração das instruções,
+# simulação e coleta de métricas). Os resultados vão para um JSON que serve de baseline
+# para o comando "comparar".
+
+PROTOCOLS = ["MESI", "MOESI"]
+CORES = [4, 16, 64]
+BENCHMARK_WORKLOADS = ["uniform", "high_contention", "read_mostly", "streaming"]
+SEED = 1234
+DEFAULT_CONFIG = {"n": 20000, "memory_size": 256, "num_sets": 16, "ways": 4}
+
+
+def case_name(protocol, workload, cores):
+    return f"{protocol}/{workload}/{cores}"
+
+
+def run_case(protocol, workload, cores, config):
+    # Uma execução do caso; devolve o tempo de cada fase em segundos
+    start = time.perf_counter()
+    instructions = list(make_workload(workload, config["n"], cores, config["memory_size"], SEED))
+    generated = time.perf_counter()
+    cpu = CPU(protocol, config["num_sets"], config["ways"], memory_size=config["memory_size"], seed=SEED,
+              num_processors=cores)
+    cpu.run_simulation(instructions)
+    simulated = time.perf_counter()
+    cpu.get_metrics()
+    finished = time.perf_counter()
+    return {"generation": generated - start, "simulation": simulated - generated, "metrics": finished - simulated}
+
+
+def peak_memory(protocol, workload, cores, config):
+    # Pico de memória alocada durante o caso (execução separada: o tracemalloc deixa tudo mais lento)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run_case(protocol, workload, cores, config)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark(protocols=PROTOCOLS, workloads=BENCHMARK_WORKLOADS, cores=CORES, repeat=3, config=None):
+    # Gera (nome do caso, resultado). O tempo de cada fase é o menor entre as repetições.
+    config = dict(DEFAULT_CONFIG, **(config or {}))
+    for protocol in protocols:
+        for workload in workloads:
+            for count in cores:
+                phases = None
+                for _ in range(repeat):
+                    timing = run_case(protocol, workload, count, config)
+                    phases = timing if phases is None else {name: min(phases[name], timing[name]) for name in timing}
+                yield case_name(protocol, workload, count), {
+                    "instructions_per_second": config["n"] / phases["simulation"],
+                    "peak_memory": peak_memory(protocol, workload, count, config),
+                    "phases": phases,
+                }
+
+
+def compare(baseline, current, threshold=0.1):
+    # Casos presentes nos dois arquivos em que a vazão caiu ou o pico de memória subiu
+    # mais que `threshold` (fração). Devolve uma lista de (caso, métrica, antes, depois, variação).
+    regressions = []
+    for name, before in baseline["results"].items():
+        after = current["results"].get(name)
+        if after is None:
+            continue
+        speed = after["instructions_per_second"] / before["instructions_per_second"] - 1
+        if speed < -threshold:
+            regressions.append((name, "instructions_per_second", before["instructions_per_second"],
+                                after["instructions_per_second"], speed))
+        memory = after["peak_memory"] / before["peak_memory"] - 1 if before["peak_memory"] else 0
+        if memory > threshold:
+            regressions.append((name, "peak_memory", before["peak_memory"], after["peak_memory"], memory))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de vazão do simulador com baseline em JSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("executar", help="executa o benchmark e grava os resultados")
+    run.add_argument("--saida", default="benchmark.json")
+    run.add_argument("-n", type=int, default=DEFAULT_CONFIG["n"], help="instruções por caso")
+    run.add_argument("--repeticoes", type=int, default=3)
+    run.add_argument("--protocolos", nargs="+", default=PROTOCOLS)
+    run.add_argument("--cargas", nargs="+", default=BENCHMARK_WORKLOADS, choices=sorted(WORKLOADS))
+    run.add_argument("--nucleos", nargs="+", type=int, default=CORES)
+
+    check = commands.add_parser("comparar", help="compara um resultado com a baseline")
+    check.add_argument("baseline")
+    check.add_argument("atual")
+    check.add_argument("--limite", type=float, default=0.1, help="variação tolerada (0.1 = 10%%)")
+
+    args = parser.parse_args()
+    if args.command == "executar":
+        config = dict(DEFAULT_CONFIG, n=args.n)
+        results = {}
+        for name, result in benchmark(args.protocolos, args.cargas, args.nucleos, args.repeticoes, config):
+            results[name] = result
+            phases = result["phases"]
+            print(f"{name}: {result['instructions_per_second']:,.0f} instr/s, pico {result['peak_memory'] / 1024:.0f} KiB "
+                  f"(geração {phases['generation']:.3f}s, simulação {phases['simulation']:.3f}s, "
+                  f"métricas {phases['metrics']:.4f}s)")
+        report = {
+            "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                     "repeat": args.repeticoes, "seed": SEED, "config": config},
+            "results": results,
+        }
+        with open(args.saida, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"Resultados gravados em {args.saida}")
+    else:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        with open(args.atual, encoding="utf-8") as file:
+            current = json.load(file)
+        if baseline["meta"]["config"] != current["meta"]["config"]:
+            print("Aviso: as configurações dos dois arquivos são diferentes")
+        regressions = compare(baseline, current, args.limite)
+        for name, metric, before, after, change in regressions:
+            print(f"REGRESSÃO {name} {metric}: {before:,.0f} -> {after:,.0f} ({change:+.1%})")
+        if not regressions:
+            print(f"Nenhuma regressão acima de {args.limite:.0%}")
+        sys.exit(1 if regressions else 0)
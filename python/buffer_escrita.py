@@ -0,0 +1,263 @@
+import argparse
+from collections import deque
+
+from MOESIeMESIcomrelatorionofinal import CPU, Processor
+from cargas import WORKLOADS, make_workload
+from protocolos import PROTOCOLS
+
+# Store buffer e buffer de write-back por núcleo. Cada processador recebe uma
+# WriteBufferUnit, que se instala no lugar de Processor.access (e a CPU no lugar de
+# Bus.writeback), então sem buffers o caminho normal não muda nada.
+#
+# Store buffer: uma escrita só entra no buffer (custo de um acesso à cache) e o
+# processador segue; escritas na mesma linha já presente no buffer se fundem na entrada
+# existente, e leituras de endereços no buffer recebem o valor dele (forwarding). O buffer
+# é esvaziado em ordem por um motor próprio do núcleo, que faz a escrita coerente de
+# verdade (Processor.access) em paralelo com as instruções seguintes: o custo dela não
+# entra em total_cycles. Cada núcleo tem um relógio local (soma das latências das suas
+# instruções); o motor só começa uma escrita quando está livre nesse relógio e cada escrita
+# o ocupa pelo seu custo. Com o buffer cheio o processador espera o motor liberar uma
+# entrada, e essa espera é contada como stall. Leituras que não estão no buffer passam à
+# frente das escritas pendentes (ordem TSO).
+#
+# Políticas de esvaziamento:
+# - "eager": o motor trabalha sempre que houver entradas e ele estiver livre
+# - "watermark": começa quando a ocupação chega a `high` e para ao descer a `low`
+# - "lazy": só esvazia quando o buffer enche (máxima fusão de escritas)
+#
+# Buffer de write-back: linhas sujas substituídas são escritas na memória na hora (o
+# efeito funcional não muda), mas o custo fica em uma fila de `writeback_capacity`
+# entradas que esvazia em segundo plano; só há espera quando a fila está cheia.
+
+DRAIN_POLICIES = ["eager", "watermark", "lazy"]
+
+
+class WriteBufferUnit:
+    def __init__(self, processor, capacity=8, policy="eager", high=6, low=2, writeback_capacity=4):
+        if policy not in DRAIN_POLICIES:
+            raise ValueError(f"Política de esvaziamento inválida: {policy}")
+        if not 0 <= low < high <= capacity:
+            raise ValueError("As marcas devem satisfazer 0 <= low < high <= capacity")
+        self.processor = processor
+        self.capacity = capacity
+        self.policy = policy
+        self.high = high
+        self.low = low
+        self.writeback_capacity = writeback_capacity
+        self.entries = {}  # Endereço -> valor, na ordem de chegada (a fusão mantém a posição)
+        self.writebacks = deque()  # Ciclo local em que cada write-back pendente termina
+        self.now = 0  # Relógio local do núcleo
+        self.engine_free_at = 0  # Ciclo local em que o motor do store buffer fica livre
+        self.draining = False
+
+        self.stores = 0
+        self.coalesced = 0
+        self.forwarded = 0
+        self.drained = 0
+        self.full_stalls = 0
+        self.stall_cycles = 0
+        self.hidden_cycles = 0  # Custo das escritas e write-backs feitos em segundo plano
+        self.writeback_entries = 0
+        self.writeback_stalls = 0
+        self.writeback_stall_cycles = 0
+        self.occupancy = 0  # Soma das ocupações após cada instrução (média = occupancy / instruções)
+        self.writeback_occupancy = 0
+        self.max_occupancy = 0
+        self.instructions = 0
+        processor.access = self.access
+
+    def access(self, r_w, address, value=0):
+        metrics = self.processor.bus.metrics
+        entries = self.entries
+        if r_w or address in entries:
+            # Escrita no buffer ou leitura atendida por ele: custo de um acesso à cache
+            metrics.compute_cycles += metrics.compute_cost
+            metrics.total_cycles += metrics.cache_access_cycles
+            self.now += metrics.cache_access_cycles
+            if r_w:
+                self.stores += 1
+                if address in entries:
+                    self.coalesced += 1
+                elif len(entries) >= self.capacity:
+                    self._stall_for_entry()
+                entries[address] = value
+                result = value
+            else:
+                self.forwarded += 1
+                result = entries[address]
+        else:
+            before = metrics.total_cycles
+            result = Processor.access(self.processor, r_w, address, value)
+            self.now += metrics.total_cycles - before
+
+        self._drain()
+        self.instructions += 1
+        occupancy = len(entries)
+        self.occupancy += occupancy
+        if occupancy > self.max_occupancy:
+            self.max_occupancy = occupancy
+        self.writeback_occupancy += len(self.writebacks)
+        return result
+
+    def _write(self):
+        # Escrita coerente da entrada mais antiga; devolve o custo, que sai de total_cycles
+        metrics = self.processor.bus.metrics
+        address = next(iter(self.entries))
+        value = self.entries.pop(address)
+        before = metrics.total_cycles
+        Processor.access(self.processor, 1, address, value)
+        cost = metrics.total_cycles - before
+        metrics.total_cycles -= cost
+        metrics.compute_cycles -= metrics.compute_cost  # Já contado quando a escrita entrou no buffer
+        self.hidden_cycles += cost
+        self.drained += 1
+        return cost
+
+    def _drain(self):
+        entries = self.entries
+        if self.policy == "lazy":
+            return
+        if self.policy == "watermark" and not self.draining:
+            if len(entries) < self.high:
+                return
+            self.draining = True
+        while entries and self.engine_free_at <= self.now:
+            self.engine_free_at = max(self.engine_free_at, self.now) + self._write()
+            if self.policy == "watermark" and len(entries) <= self.low:
+                self.draining = False
+                break
+
+    def _stall_for_entry(self):
+        # Buffer cheio: espera o motor terminar o que está fazendo e escrever a entrada mais antiga
+        cost = self._write()
+        self._stall(max(self.engine_free_at, self.now) + cost - self.now)
+        self.engine_free_at = self.now
+        self.full_stalls += 1
+
+    def _stall(self, cycles):
+        self.processor.bus.metrics.total_cycles += cycles
+        self.now += cycles
+        self.stall_cycles += cycles
+
+    def buffer_writeback(self, cost):
+        # Custo de um write-back de substituição, pago em segundo plano pela fila
+        pending = self.writebacks
+        while pending and pending[0] <= self.now:
+            pending.popleft()
+        if len(pending) >= self.writeback_capacity:
+            wait = pending[0] - self.now
+            self._stall(wait)
+            self.stall_cycles -= wait
+            self.writeback_stalls += 1
+            self.writeback_stall_cycles += wait
+            while pending and pending[0] <= self.now:
+                pending.popleft()
+        pending.append(max(pending[-1] if pending else self.now, self.now) + cost)
+        self.hidden_cycles += cost
+        self.writeback_entries += 1
+
+    def drain_all(self):
+        # Esvazia o buffer no fim da execução; o que o motor ainda não fez vira espera
+        while self.entries:
+            cost = self._write()
+            self.engine_free_at = max(self.engine_free_at, self.now) + cost
+        if self.engine_free_at > self.now:
+            self._stall(self.engine_free_at - self.now)
+        self.draining = False
+
+
+def attach_write_buffers(cpu, capacity=8, policy="eager", high=6, low=2, writeback_capacity=4):
+    # Uma WriteBufferUnit por processador; os write-backs de substituição de cada
+    # processador vão para a fila da sua unidade
+    units = [WriteBufferUnit(processor, capacity, policy, high, low, writeback_capacity)
+             for processor in cpu.processors]
+    bus = cpu.bus
+    writeback = bus.writeback
+
+    def buffered_writeback(address, value, processor_no):
+        metrics = bus.metrics
+        before = metrics.total_cycles
+        writeback(address, value, processor_no)
+        cost = metrics.total_cycles - before
+        metrics.total_cycles -= cost
+        units[processor_no].buffer_writeback(cost)
+
+    bus.writeback = buffered_writeback
+    return units
+
+
+def write_buffer_report(cpu, units):
+    instructions = sum(unit.instructions for unit in units)
+    stores = sum(unit.stores for unit in units)
+    coalesced = sum(unit.coalesced for unit in units)
+    return {
+        "total_cycles": cpu.bus.metrics.total_cycles,
+        "stores": stores,
+        "coalesced": coalesced,
+        "coalescing_ratio": coalesced / stores if stores else 0,
+        "forwarded_loads": sum(unit.forwarded for unit in units),
+        "drained": sum(unit.drained for unit in units),
+        "mean_occupancy": sum(unit.occupancy for unit in units) / instructions if instructions else 0,
+        "max_occupancy": max((unit.max_occupancy for unit in units), default=0),
+        "full_stalls": sum(unit.full_stalls for unit in units),
+        "stall_cycles": sum(unit.stall_cycles for unit in units),
+        "hidden_cycles": sum(unit.hidden_cycles for unit in units),
+        "writeback_entries": sum(unit.writeback_entries for unit in units),
+        "writeback_mean_occupancy": sum(unit.writeback_occupancy for unit in units) / instructions
+        if instructions else 0,
+        "writeback_stalls": sum(unit.writeback_stalls for unit in units),
+        "writeback_stall_cycles": sum(unit.writeback_stall_cycles for unit in units),
+    }
+
+
+def print_write_buffers(report, baseline=None):
+    print("\nBuffers de escrita")
+    print("=" * 30)
+    print(f"Escritas: {report['stores']} ({report['coalesced']} fundidas, "
+          f"taxa de fusão {report['coalescing_ratio']:.2%}); leituras atendidas pelo buffer: "
+          f"{report['forwarded_loads']}")
+    print(f"Ocupação média do store buffer: {report['mean_occupancy']:.2f} (máxima {report['max_occupancy']})")
+    print(f"Stalls com o buffer cheio: {report['full_stalls']} ({report['stall_cycles']} ciclos)")
+    print(f"Write-backs em fila: {report['writeback_entries']} (ocupação média "
+          f"{report['writeback_mean_occupancy']:.2f}, {report['writeback_stalls']} stalls, "
+          f"{report['writeback_stall_cycles']} ciclos)")
+    print(f"Ciclos escondidos em segundo plano: {report['hidden_cycles']}")
+    if baseline is not None:
+        saved = baseline - report["total_cycles"]
+        print(f"Ciclos sem buffers: {baseline} (os buffers escondem {saved}, {saved / baseline:.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store buffer e buffer de write-back por núcleo")
+    parser.add_argument("-n", type=int, default=100000, help="número de instruções")
+    parser.add_argument("--protocolo", default="MESI", choices=sorted(PROTOCOLS))
+    parser.add_argument("--nucleos", type=int, default=4)
+    parser.add_argument("--memoria", type=int, default=64, help="número de blocos de memória")
+    parser.add_argument("--conjuntos", type=int, default=4)
+    parser.add_argument("--vias", type=int, default=2)
+    parser.add_argument("--carga", default="uniform", help=f"{'/'.join(WORKLOADS)} ou trace:<arquivo>")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--entradas", type=int, default=8, help="entradas do store buffer")
+    parser.add_argument("--politica", default="eager", choices=DRAIN_POLICIES)
+    parser.add_argument("--alta", type=int, default=6, help="marca alta da política watermark")
+    parser.add_argument("--baixa", type=int, default=2, help="marca baixa da política watermark")
+    parser.add_argument("--writeback", type=int, default=4, help="entradas do buffer de write-back")
+    args = parser.parse_args()
+
+    def build():
+        return CPU(args.protocolo, args.conjuntos, args.vias, memory_size=args.memoria, seed=args.seed,
+                   num_processors=args.nucleos)
+
+    def workload():
+        return make_workload(args.carga, args.n, args.nucleos, args.memoria, args.seed)
+
+    plain = build()
+    plain.run_simulation(workload())
+    cpu = build()
+    units = attach_write_buffers(cpu, args.entradas, args.politica, min(args.alta, args.entradas),
+                                 min(args.baixa, args.entradas - 1), args.writeback)
+    cpu.run_simulation(workload())
+    for unit in units:
+        unit.drain_all()
+    cpu.print_final_metrics()
+    print_write_buffers(write_buffer_report(cpu, units), plain.bus.metrics.total_cycles)
@@ -0,0 +1,179 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+from MOESIeMESIcomrelatorionofinal import COST_FIELDS, SIMULATOR_VERSION, Metrics
+
+# Cache de resultados endereçado por conteúdo. A chave é o SHA-256 da configuração
+# completa em JSON canônico: todos os parâmetros do ponto, todos os custos do Metrics
+# (inclusive os padrão), a versão do simulador e, para traces, o digest do arquivo em vez
+# do caminho. Os resultados (saída de get_metrics e séries temporais, se houver) ficam em
+# um banco SQLite, comprimidos; quando o total passa de max_bytes, os menos usados
+# recentemente são removidos.
+#
+# Configurações sem semente (seed None) não são reprodutíveis: cada execução sorteia outra
+# carga, então elas não são buscadas nem guardadas no cache. A exceção são os traces, já
+# identificados pelo digest: com substituição determinística (LRU, PLRU) o resultado não
+# depende da semente, que nem entra na chave. Campos que o simulador aceita em qualquer
+# caixa (a política de substituição) são normalizados antes do hash.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    config TEXT NOT NULL,
+    result BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    digest TEXT NOT NULL
+);
+"""
+
+
+class ResultCache:
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0  # Consultas de configurações sem semente, que não passam pelo cache
+
+    def file_digest(self, path):
+        # SHA-256 do arquivo, recalculado só se tamanho ou data de modificação mudaram
+        path = os.path.abspath(path)
+        info = os.stat(path)
+        row = self.db.execute("SELECT size, mtime, digest FROM digests WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == info.st_size and row[1] == info.st_mtime:
+            return row[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        digest = digest.hexdigest()
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?)",
+                            (path, info.st_size, info.st_mtime, digest))
+        return digest
+
+    @staticmethod
+    def seeded(config):
+        # A semente só importa para cargas geradas e para a substituição aleatória
+        return not config.get("workload", "").startswith("trace:") or \
+            config.get("replacement", "LRU").upper() == "RANDOM"
+
+    def cacheable(self, config):
+        return config.get("seed") is not None or not self.seeded(config)
+
+    def key(self, config):
+        # Chave estável da configuração (mesma configuração -> mesma chave em qualquer máquina)
+        config = dict(config)
+        if "replacement" in config:
+            config["replacement"] = config["replacement"].upper()
+        if not self.seeded(config):
+            config.pop("seed", None)
+        default = Metrics()
+        costs = {name: getattr(default, name) for name in COST_FIELDS}
+        costs.update(config.get("costs") or {})
+        config["costs"] = costs
+        workload = config.get("workload", "")
+        if workload.startswith("trace:"):
+            config["workload"] = "trace-sha256:" + self.file_digest(workload[len("trace:"):])
+        config["simulator_version"] = SIMULATOR_VERSION
+        text = json.dumps(config, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, config):
+        if not self.cacheable(config):
+            self.bypassed += 1
+            return None
+        key = self.key(config)
+        row = self.db.execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.db:
+            self.db.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, config, result):
+        if not self.cacheable(config):
+            return None
+        key = self.key(config)
+        data = zlib.compress(json.dumps(result).encode())
+        now = time.time()
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                            (key, json.dumps(config, sort_keys=True), data, len(data), now, now))
+        self.evict()
+        return key
+
+    def total_bytes(self):
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def evict(self):
+        # Remove os resultados acessados há mais tempo até o total caber em max_bytes
+        excess = self.total_bytes() - self.max_bytes
+        if excess <= 0:
+            return 0
+        removed = 0
+        keys = []
+        for key, size in self.db.execute("SELECT key, size FROM results ORDER BY accessed"):
+            keys.append((key,))
+            removed += size
+            if removed >= excess:
+                break
+        with self.db:
+            self.db.executemany("DELETE FROM results WHERE key = ?", keys)
+        return len(keys)
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def cached(cache, config, compute):
+    # Resultado da configuração, do cache ou calculado por compute(config) e guardado
+    result = cache.get(config)
+    if result is None:
+        result = compute(config)
+        cache.put(config, result)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspeciona e limpa o cache de resultados")
+    parser.add_argument("arquivo", help="banco SQLite do cache")
+    parser.add_argument("--limite-mb", type=float, help="reduz o cache para este tamanho")
+    parser.add_argument("--limpar", action="store_true", help="remove todos os resultados")
+    args = parser.parse_args()
+
+    with ResultCache(args.arquivo) as cache:
+        if args.limpar:
+            with cache.db:
+                cache.db.execute("DELETE FROM results")
+            cache.db.execute("VACUUM")
+        if args.limite_mb is not None:
+            cache.max_bytes = int(args.limite_mb * 1024 * 1024)
+            print(f"{cache.evict()} resultados removidos")
+        print(f"{len(cache)} resultados, {cache.total_bytes() / 1024:.0f} KiB")
@@ -0,0 +1,118 @@
+from itertools import islice
+from random import Random
+
+from MOESIeMESIcomrelatorionofinal import uniform_instructions
+from trace_binario import TraceReader
+
+# Cargas de trabalho disponíveis para varreduras. Cada gerador recebe
+# (n, num_processors, memory_size, seed) e devolve um iterável de instruções
+# (processador, r_w, endereço, valor).
+
+
+def uniform(n, num_processors, memory_size, seed=None):
+    # Mesmo fluxo de CPU.generate_instructions
+    return uniform_instructions(n, num_processors, memory_size, seed)
+
+
+def high_contention(n, num_processors, memory_size, seed=None):
+    # 90% dos acessos caem em poucos blocos quentes, metade deles escritas: muitas
+    # invalidações e transferências cache-a-cache
+    rng = Random(seed)
+    randint, random = rng.randint, rng.random
+    last_processor = num_processors - 1
+    last_address = memory_size - 1
+    last_hot = min(memory_size, 4) - 1
+    for _ in range(n):
+        address = randint(0, last_hot) if random() < 0.9 else randint(0, last_address)
+        yield randint(0, last_processor), randint(0, 1), address, randint(0, 1000)
+
+
+def read_mostly(n, num_processors, memory_size, seed=None):
+    # Endereços uniformes com 95% de leituras: as linhas ficam compartilhadas (S)
+    rng = Random(seed)
+    randint, random = rng.randint, rng.random
+    last_processor = num_processors - 1
+    last_address = memory_size - 1
+    for _ in range(n):
+        yield randint(0, last_processor), int(random() < 0.05), randint(0, last_address), randint(0, 1000)
+
+
+def streaming(n, num_processors, memory_size, seed=None):
+    # Cada processador percorre a memória inteira em sequência, começando em pontos
+    # diferentes (1 escrita a cada 4 acessos): pouco compartilhamento ao mesmo tempo e
+    # misses de capacidade quando a memória não cabe na cache
+    randint = Random(seed).randint
+    last_processor = num_processors - 1
+    region = max(1, memory_size // num_processors)
+    positions = [0] * num_processors
+    for index in range(n):
+        proc = randint(0, last_processor)
+        address = (proc * region + positions[proc]) % memory_size
+        positions[proc] = (positions[proc] + 1) % memory_size
+        yield proc, int(index % 4 == 3), address, randint(0, 1000)
+
+
+def strided(n, num_processors, memory_size, seed=None, stride=2):
+    # Padrão de GHB e Stride/teste2.c: cada processador acessa base + i * stride
+    randint = Random(seed).randint
+    last_processor = num_processors - 1
+    region = max(1, memory_size // num_processors)
+    positions = [0] * num_processors
+    for index in range(n):
+        proc = randint(0, last_processor)
+        address = (proc * region + positions[proc] * stride) % memory_size
+        positions[proc] += 1
+        yield proc, int(index % 4 == 3), address, randint(0, 1000)
+
+
+def hybrid(n, num_processors, memory_size, seed=None):
+    # Padrão híbrido de teste2.c, i * 5 + i % 3: deltas 6, 6, 3 que se repetem. Não tem
+    # passo constante, mas é previsível por correlação de deltas (GHB)
+    randint = Random(seed).randint
+    last_processor = num_processors - 1
+    region = max(1, memory_size // num_processors)
+    positions = [0] * num_processors
+    for index in range(n):
+        proc = randint(0, last_processor)
+        position = positions[proc]
+        address = (proc * region + position * 5 + position % 3) % memory_size
+        positions[proc] += 1
+        yield proc, int(index % 4 == 3), address, randint(0, 1000)
+
+
+def vectorized(preset):
+    # Preset de geradores.py; o NumPy só é importado quando a carga é usada
+    def workload(n, num_processors, memory_size, seed=None):
+        from geradores import generate
+        return generate(preset, n, num_processors, memory_size, seed)
+    return workload
+
+
+WORKLOADS = {"uniform": uniform, "high_contention": high_contention, "read_mostly": read_mostly,
+             "streaming": streaming, "strided": strided, "hybrid": hybrid}
+for preset in ["producer_consumer", "migratory", "read_shared", "block_sharing", "zipf", "strided_scan",
+               "lock_contention"]:
+    WORKLOADS[preset] = vectorized(preset)
+
+
+def trace_file(path, n=None, start=0):
+    # Replay de um trace binário a partir da instrução start; n limita o número de instruções
+    with TraceReader(path) as reader:
+        remaining = (len(reader) if n is None else min(n, len(reader))) - start
+        for chunk in reader.chunks(start=start):
+            if remaining <= 0:
+                return
+            if len(chunk) > remaining:
+                chunk = chunk[:remaining]
+            remaining -= len(chunk)
+            yield from chunk
+
+
+def make_workload(name, n, num_processors, memory_size, seed=None, start=0):
+    # "trace:<arquivo>" reproduz um trace binário; os demais nomes vêm de WORKLOADS.
+    # start pula as primeiras instruções (retomada de um checkpoint).
+    if name.startswith("trace:"):
+        return trace_file(name[len("trace:"):], n, start)
+    if name not in WORKLOADS:
+        raise ValueError(f"Carga de trabalho desconhecida: {name}")
+    return islice(WORKLOADS[name](n, num_processors, memory_size, seed), start, None)
@@ -0,0 +1,227 @@
+import argparse
+import copy
+import os
+import pickle
+import struct
+import zlib
+from itertools import islice
+
+from MOESIeMESIcomrelatorionofinal import CPU, COHERENCE_MODES, COST_FIELDS, REPLACEMENT_POLICIES, AddressRows
+from cargas import WORKLOADS, make_workload
+from protocolos import PROTOCOLS
+
+# Checkpoint e restauração do estado completo da simulação: linhas de todas as caches
+# (endereços, estados, valores e estado da política de substituição), memória principal
+# (páginas tocadas e seus bitsets de blocos sujos), Metrics (incluindo o tráfego) e a
+# posição no fluxo de instruções.
+#
+# Formato: cabeçalho "<8sH" (MAGIC, versão) seguido de um dicionário serializado com
+# pickle e comprimido com zlib. Os estados das linhas são gravados pelo nome, então um
+# checkpoint pode ser restaurado com outro protocolo (bifurcação): estados que não existem
+# no protocolo de destino viram o estado compartilhado limpo, e linhas sujas nesses
+# estados são escritas na memória antes.
+
+MAGIC = b"MOESICKP"
+VERSION = 2
+HEADER = struct.Struct("<8sH")
+
+
+def _replacement_name(policy):
+    for name, policy_class in REPLACEMENT_POLICIES.items():
+        if type(policy) is policy_class:
+            return name
+    raise ValueError(f"Política de substituição desconhecida: {type(policy).__name__}")
+
+
+def _coherence_name(bus):
+    for name, bus_class in COHERENCE_MODES.items():
+        if type(bus) is bus_class:
+            return name
+    raise ValueError(f"Modo de coerência desconhecido: {type(bus).__name__}")
+
+
+def snapshot(cpu, position=None, workload=None):
+    # Estado da CPU como dicionário. position é o número de instruções já consumidas do
+    # fluxo (padrão: total executado); workload ({"name", "n", "seed"}) permite retomar
+    # o mesmo fluxo depois.
+    metrics = cpu.bus.metrics
+    first = cpu.processors[0].cache
+    names = cpu.protocol.valid_states
+    counters = {name: value for name, value in vars(metrics).items() if name not in COST_FIELDS and name != "traffic"}
+    return copy.deepcopy({
+        "config": {
+            "protocol": cpu.protocol.type,
+            "num_sets": first.num_sets,
+            "ways": first.ways,
+            "replacement": _replacement_name(first.replacement),
+            "memory_size": cpu.memory.size,
+            "page_size": cpu.memory.page_size,
+            "num_processors": len(cpu.processors),
+            "coherence": _coherence_name(cpu.bus),
+            "costs": {name: getattr(metrics, name) for name in COST_FIELDS},
+        },
+        "position": metrics.total_instructions if position is None else position,
+        "workload": workload,
+        "memory": {"pages": cpu.memory.pages, "dirty": cpu.memory.dirty},
+        "metrics": counters,
+        "traffic": {"per_processor": metrics.traffic.per_processor, "per_address": dict(metrics.traffic.per_address)},
+        "processors": [{
+            "clock": processor.clock,
+            "stall_cycles": processor.stall_cycles,
+            "addresses": processor.cache.addresses,
+            "values": processor.cache.values,
+            "states": [names[code] for code in processor.cache.states],
+            "replacement": vars(processor.cache.replacement),
+        } for processor in cpu.processors],
+    })
+
+
+def restore(state, protocol=None, costs=None):
+    # Nova CPU a partir de um snapshot. protocol e costs permitem bifurcar o estado
+    # aquecido em execuções com outro protocolo ou outros custos.
+    state = copy.deepcopy(state)
+    config = state["config"]
+    costs = dict(config["costs"], **(costs or {}))
+    cpu = CPU(protocol or config["protocol"], config["num_sets"], config["ways"], config["replacement"],
+              config["memory_size"], None, config["num_processors"], config["coherence"], costs, config["page_size"])
+    memory = cpu.memory
+    memory.pages = state["memory"]["pages"]
+    memory.dirty = state["memory"]["dirty"]
+    metrics = cpu.bus.metrics
+    for name, value in state["metrics"].items():
+        setattr(metrics, name, value)
+    metrics.traffic.per_processor = state["traffic"]["per_processor"]
+    metrics.traffic.per_address = AddressRows(state["traffic"]["per_address"])
+
+    target = cpu.protocol
+    codes = target.state_codes
+    shared = codes["S"] if "S" in codes else target.next_shared[0]  # Estado de um read miss compartilhado
+    source_dirty = set(PROTOCOLS[config["protocol"]]["dirty"])
+    for processor, saved in zip(cpu.processors, state["processors"]):
+        processor.clock = saved["clock"]
+        processor.stall_cycles = saved["stall_cycles"]
+        cache = processor.cache
+        cache.addresses = saved["addresses"]
+        cache.values = saved["values"]
+        vars(cache.replacement).update(saved["replacement"])
+        for slot, name in enumerate(saved["states"]):
+            address = cache.addresses[slot]
+            if address == -1:
+                continue
+            if name in codes:
+                cache.states[slot] = codes[name]
+            else:
+                if name in source_dirty:
+                    memory.write(address, cache.values[slot])
+                cache.states[slot] = shared
+            cache.slots[address] = slot
+            cache.valid_lines += 1
+            cpu.bus.track_fill(processor.processor_number, address)
+    return cpu
+
+
+def fork(state, variants):
+    # Uma CPU por variante ({"protocol": ..., "costs": {...}}), todas partindo do mesmo estado
+    return [restore(state, variant.get("protocol"), variant.get("costs")) for variant in variants]
+
+
+def save(path, state):
+    # Grava em um arquivo temporário e troca no final: um checkpoint interrompido não
+    # sobrescreve o anterior
+    data = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 6)
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION))
+        file.write(data)
+    os.replace(temporary, path)
+
+
+def load(path):
+    with open(path, "rb") as file:
+        magic, version = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} não é um checkpoint do simulador")
+        if version != VERSION:
+            raise ValueError(f"Versão de checkpoint não suportada: {version}")
+        return pickle.loads(zlib.decompress(file.read()))
+
+
+def run_with_checkpoints(cpu, instructions, interval, path, position=0, workload=None):
+    # Executa as instruções gravando um checkpoint a cada `interval` instruções e no final.
+    # Se path contém "{position}", cada checkpoint vai para um arquivo próprio.
+    instruction = cpu.bus.instruction
+    stream = iter(instructions)
+    while True:
+        count = 0
+        for proc, r_w, addr, val in islice(stream, interval):
+            instruction(proc, r_w, addr, val)
+            count += 1
+        position += count
+        save(path.format(position=position), snapshot(cpu, position, workload))
+        if count < interval:
+            return position
+
+
+def resume_instructions(state):
+    # Fluxo de instruções a partir da posição do checkpoint (exige state["workload"])
+    workload = state["workload"]
+    if workload is None:
+        raise ValueError("O checkpoint não registra a carga de trabalho; passe as instruções explicitamente")
+    if workload["seed"] is None and not workload["name"].startswith("trace:"):
+        # Sem semente a carga gerada seria outra, não a continuação da que foi interrompida
+        raise ValueError("O checkpoint não registra a semente da carga; passe as instruções explicitamente")
+    config = state["config"]
+    return make_workload(workload["name"], workload["n"], config["num_processors"], config["memory_size"],
+                         workload["seed"], state["position"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checkpoints e bifurcação de simulações longas")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("executar", help="executa uma carga gravando checkpoints periódicos")
+    run.add_argument("arquivo", help="checkpoint (aceita {position} no nome)")
+    run.add_argument("-n", type=int, required=True, help="número de instruções")
+    run.add_argument("--intervalo", type=int, default=1000000, help="instruções entre checkpoints")
+    run.add_argument("--protocolo", default="MESI", choices=sorted(PROTOCOLS))
+    run.add_argument("--nucleos", type=int, default=4)
+    run.add_argument("--memoria", type=int, default=4, help="número de blocos de memória")
+    run.add_argument("--carga", default="uniform", help=f"{'/'.join(WORKLOADS)} ou trace:<arquivo>")
+    run.add_argument("--seed", type=int, help="semente (padrão: sorteada e gravada no checkpoint)")
+
+    resume = commands.add_parser("retomar", help="continua a execução de um checkpoint")
+    resume.add_argument("arquivo")
+    resume.add_argument("--intervalo", type=int, default=1000000)
+    resume.add_argument("--saida", help="novo checkpoint (padrão: sobrescreve o arquivo)")
+
+    branch = commands.add_parser("bifurcar", help="continua um checkpoint com vários protocolos")
+    branch.add_argument("arquivo")
+    branch.add_argument("--protocolos", nargs="+", default=["MESI", "MOESI"], choices=sorted(PROTOCOLS))
+
+    args = parser.parse_args()
+    if args.command == "executar":
+        # A semente fica no checkpoint para a retomada regenerar o mesmo fluxo; sem --seed
+        # sorteia uma concreta
+        seed = args.seed if args.seed is not None else int.from_bytes(os.urandom(4), "little")
+        if args.seed is None:
+            print(f"Semente: {seed}")
+        workload = {"name": args.carga, "n": args.n, "seed": seed}
+        cpu = CPU(args.protocolo, memory_size=args.memoria, seed=seed, num_processors=args.nucleos)
+        instructions = make_workload(args.carga, args.n, args.nucleos, args.memoria, seed)
+        position = run_with_checkpoints(cpu, instructions, args.intervalo, args.arquivo, workload=workload)
+        print(f"{position} instruções executadas")
+        cpu.print_final_metrics()
+    elif args.command == "retomar":
+        state = load(args.arquivo)
+        cpu = restore(state)
+        position = run_with_checkpoints(cpu, resume_instructions(state), args.intervalo, args.saida or args.arquivo,
+                                        state["position"], state["workload"])
+        print(f"Retomado da instrução {state['position']} até {position}")
+        cpu.print_final_metrics()
+    else:
+        state = load(args.arquivo)
+        variants = [{"protocol": protocol} for protocol in args.protocolos]
+        for variant, cpu in zip(variants, fork(state, variants)):
+            cpu.run_simulation(resume_instructions(state))
+            print(f"\nProtocolo {variant['protocol']} (a partir da instrução {state['position']})")
+            cpu.print_final_metrics()
@@ -0,0 +1,88 @@
+import argparse
+
+from MOESIeMESIcomrelatorionofinal import CPU, describe_actions, uniform_instructions
+from protocolos import PROTOCOLS
+
+# Comparação em lockstep: cada instrução é gerada e decodificada uma única vez e aplicada
+# a todas as instâncias de protocolo em sequência, então todas veem exatamente o mesmo
+# fluxo. Ao final há as métricas de cada protocolo e as instruções em que as ações de bus
+# diferiram (ex.: "BusRd+Flush" no MESI contra "BusRd" no MOESI).
+
+
+class LockstepComparison:
+    def __init__(self, cpus, max_divergences=20):
+        # cpus: {"MESI": CPU("MESI"), "MOESI": CPU("MOESI"), ...}
+        self.cpus = cpus
+        self.max_divergences = max_divergences
+        self.divergences = []  # Primeiras instruções em que as ações de bus diferiram
+        self.divergent_instructions = 0
+        self.instructions = 0
+
+    def run(self, instructions):
+        names = list(self.cpus)
+        buses = [self.cpus[name].bus for name in names]
+        first_bus = buses[0]
+        index = self.instructions
+        for proc, r_w, addr, val in instructions:
+            for bus in buses:
+                bus.instruction(proc, r_w, addr, val)
+            action = first_bus.last_bus_action
+            for bus in buses:
+                if bus.last_bus_action != action:
+                    self.divergent_instructions += 1
+                    if len(self.divergences) < self.max_divergences:
+                        self.divergences.append({
+                            "index": index, "processor": proc, "r_w": r_w, "address": addr,
+                            "actions": {name: describe_actions(bus.last_bus_action)
+                                        for name, bus in zip(names, buses)},
+                        })
+                    break
+            index += 1
+        self.instructions = index
+
+    def report(self):
+        return {
+            "instructions": self.instructions,
+            "metrics": {name: cpu.get_metrics() for name, cpu in self.cpus.items()},
+            "first_divergence": self.divergences[0]["index"] if self.divergences else None,
+            "divergent_instructions": self.divergent_instructions,
+            "divergences": self.divergences,
+        }
+
+
+def compare_protocols(n, protocols=("MESI", "MOESI"), seed=None, instructions=None, **cpu_options):
+    # Roda os protocolos sobre o mesmo fluxo: o uniforme com `seed` ou `instructions`, se dado
+    cpus = {protocol: CPU(protocol, **cpu_options) for protocol in protocols}
+    if instructions is None:
+        first = next(iter(cpus.values()))
+        instructions = uniform_instructions(n, len(first.processors), first.memory.size, seed)
+    comparison = LockstepComparison(cpus)
+    comparison.run(instructions)
+    return comparison
+
+
+def print_divergences(report):
+    print(f"\nInstruções com ações de bus diferentes: {report['divergent_instructions']} de {report['instructions']}")
+    for divergence in report["divergences"]:
+        op = "escreve" if divergence["r_w"] else "lê"
+        actions = ", ".join(f"{name}: {action or '-'}" for name, action in divergence["actions"].items())
+        print(f"  #{divergence['index']}: Processador_{divergence['processor']} {op} o endereço "
+              f"{divergence['address']} -> {actions}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara protocolos em lockstep sobre o mesmo fluxo de instruções")
+    parser.add_argument("-n", type=int, default=10000, help="número de instruções")
+    parser.add_argument("--protocolos", nargs="+", default=["MESI", "MOESI"], choices=sorted(PROTOCOLS))
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--nucleos", type=int, default=4)
+    parser.add_argument("--memoria", type=int, default=4, help="número de blocos de memória")
+    args = parser.parse_args()
+
+    comparison = compare_protocols(args.n, args.protocolos, args.seed,
+                                   num_processors=args.nucleos, memory_size=args.memoria)
+    report = comparison.report()
+    for name, cpu in comparison.cpus.items():
+        print(f"\nProtocolo {name}")
+        cpu.print_final_metrics()
+    print_divergences(report)
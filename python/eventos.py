@@ -0,0 +1,370 @@
+import argparse
+import json
+import struct
+
+from MOESIeMESIcomrelatorionofinal import CPU
+from cargas import WORKLOADS, make_workload
+from protocolos import BUS_ACTIONS, PROTOCOLS
+
+# Eventos tipados do Bus e dos processadores para quem quiser observar a coerência em
+# detalhe (printStatus imprime a máquina inteira e só serve para poucas instruções).
+#
+# EventHooks se instala trocando métodos de instância (Processor.access/evict e
+# Bus.snoop/flush/writeback) por versões que emitem eventos, e só os métodos necessários
+# para os tipos assinados. Sem assinantes nada fica instalado e o laço principal roda o
+# código normal, sem custo nenhum. Instale os ganchos depois das outras extensões que
+# trocam esses métodos (LLC, buffers de escrita), para que o desligamento as preserve.
+#
+# Cada evento chega ao assinante como (tipo, ciclo, processador, endereço, a, b), com o
+# ciclo igual a total_cycles no momento do evento:
+# - ACCESS: a = r_w, b = ciclos gastos pelo acesso (emitido no fim)
+# - HIT/MISS: a = r_w (emitido no início do acesso)
+# - TRANSITION: a = estado anterior, b = estado novo (na cache de `processador`, por um
+#   acesso dele ou por um snoop)
+# - SNOOP: processador = quem pediu, a = evento de bus, b = 1 se outra cache tinha a linha
+# - INVALIDATION: processador = cache invalidada, a = quem pediu, b = evento de bus
+# - WRITEBACK: a = 0 (substituição) ou 1 (flush em resposta a um snoop), b = valor
+# - EVICTION: a = estado da linha substituída, b = 1 se estava suja
+ACCESS, HIT, MISS, TRANSITION, SNOOP, INVALIDATION, WRITEBACK, EVICTION = range(8)
+EVENT_NAMES = ["access", "hit", "miss", "transition", "snoop", "invalidation", "writeback", "eviction"]
+ALL_EVENTS = (1 << len(EVENT_NAMES)) - 1
+BUS_EVENT_NAMES = {code: name for name, code in BUS_ACTIONS.items() if name}
+
+# Tipos que cada método trocado emite
+ACCESS_EVENTS = 1 << ACCESS | 1 << HIT | 1 << MISS | 1 << TRANSITION
+SNOOP_EVENTS = 1 << SNOOP | 1 << INVALIDATION | 1 << TRANSITION
+WRITEBACK_EVENTS = 1 << WRITEBACK
+EVICTION_EVENTS = 1 << EVICTION
+
+
+def event_mask(names):
+    # Nomes de EVENT_NAMES -> bitmask de tipos (None = todos)
+    if names is None:
+        return ALL_EVENTS
+    mask = 0
+    for name in names:
+        if name not in EVENT_NAMES:
+            raise ValueError(f"Evento desconhecido: {name}")
+        mask |= 1 << EVENT_NAMES.index(name)
+    return mask
+
+
+class EventHooks:
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.bus = cpu.bus
+        self.subscribers = []  # (callback, máscara de tipos, processadores ou None, endereço mínimo, máximo)
+        self.installed = 0  # Máscara dos grupos de métodos trocados
+        self.saved = []  # (objeto, nome, atributo de instância anterior ou None)
+
+    def subscribe(self, callback, events=None, processors=None, addresses=None):
+        # events: nomes de EVENT_NAMES; processors: números dos núcleos; addresses: (início, fim)
+        low, high = addresses if addresses is not None else (0, float("inf"))
+        subscriber = (callback, event_mask(events), None if processors is None else frozenset(processors),
+                      low, high)
+        self.subscribers.append(subscriber)
+        self._reinstall()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.remove(subscriber)
+        self._reinstall()
+
+    def emit(self, kind, cycle, processor, address, a, b):
+        for callback, mask, processors, low, high in self.subscribers:
+            if mask >> kind & 1 and (processors is None or processor in processors) and low <= address < high:
+                callback(kind, cycle, processor, address, a, b)
+
+    def _reinstall(self):
+        wanted = 0
+        for _, mask, _, _, _ in self.subscribers:
+            wanted |= mask
+        if wanted == self.installed:
+            return
+        self._restore()
+        if wanted & ACCESS_EVENTS:
+            for processor in self.bus.processors:
+                self._swap(processor, "access", self._access_hook(processor))
+        if wanted & SNOOP_EVENTS:
+            self._swap(self.bus, "snoop", self._snoop_hook())
+        if wanted & WRITEBACK_EVENTS:
+            self._swap(self.bus, "writeback", self._writeback_hook(self.bus.writeback, 0))
+            self._swap(self.bus, "flush", self._writeback_hook(self.bus.flush, 1))
+        if wanted & EVICTION_EVENTS:
+            for processor in self.bus.processors:
+                self._swap(processor, "evict", self._evict_hook(processor))
+        self.installed = wanted
+
+    def _swap(self, obj, name, method):
+        self.saved.append((obj, name, obj.__dict__.get(name)))
+        setattr(obj, name, method)
+
+    def _restore(self):
+        # Desfaz as trocas na ordem inversa, devolvendo o que havia antes (método da classe
+        # ou a troca de outra extensão)
+        for obj, name, previous in reversed(self.saved):
+            if previous is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, previous)
+        self.saved.clear()
+
+    def _access_hook(self, processor):
+        access = processor.access
+        cache = processor.cache
+        metrics = self.bus.metrics
+        number = processor.processor_number
+        emit = self.emit
+
+        def hooked_access(r_w, address, value=0):
+            slot = cache.slots.get(address, -1)
+            old = 0 if slot == -1 else cache.states[slot]
+            start = metrics.total_cycles
+            emit(MISS if slot == -1 else HIT, start, number, address, r_w, 0)
+            result = access(r_w, address, value)
+            slot = cache.slots.get(address, -1)
+            new = 0 if slot == -1 else cache.states[slot]
+            if new != old:
+                emit(TRANSITION, metrics.total_cycles, number, address, old, new)
+            emit(ACCESS, metrics.total_cycles, number, address, r_w, metrics.total_cycles - start)
+            return result
+
+        return hooked_access
+
+    def _snoop_hook(self):
+        bus = self.bus
+        snoop = bus.snoop
+        metrics = bus.metrics
+        emit = self.emit
+
+        def hooked_snoop(processor_no, event, address, value):
+            # Estados da linha nas outras caches antes do snoop, para detectar transições
+            before = []
+            for processor in bus.processors:
+                slot = processor.cache.slots.get(address, -1)
+                if slot != -1 and processor.processor_number != processor_no:
+                    before.append((processor, processor.cache.states[slot]))
+            shared, data = snoop(processor_no, event, address, value)
+            cycle = metrics.total_cycles
+            emit(SNOOP, cycle, processor_no, address, event, int(shared))
+            for processor, old in before:
+                cache = processor.cache
+                slot = cache.slots.get(address, -1)
+                new = 0 if slot == -1 else cache.states[slot]
+                if slot == -1:
+                    emit(INVALIDATION, cycle, processor.processor_number, address, processor_no, event)
+                if new != old:
+                    emit(TRANSITION, cycle, processor.processor_number, address, old, new)
+            return shared, data
+
+        return hooked_snoop
+
+    def _writeback_hook(self, method, kind):
+        metrics = self.bus.metrics
+        emit = self.emit
+
+        def hooked_writeback(address, value, processor_no):
+            method(address, value, processor_no)
+            emit(WRITEBACK, metrics.total_cycles, processor_no, address, kind, value)
+
+        return hooked_writeback
+
+    def _evict_hook(self, processor):
+        evict = processor.evict
+        cache = processor.cache
+        metrics = self.bus.metrics
+        dirty = processor.protocol.dirty
+        number = processor.processor_number
+        emit = self.emit
+
+        def hooked_evict(slot):
+            address, state = cache.addresses[slot], cache.states[slot]
+            evict(slot)
+            emit(EVICTION, metrics.total_cycles, number, address, state, int(dirty[state]))
+
+        return hooked_evict
+
+    def close(self):
+        self.subscribers.clear()
+        self._reinstall()
+
+
+# Log binário: cabeçalho de 32 bytes (magic, versão, número de núcleos, protocolo) e
+# registros de 36 bytes (tipo, processador, ciclo, endereço, a, b), little-endian
+LOG_MAGIC = b"MOESIEVT"
+LOG_VERSION = 1
+LOG_HEADER = struct.Struct("<8sHH16s4x")
+LOG_RECORD = struct.Struct("<BxHqqqq")
+DEFAULT_BUFFER = 65536  # Eventos acumulados antes de cada escrita no arquivo
+
+
+class EventLogger:
+    def __init__(self, path, protocol_type, num_processors, buffer_events=DEFAULT_BUFFER):
+        self.path = path
+        self.buffer = bytearray()
+        self.buffer_bytes = buffer_events * LOG_RECORD.size
+        self.count = 0
+        self.file = open(path, "wb")
+        self.file.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, num_processors, protocol_type.encode()[:16]))
+
+    def __call__(self, kind, cycle, processor, address, a, b):
+        self.buffer += LOG_RECORD.pack(kind, processor, cycle, address, a, b)
+        self.count += 1
+        if len(self.buffer) >= self.buffer_bytes:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_events(path):
+    # Devolve (protocolo, número de núcleos, lista de eventos) de um log binário
+    with open(path, "rb") as file:
+        data = file.read()
+    if len(data) < LOG_HEADER.size:
+        raise ValueError(f"{path}: arquivo menor que o cabeçalho do log")
+    magic, version, num_processors, protocol_type = LOG_HEADER.unpack_from(data)
+    if magic != LOG_MAGIC:
+        raise ValueError(f"{path}: não é um log de eventos do simulador")
+    if version != LOG_VERSION:
+        raise ValueError(f"{path}: versão de log não suportada ({version})")
+    # Um log interrompido pode terminar no meio de um registro
+    end = LOG_HEADER.size + (len(data) - LOG_HEADER.size) // LOG_RECORD.size * LOG_RECORD.size
+    events = [(kind, cycle, processor, address, a, b)
+              for kind, processor, cycle, address, a, b in LOG_RECORD.iter_unpack(data[LOG_HEADER.size:end])]
+    return protocol_type.rstrip(b"\0").decode(), num_processors, events
+
+
+class ChromeTraceExporter:
+    # Trace no formato JSON do Chrome (chrome://tracing, Perfetto): uma trilha por núcleo,
+    # acessos como fatias com duração e os demais eventos como instantâneos. Um ciclo vira
+    # um microssegundo na linha do tempo. Os eventos são gravados à medida que chegam.
+    def __init__(self, path, protocol_type, num_processors):
+        self.states = PROTOCOLS[protocol_type]["states"]
+        self.count = 0
+        self.file = open(path, "w", encoding="utf-8")
+        self.file.write('{"displayTimeUnit": "ns", "traceEvents": [\n')
+        names = [{"name": "process_name", "ph": "M", "pid": 0, "args": {"name": f"Protocolo {protocol_type}"}}]
+        names += [{"name": "thread_name", "ph": "M", "pid": 0, "tid": number,
+                   "args": {"name": f"Processador {number}"}} for number in range(num_processors)]
+        self.file.write(",\n".join(json.dumps(event) for event in names))
+
+    def __call__(self, kind, cycle, processor, address, a, b):
+        event = {"pid": 0, "tid": processor, "ts": cycle}
+        if kind == ACCESS:
+            event.update(name=f"{'write' if a else 'read'} {address}", ph="X", dur=max(b, 1), cat="access",
+                         args={"address": address, "cycles": b})
+        else:
+            event.update(ph="i", s="t", cat=EVENT_NAMES[kind], args={"address": address})
+            if kind == TRANSITION:
+                event["name"] = f"{self.states[a]}->{self.states[b]} {address}"
+            elif kind == SNOOP:
+                event["name"] = f"{BUS_EVENT_NAMES[a]} {address}"
+                event["args"]["shared"] = bool(b)
+            elif kind == INVALIDATION:
+                event["name"] = f"invalidation {address}"
+                event["args"].update(requester=a, bus_event=BUS_EVENT_NAMES[b])
+            elif kind == WRITEBACK:
+                event["name"] = f"{'flush' if a else 'writeback'} {address}"
+                event["args"]["value"] = b
+            elif kind == EVICTION:
+                event["name"] = f"eviction {address}"
+                event["args"].update(state=self.states[a], dirty=bool(b))
+            else:
+                event["name"] = f"{EVENT_NAMES[kind]} {address}"
+        self.file.write(",\n")
+        self.file.write(json.dumps(event))
+        self.count += 1
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.write("\n]}\n")
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export_chrome(log_path, out_path, events=None, processors=None, addresses=None):
+    # Converte um log binário para o formato do Chrome aplicando os mesmos filtros de subscribe
+    protocol_type, num_processors, records = read_events(log_path)
+    mask = event_mask(events)
+    low, high = addresses if addresses is not None else (0, float("inf"))
+    with ChromeTraceExporter(out_path, protocol_type, num_processors) as exporter:
+        for kind, cycle, processor, address, a, b in records:
+            if mask >> kind & 1 and (processors is None or processor in processors) and low <= address < high:
+                exporter(kind, cycle, processor, address, a, b)
+    return exporter.count
+
+
+def parse_range(text):
+    # "início:fim" (fim exclusivo) -> (início, fim)
+    low, _, high = text.partition(":")
+    return int(low), int(high)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Eventos de coerência: log binário e trace do Chrome/Perfetto")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("executar", help="executa uma simulação registrando eventos")
+    run.add_argument("-n", type=int, default=10000, help="número de instruções")
+    run.add_argument("--protocolo", default="MESI", choices=sorted(PROTOCOLS))
+    run.add_argument("--nucleos", type=int, default=4)
+    run.add_argument("--memoria", type=int, default=64, help="número de blocos de memória")
+    run.add_argument("--conjuntos", type=int, default=4)
+    run.add_argument("--vias", type=int, default=2)
+    run.add_argument("--carga", default="uniform", help=f"{'/'.join(WORKLOADS)} ou trace:<arquivo>")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--log", help="grava os eventos no log binário")
+    run.add_argument("--chrome", help="grava os eventos no formato JSON do Chrome/Perfetto")
+
+    export = commands.add_parser("exportar", help="converte um log binário para o formato do Chrome")
+    export.add_argument("log")
+    export.add_argument("saida")
+
+    for command in (run, export):
+        command.add_argument("--eventos", nargs="+", choices=EVENT_NAMES, help="tipos de evento (padrão: todos)")
+        command.add_argument("--processadores", type=int, nargs="+", help="núcleos observados (padrão: todos)")
+        command.add_argument("--enderecos", type=parse_range, help="faixa de endereços início:fim")
+    args = parser.parse_args()
+
+    if args.command == "exportar":
+        total = export_chrome(args.log, args.saida, args.eventos, args.processadores, args.enderecos)
+        print(f"{total} eventos escritos em {args.saida}")
+    else:
+        if not args.log and not args.chrome:
+            parser.error("use --log e/ou --chrome")
+        cpu = CPU(args.protocolo, args.conjuntos, args.vias, memory_size=args.memoria, seed=args.seed,
+                  num_processors=args.nucleos)
+        hooks = EventHooks(cpu)
+        outputs = []
+        if args.log:
+            outputs.append(EventLogger(args.log, args.protocolo, args.nucleos))
+        if args.chrome:
+            outputs.append(ChromeTraceExporter(args.chrome, args.protocolo, args.nucleos))
+        for output in outputs:
+            hooks.subscribe(output, args.eventos, args.processadores, args.enderecos)
+        cpu.run_simulation(make_workload(args.carga, args.n, args.nucleos, args.memoria, args.seed))
+        hooks.close()
+        for output in outputs:
+            output.close()
+            print(f"{output.count} eventos escritos em {output.file.name}")
+        cpu.print_final_metrics()
@@ -0,0 +1,241 @@
+import argparse
+import time
+
+import numpy as np
+
+from trace_binario import TraceWriter
+
+# Geradores sintéticos vetorizados com NumPy. Cada preset produz um bloco inteiro de
+# instruções por chamada (arrays de processador, r_w, endereço e valor), então a geração
+# não tem laço Python por instrução. Os blocos podem ir direto para o simulador (listas de
+# tuplas, como TraceReader.chunks) ou para um trace binário sem passar por tuplas.
+#
+# Os sorteios são feitos em blocos internos de BLOCK instruções, independentes do tamanho
+# pedido a cada chamada: para uma semente, o fluxo é o mesmo com qualquer n ou chunk_size
+# (um fluxo mais curto é prefixo de um mais longo).
+#
+# Vazão medida de WorkloadGenerator.records (8 núcleos, 2^20 blocos, uma CPU): 20 a 40
+# milhões de registros por segundo na maioria dos presets, cerca de 17M/s em
+# lock_contention e 12 a 14M/s em zipf. write_trace ainda soma a escrita do arquivo.
+#
+# Todos os presets recebem a fração de escritas (write_ratio) e uma semente; os demais
+# parâmetros são específicos de cada padrão de compartilhamento. O migratório ignora
+# write_ratio: as leituras-modificações-escritas fixam metade de escritas.
+
+DEFAULT_CHUNK = 65536
+BLOCK = 65536  # Instruções sorteadas de uma vez pelo gerador
+
+
+def _private_regions(memory_size, num_processors):
+    # Tamanho da faixa privada de cada processador (pelo menos um bloco)
+    return max(1, memory_size // num_processors)
+
+
+def producer_consumer(rng, index, num_processors, memory_size, write_ratio, buffer_blocks=8):
+    # Processadores em pares: o par (2k, 2k+1) compartilha um buffer circular; o produtor
+    # (par) escreve e o consumidor (ímpar) lê o mesmo bloco. write_ratio é a fração de
+    # acessos feitos pelos produtores.
+    n = len(index)
+    pairs = max(1, num_processors // 2)
+    pair = rng.integers(0, pairs, n)
+    producer = rng.random(n) < write_ratio
+    procs = np.minimum(2 * pair + ~producer, num_processors - 1)
+    buffer_blocks = min(buffer_blocks, _private_regions(memory_size, pairs))
+    addresses = (pair * buffer_blocks + (index // num_processors) % buffer_blocks) % memory_size
+    return procs, producer, addresses
+
+
+def migratory(rng, index, num_processors, memory_size, write_ratio, run_length=16, blocks=4):
+    # Poucos blocos migram entre processadores: em cada época de run_length acessos um
+    # processador faz leituras-modificações-escritas em um dos blocos (uma leitura seguida
+    # de uma escrita no mesmo endereço), depois outro assume
+    epochs = index // run_length
+    first = epochs[0]
+    count = epochs[-1] - first + 1
+    owners = rng.integers(0, num_processors, count)
+    targets = rng.integers(0, min(blocks, memory_size), count)
+    procs = owners[epochs - first]
+    addresses = targets[epochs - first]
+    return procs, (index - epochs * run_length) % 2 == 1, addresses
+
+
+def read_shared(rng, index, num_processors, memory_size, write_ratio):
+    # Endereços uniformes, quase só leituras: as linhas ficam em S em várias caches
+    n = len(index)
+    return rng.integers(0, num_processors, n), rng.random(n) < write_ratio, rng.integers(0, memory_size, n)
+
+
+def block_sharing(rng, index, num_processors, memory_size, write_ratio, words_per_line=8):
+    # Grupos de words_per_line processadores vizinhos usam o mesmo bloco e a linha pula
+    # entre eles a cada escrita. Num programa real seriam palavras diferentes da mesma linha
+    # (falso compartilhamento), mas o simulador só enxerga blocos, então aqui isso é
+    # indistinguível de compartilhamento verdadeiro
+    n = len(index)
+    procs = rng.integers(0, num_processors, n)
+    return procs, rng.random(n) < write_ratio, (procs // words_per_line) % memory_size
+
+
+class _ZipfTable:
+    # CDF da distribuição de Zipf sobre os blocos e uma permutação que espalha os blocos
+    # quentes pelo espaço de endereços; calculada uma vez por gerador. A tabela-guia dá,
+    # para cada fatia [j/m, (j+1)/m) de u, o primeiro bloco cuja CDF pode alcançar u: a busca
+    # começa ali e anda poucos passos, em vez de uma busca binária na CDF inteira.
+    def __init__(self, rng, memory_size, exponent):
+        weights = 1.0 / np.arange(1, memory_size + 1) ** exponent
+        self.cdf = np.cumsum(weights / weights.sum())
+        self.permutation = rng.permutation(memory_size)
+        # Uma entrada a mais: u * memory_size pode arredondar para memory_size
+        self.guide = np.minimum(np.searchsorted(self.cdf, np.arange(memory_size + 1) / memory_size), memory_size - 1)
+
+    def ranks(self, u):
+        # Mesmo resultado de min(searchsorted(cdf, u), memory_size - 1)
+        cdf = self.cdf
+        last = len(cdf) - 1
+        ranks = self.guide[(u * len(cdf)).astype(np.int64)]
+        pending = np.flatnonzero((cdf[ranks] < u) & (ranks < last))
+        while pending.size:
+            ranks[pending] += 1
+            moved = ranks[pending]
+            pending = pending[(cdf[moved] < u[pending]) & (moved < last)]
+        return ranks
+
+
+def zipf(rng, index, num_processors, memory_size, write_ratio, exponent=1.0, table=None):
+    n = len(index)
+    ranks = table.ranks(rng.random(n))
+    return rng.integers(0, num_processors, n), rng.random(n) < write_ratio, table.permutation[ranks]
+
+
+def strided_scan(rng, index, num_processors, memory_size, write_ratio, stride=1):
+    # Os processadores se alternam em rodízio; cada um varre a memória com passo fixo a
+    # partir do início da sua faixa
+    n = len(index)
+    procs = index % num_processors
+    steps = index // num_processors
+    addresses = (procs * _private_regions(memory_size, num_processors) + steps * stride) % memory_size
+    return procs, rng.random(n) < write_ratio, addresses
+
+
+def lock_contention(rng, index, num_processors, memory_size, write_ratio, lock_fraction=0.3, protected_blocks=4):
+    # Um bloco de lock disputado por todos (spin: leituras, com tentativas de aquisição
+    # na proporção write_ratio) e alguns blocos protegidos, lidos e escritos na seção crítica
+    n = len(index)
+    procs = rng.integers(0, num_processors, n)
+    on_lock = rng.random(n) < lock_fraction
+    addresses = 1 + rng.integers(0, max(1, min(protected_blocks, memory_size - 1)), n)
+    addresses[on_lock] = 0
+    if memory_size == 1:
+        addresses[:] = 0
+    # Um único sorteio para as escritas, com a probabilidade de cada tipo de acesso
+    writes = rng.random(n) < np.where(on_lock, write_ratio, 0.5)
+    return procs, writes, addresses
+
+
+# Preset -> (função, fração de escritas padrão)
+PRESETS = {
+    "producer_consumer": (producer_consumer, 0.5),
+    "migratory": (migratory, 0.5),
+    "read_shared": (read_shared, 0.05),
+    "block_sharing": (block_sharing, 0.5),
+    "zipf": (zipf, 0.3),
+    "strided_scan": (strided_scan, 0.25),
+    "lock_contention": (lock_contention, 0.1),
+}
+
+
+class WorkloadGenerator:
+    def __init__(self, preset, num_processors, memory_size, seed=None, write_ratio=None, **params):
+        if preset not in PRESETS:
+            raise ValueError(f"Preset desconhecido: {preset}")
+        self.function, default_ratio = PRESETS[preset]
+        self.preset = preset
+        self.num_processors = num_processors
+        self.memory_size = memory_size
+        self.seed = seed
+        self.write_ratio = default_ratio if write_ratio is None else write_ratio
+        self.rng = np.random.default_rng(seed)
+        self.params = params
+        if preset == "zipf":
+            self.params["table"] = _ZipfTable(self.rng, memory_size, params.get("exponent", 1.0))
+        self.position = 0  # Índice global da próxima instrução
+        self.block = None  # Último bloco sorteado e quantas instruções dele já foram entregues
+        self.used = BLOCK
+
+    def _next_block(self):
+        # Só é chamado com o bloco anterior todo entregue, então começa em self.position
+        index = np.arange(self.position, self.position + BLOCK, dtype=np.int64)
+        procs, writes, addresses = self.function(self.rng, index, self.num_processors, self.memory_size,
+                                                 self.write_ratio, **self.params)
+        values = self.rng.integers(0, 1001, BLOCK, dtype=np.uint32)
+        self.block = (procs, writes.astype(np.uint8), addresses, values)
+        self.used = 0
+
+    def arrays(self, size):
+        # Próximas `size` instruções como arrays (processador, r_w, endereço, valor)
+        parts = []
+        while True:
+            if self.used == BLOCK:
+                self._next_block()
+            take = min(size, BLOCK - self.used)
+            parts.append([array[self.used:self.used + take] for array in self.block])
+            self.used += take
+            self.position += take
+            size -= take
+            if not size:
+                break
+        if len(parts) == 1:
+            return tuple(parts[0])
+        return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+    def chunks(self, n, chunk_size=DEFAULT_CHUNK):
+        # Blocos de tuplas (processador, r_w, endereço, valor) prontos para CPU.run_simulation
+        for first in range(0, n, chunk_size):
+            procs, writes, addresses, values = self.arrays(min(chunk_size, n - first))
+            yield list(zip(procs.tolist(), writes.tolist(), addresses.tolist(), values.tolist()))
+
+    def records(self, size, address_width=4):
+        # Próximo bloco já no layout dos registros do trace binário
+        dtype = np.dtype([("proc", "<u2"), ("r_w", "u1"), ("pad", "u1"),
+                          ("address", "<u4" if address_width == 4 else "<u8"), ("value", "<u4")])
+        procs, writes, addresses, values = self.arrays(size)
+        records = np.zeros(size, dtype)
+        records["proc"] = procs
+        records["r_w"] = writes
+        records["address"] = addresses
+        records["value"] = values
+        return records
+
+
+def generate(preset, n, num_processors, memory_size, seed=None, write_ratio=None, chunk_size=DEFAULT_CHUNK, **params):
+    # Fluxo de instruções no formato das cargas de cargas.py
+    generator = WorkloadGenerator(preset, num_processors, memory_size, seed, write_ratio, **params)
+    for chunk in generator.chunks(n, chunk_size):
+        yield from chunk
+
+
+def write_trace(path, preset, n, num_processors, memory_size, seed=None, write_ratio=None, chunk_size=DEFAULT_CHUNK,
+                **params):
+    # Grava o preset em um trace binário direto dos arrays, sem montar tuplas
+    generator = WorkloadGenerator(preset, num_processors, memory_size, seed, write_ratio, **params)
+    address_width = 4 if memory_size <= 2 ** 32 else 8
+    with TraceWriter(path, num_processors, address_width, seed, preset, memory_size) as writer:
+        for first in range(0, n, chunk_size):
+            writer.write_records(generator.records(min(chunk_size, n - first), address_width).tobytes())
+    return writer.count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera traces sintéticos com padrões de compartilhamento")
+    parser.add_argument("preset", choices=sorted(PRESETS))
+    parser.add_argument("arquivo", help="trace binário de saída")
+    parser.add_argument("-n", type=int, required=True, help="número de instruções")
+    parser.add_argument("--nucleos", type=int, default=4)
+    parser.add_argument("--memoria", type=int, default=1024, help="número de blocos de memória")
+    parser.add_argument("--escritas", type=float, help="fração de escritas (padrão do preset)")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    total = write_trace(args.arquivo, args.preset, args.n, args.nucleos, args.memoria, args.seed, args.escritas)
+    elapsed = time.perf_counter() - start
+    print(f"{total} instruções escritas em {args.arquivo} ({total / elapsed:,.0f} registros/s)")
@@ -0,0 +1,65 @@
+import matplotlib
+
+# Gráficos do simulador. Este módulo é o único que importa matplotlib e só é carregado
+# quando algum gráfico é pedido, então o núcleo e as execuções em lote não pagam essa
+# importação. Com `path` o gráfico é gravado em arquivo pelo backend Agg (não precisa de
+# display); sem `path` é mostrado na tela como antes.
+
+COLORS = ("blue", "orange", "green", "red", "purple", "brown")
+
+
+def _pyplot(path):
+    if path:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _finish(plt, path):
+    plt.tight_layout()
+    if path:
+        plt.savefig(path)
+        plt.close()
+    else:
+        plt.show()
+
+
+def plot_miss_rates(metrics_by_protocol, path=None):
+    # Barras com a taxa de miss final de cada protocolo ({nome: get_metrics()})
+    plt = _pyplot(path)
+    labels = list(metrics_by_protocol)
+    miss_rates = [metrics["miss_rate"] for metrics in metrics_by_protocol.values()]
+
+    x = range(len(labels))
+
+    fig, ax = plt.subplots(figsize=(6, 6))
+    ax.bar(x, miss_rates, width=0.4, color=[COLORS[i % len(COLORS)] for i in x], label='Taxa de Cache Miss')
+
+    ax.set_ylabel('Taxa de Cache Miss')
+    ax.set_title(f"Comparação da Taxa de Cache Miss entre {' e '.join(labels)}")
+    ax.set_xticks(x)
+    ax.set_xticklabels(labels)
+    ax.legend()
+    _finish(plt, path)
+
+
+def plot_comparison(mesi_metrics, moesi_metrics, path=None):
+    plot_miss_rates({"MESI": mesi_metrics, "MOESI": moesi_metrics}, path)
+
+
+def plot_miss_rate(recorder, protocol_name, path=None):
+    # Evolução da taxa de miss de um MetricsRecorder: média de cada balde e a faixa entre
+    # mínimo e máximo
+    plt = _pyplot(path)
+    positions, minimums, maximums, means = recorder.series["miss_rate"].points()
+    cumulative = recorder.series["cumulative_miss_rate"].points()
+    plt.figure(figsize=(10, 6))
+    plt.fill_between(positions, minimums, maximums, color="blue", alpha=0.2, label="Mín/Máx da janela")
+    plt.plot(positions, means, label="Taxa de Cache Miss (janela)", color="blue")
+    plt.plot(cumulative[0], cumulative[3], label="Taxa de Cache Miss (acumulada)", color="orange")
+    plt.xlabel("Instrução")
+    plt.ylabel("Taxa de Cache Miss")
+    plt.title(f"Evolução da Taxa de Cache Miss ({protocol_name} Protocol)")
+    plt.grid(True)
+    plt.legend()
+    _finish(plt, path)
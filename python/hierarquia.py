@@ -0,0 +1,292 @@
+import argparse
+
+from MOESIeMESIcomrelatorionofinal import (ACTION_BITS, BUS_READ_EXCLUSIVES, CPU, Cache, DIRTY_WRITEBACKS, FLUSH_BIT,
+                                           INVALIDATIONS_RECEIVED, INVALIDATIONS_SENT, WRITEBACK_BIT)
+from cargas import WORKLOADS, make_workload
+from protocolos import BUS_EVENTS, BUS_RDX, MISS, PROTOCOLS
+
+# Hierarquia de dois níveis: as caches de cada processador passam a ser L1 privadas,
+# mantidas coerentes pelo protocolo do bus como antes, e ficam atrás de uma LLC
+# compartilhada com geometria, latência e política de inclusão próprias.
+#
+# A LLC se instala no lugar da memória vista pelo bus e pelos processadores (read/write),
+# de Bus.flush e Bus.writeback (dados sujos que saem das L1 vão para a LLC) e, na política
+# exclusiva, de Processor.evict (linhas limpas substituídas nas L1 descem para a LLC).
+# Um miss na L1 passa a custar a latência da LLC em vez de memory_access_cycles; a memória
+# só é paga quando a LLC também erra ou escreve uma linha suja de volta.
+#
+# Políticas de inclusão:
+# - "inclusive": toda linha de uma L1 está na LLC. Uma linha substituída na LLC é
+#   invalidada nas L1 (back-invalidation) por um BusRdX no bus, em nome do processador da
+#   instrução atual: as L1 seguem a tabela de snoop do protocolo, cópias sujas são escritas
+#   na memória (flush) e o diretório é atualizado.
+# - "exclusive": a LLC guarda só linhas que não estão em nenhuma L1 (cache de vítimas). Um
+#   hit na LLC move a linha para a L1; linhas substituídas nas L1 entram na LLC.
+# - "non-inclusive": a LLC recebe as linhas vindas da memória e os dados sujos das L1, mas
+#   pode substituir uma linha sem tirá-la das L1.
+#
+# A LLC deve ser instalada depois de CPU.set_costs (que refaz os custos do protocolo).
+
+INCLUSION_POLICIES = ["inclusive", "exclusive", "non-inclusive"]
+
+
+class LastLevelCache:
+    def __init__(self, cpu, num_sets=64, ways=8, latency=20, policy="inclusive", replacement="LRU", seed=None):
+        if policy not in INCLUSION_POLICIES:
+            raise ValueError(f"Política de inclusão inválida: {policy}")
+        self.cpu = cpu
+        self.bus = cpu.bus
+        self.memory = cpu.memory
+        self.size = cpu.memory.size
+        self.policy = policy
+        self.latency = latency
+        self.cache = Cache(None, num_sets, ways, replacement, seed)
+        self.dirty = bytearray(self.cache.size)  # Linhas da LLC mais novas que a memória
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0  # Linhas sujas da LLC escritas na memória
+        self.back_invalidations = 0  # Cópias invalidadas nas L1 por substituições na LLC
+        self.memory_reads = 0
+        self.memory_writes = 0
+        self.store_cycles = 0  # Ciclos de escritas vindas das L1 (além dos misses das L1)
+        self.memory_cycles = 0  # Ciclos pagos à memória principal
+
+        bus = self.bus
+        bus.memory = self
+        bus.flush = self.flush
+        bus.writeback = self.writeback
+        for processor in cpu.processors:
+            processor.memory = self
+            if policy == "exclusive":
+                self._install_evict(processor)
+        # Miss na L1 custa a latência da LLC
+        protocol = cpu.protocol
+        metrics = bus.metrics
+        protocol.cost = [latency if field == MISS else getattr(metrics, field) for field in protocol.cost_field]
+
+    def _install_evict(self, processor):
+        evict = processor.evict
+        cache = processor.cache
+        processors = self.bus.processors
+        dirty = self.cpu.protocol.dirty
+
+        def exclusive_evict(slot):
+            address, value, state = cache.addresses[slot], cache.values[slot], cache.states[slot]
+            evict(slot)  # Linhas sujas já descem por writeback
+            if not dirty[state] and not any(address in other.cache.slots for other in processors):
+                self.bus.metrics.total_cycles += self.latency
+                self.store_cycles += self.latency
+                self.store(address, value, False)
+
+        processor.evict = exclusive_evict
+
+    # Interface de memória usada pelo bus e pelos processadores
+    def read(self, address):
+        # Dados de um miss na L1 que nenhuma outra L1 forneceu
+        cache = self.cache
+        slot = cache.slots.get(address, -1)
+        if slot != -1:
+            self.hits += 1
+            value = cache.values[slot]
+            if self.policy == "exclusive":
+                # A linha sobe para a L1, que a recebe limpa: dados sujos vão para a memória antes
+                if self.dirty[slot]:
+                    self._write_memory(address, value)
+                cache.invalidate(slot)
+            else:
+                cache.touch(slot)
+            return value
+        self.misses += 1
+        self.memory_reads += 1
+        self._charge_memory()
+        value = self.memory.read(address)
+        if self.policy != "exclusive":
+            self._allocate(address, value, False)
+        return value
+
+    def write(self, address, value):
+        # Dados sujos saindo de uma L1 (caminho funcional, sem ciclos)
+        self.store(address, value, True)
+
+    def set_dirty(self, address):
+        self.memory.set_dirty(address)
+
+    def is_dirty(self, address):
+        return self.memory.is_dirty(address)
+
+    def blocks(self, count=16):
+        return self.memory.blocks(count)
+
+    def flush(self, address, value, processor_no):
+        # Uma L1 com a linha suja responde ao snoop; a cópia dela continua válida
+        bus = self.bus
+        bus.last_bus_action |= FLUSH_BIT
+        bus.metrics.traffic.add(processor_no, address, DIRTY_WRITEBACKS)
+        if self.policy == "exclusive":
+            self._write_memory(address, value)
+        else:
+            bus.metrics.total_cycles += self.latency
+            self.store_cycles += self.latency
+            self.store(address, value, True)
+
+    def writeback(self, address, value, processor_no):
+        # Linha suja substituída em uma L1
+        bus = self.bus
+        metrics = bus.metrics
+        bus.last_bus_action |= WRITEBACK_BIT
+        metrics.traffic.add(processor_no, address, DIRTY_WRITEBACKS)
+        metrics.writebacks += 1
+        if self.policy == "exclusive" and any(address in processor.cache.slots for processor in bus.processors
+                                              if processor.processor_number != processor_no):
+            # Outras L1 ainda têm cópias (ex.: O com cópias S): a linha não pode entrar na LLC
+            self._write_memory(address, value)
+            return
+        metrics.total_cycles += self.latency
+        self.store_cycles += self.latency
+        self.store(address, value, True)
+
+    def store(self, address, value, dirty):
+        cache = self.cache
+        slot = cache.slots.get(address, -1)
+        if slot == -1:
+            self._allocate(address, value, dirty)
+            return
+        cache.values[slot] = value
+        self.dirty[slot] |= dirty
+        cache.touch(slot)
+
+    def _allocate(self, address, value, dirty):
+        cache = self.cache
+        slot = cache.victim_slot(address)
+        if cache.addresses[slot] != -1:
+            self._evict(slot)
+        cache.fill(slot, address)
+        cache.values[slot] = value
+        self.dirty[slot] = dirty
+        cache.touch(slot)
+
+    def _evict(self, slot):
+        cache = self.cache
+        address = cache.addresses[slot]
+        self.evictions += 1
+        if self.dirty[slot]:
+            self.writebacks += 1
+            self._write_memory(address, cache.values[slot])
+        cache.invalidate(slot)
+        if self.policy == "inclusive":
+            self._back_invalidate(address)
+
+    def _back_invalidate(self, address):
+        # BusRdX da LLC: as L1 com a linha respondem pela tabela de snoop do protocolo e, como
+        # ninguém recebe os dados, a resposta (ou uma cópia suja) vira um flush para a memória.
+        # Nos protocolos de invalidação o BusRdX leva a linha a I; o Dragon não tem essa
+        # transição, mas a inclusão exige invalidar a linha do mesmo jeito.
+        bus = self.bus
+        holders = [processor for processor in bus.processors if address in processor.cache.slots]
+        if not holders:
+            return
+        metrics = bus.metrics
+        protocol = self.cpu.protocol
+        requester = bus.instruction_processor or 0
+        traffic = metrics.traffic
+        metrics.total_cycles += metrics.bus_cycles
+        metrics.bus_transactions += 1
+        bus.last_bus_action |= ACTION_BITS[BUS_RDX]
+        traffic.add(requester, address, BUS_READ_EXCLUSIVES)
+        for processor in holders:
+            cache = processor.cache
+            slot = cache.slots[address]
+            number = processor.processor_number
+            state = cache.states[slot]
+            if protocol.snoop_response[state * BUS_EVENTS + BUS_RDX] or protocol.dirty[state]:
+                bus.last_bus_action |= FLUSH_BIT
+                traffic.add(number, address, DIRTY_WRITEBACKS)
+                self._write_memory(address, cache.values[slot])
+            self.back_invalidations += 1
+            traffic.add(requester, address, INVALIDATIONS_SENT)
+            traffic.add(number, address, INVALIDATIONS_RECEIVED)
+            cache.invalidate(slot)
+            bus.track_drop(number, address)
+
+    def _write_memory(self, address, value):
+        self.memory_writes += 1
+        self._charge_memory()
+        self.memory.write(address, value)
+
+    def _charge_memory(self):
+        metrics = self.bus.metrics
+        metrics.total_cycles += metrics.memory_access_cycles
+        self.memory_cycles += metrics.memory_access_cycles
+
+    def report(self):
+        # Acessos, taxa de acerto e ciclos atribuídos a cada nível
+        metrics = self.bus.metrics
+        instructions = metrics.total_instructions
+        l1_hits = instructions - metrics.cache_misses
+        llc_accesses = self.hits + self.misses
+        return {
+            "policy": self.policy,
+            "L1": {"accesses": instructions, "hits": l1_hits,
+                   "hit_rate": l1_hits / instructions if instructions else 0,
+                   "cycles": l1_hits * metrics.cache_access_cycles},
+            "LLC": {"accesses": llc_accesses, "hits": self.hits,
+                    "hit_rate": self.hits / llc_accesses if llc_accesses else 0,
+                    # Todo miss na L1 paga a latência da LLC, mesmo quando outra L1 fornece o dado
+                    "cycles": metrics.cache_misses * self.latency + self.store_cycles,
+                    "evictions": self.evictions, "writebacks": self.writebacks,
+                    "back_invalidations": self.back_invalidations},
+            "memory": {"reads": self.memory_reads, "writes": self.memory_writes, "cycles": self.memory_cycles},
+            "total_cycles": metrics.total_cycles,
+        }
+
+
+def print_hierarchy(report, baseline=None):
+    print(f"\nHierarquia de cache (LLC {report['policy']})")
+    print("=" * 30)
+    for level in ("L1", "LLC"):
+        stats = report[level]
+        print(f"{level}: {stats['accesses']} acessos, taxa de acerto {stats['hit_rate']:.2%}, "
+              f"{stats['cycles']} ciclos ({stats['cycles'] / report['total_cycles']:.1%} do total)")
+    llc = report["LLC"]
+    print(f"LLC: {llc['evictions']} substituições, {llc['writebacks']} write-backs, "
+          f"{llc['back_invalidations']} back-invalidations")
+    memory = report["memory"]
+    print(f"Memória: {memory['reads']} leituras, {memory['writes']} escritas, {memory['cycles']} ciclos "
+          f"({memory['cycles'] / report['total_cycles']:.1%} do total)")
+    if baseline is not None:
+        saved = baseline - report["total_cycles"]
+        print(f"Ciclos sem LLC: {baseline} (a LLC economiza {saved}, {saved / baseline:.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simula L1 privadas com uma LLC compartilhada")
+    parser.add_argument("-n", type=int, default=100000, help="número de instruções")
+    parser.add_argument("--protocolo", default="MESI", choices=sorted(PROTOCOLS))
+    parser.add_argument("--nucleos", type=int, default=4)
+    parser.add_argument("--memoria", type=int, default=1024, help="número de blocos de memória")
+    parser.add_argument("--conjuntos", type=int, default=4, help="conjuntos de cada L1")
+    parser.add_argument("--vias", type=int, default=2, help="vias de cada L1")
+    parser.add_argument("--llc-conjuntos", type=int, default=64)
+    parser.add_argument("--llc-vias", type=int, default=8)
+    parser.add_argument("--llc-latencia", type=int, default=20, help="ciclos de um acesso à LLC")
+    parser.add_argument("--inclusao", default="inclusive", choices=INCLUSION_POLICIES)
+    parser.add_argument("--carga", default="uniform", help=f"{'/'.join(WORKLOADS)} ou trace:<arquivo>")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    def build():
+        return CPU(args.protocolo, args.conjuntos, args.vias, memory_size=args.memoria, seed=args.seed,
+                   num_processors=args.nucleos)
+
+    def workload():
+        return make_workload(args.carga, args.n, args.nucleos, args.memoria, args.seed)
+
+    flat = build()
+    flat.run_simulation(workload())
+    cpu = build()
+    llc = LastLevelCache(cpu, args.llc_conjuntos, args.llc_vias, args.llc_latencia, args.inclusao)
+    cpu.run_simulation(workload())
+    cpu.print_final_metrics()
+    print_hierarchy(llc.report(), flat.bus.metrics.total_cycles)
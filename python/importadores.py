@@ -0,0 +1,268 @@
+import argparse
+import csv
+import gzip
+import time
+
+from MOESIeMESIcomrelatorionofinal import CPU
+from protocolos import PROTOCOLS
+from trace_binario import TraceWriter
+
+# Importadores de traces externos de acesso à memória. Cada leitor é um gerador que
+# devolve instruções (processador, r_w, endereço de bloco, valor) uma linha por vez,
+# então arquivos de vários GB (inclusive .gz) são lidos sem carregá-los na memória.
+# Linhas com endereço negativo ou valor fora do campo de 32 bits sem sinal do trace
+# binário são puladas e relatadas em ImportStats, em vez de interromper a importação.
+
+GZIP_MAGIC = b"\x1f\x8b"
+MAX_VALUE = 2 ** 32 - 1  # Campo de valor do trace binário
+MAX_REPORTED = 10  # Linhas inválidas guardadas para o relatório
+
+
+def open_text(path):
+    # Abre texto puro ou gzip (detectado pelo conteúdo, não pela extensão)
+    with open(path, "rb") as file:
+        compressed = file.read(2) == GZIP_MAGIC
+    if compressed:
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace", newline="")
+    return open(path, "r", encoding="utf-8", errors="replace", newline="")
+
+
+class ImportStats:
+    def __init__(self):
+        self.lines = 0  # Linhas lidas
+        self.records = 0  # Instruções geradas
+        self.skipped = 0  # Linhas ignoradas (comentários, fetch de instrução, lixo)
+        self.invalid = 0  # Linhas com endereço ou valor fora do intervalo (contadas em skipped)
+        self.invalid_lines = []  # (número da linha, motivo) das primeiras MAX_REPORTED
+        self.elapsed = 0.0  # Segundos gastos no parse
+
+    def reject(self, error, line=None):
+        # line: número da linha no arquivo (padrão: linhas lidas até aqui)
+        self.skipped += 1
+        self.invalid += 1
+        if len(self.invalid_lines) < MAX_REPORTED:
+            self.invalid_lines.append((self.lines if line is None else line, str(error)))
+
+    @property
+    def records_per_second(self):
+        return self.records / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        text = (f"{self.records} registros de {self.lines} linhas ({self.skipped} ignoradas) "
+                f"em {self.elapsed:.2f}s: {self.records_per_second:,.0f} registros/s")
+        if self.invalid:
+            text += f"\n{self.invalid} linhas inválidas puladas:"
+            text += "".join(f"\n  linha {line}: {reason}" for line, reason in self.invalid_lines)
+            if self.invalid > len(self.invalid_lines):
+                text += f"\n  ... e mais {self.invalid - len(self.invalid_lines)}"
+        return text
+
+
+class ThreadMap:
+    # Associa IDs de thread a processadores na ordem em que aparecem (módulo o número de núcleos)
+    def __init__(self, num_processors):
+        self.num_processors = num_processors
+        self.processors = {}
+
+    def __call__(self, tid):
+        proc = self.processors.get(tid)
+        if proc is None:
+            proc = len(self.processors) % self.num_processors
+            self.processors[tid] = proc
+        return proc
+
+
+class AddressMap:
+    # Converte endereço em byte para endereço de bloco; com memory_size o bloco é dobrado
+    # para caber na memória simulada
+    def __init__(self, block_size=64, memory_size=None):
+        if block_size <= 0 or block_size & (block_size - 1):
+            raise ValueError(f"O tamanho do bloco deve ser potência de 2: {block_size}")
+        self.shift = block_size.bit_length() - 1
+        self.memory_size = memory_size
+
+    def __call__(self, address):
+        block = address >> self.shift
+        if self.memory_size:
+            block %= self.memory_size
+        return block
+
+
+def _parse_op(op):
+    op = op.strip().upper()
+    if op in ("R", "L", "LOAD", "READ", "0"):
+        return 0
+    if op in ("W", "S", "STORE", "WRITE", "1"):
+        return 1
+    raise ValueError(f"Operação desconhecida: {op}")
+
+
+class InvalidRecord(ValueError):
+    # Linha bem formada, mas com endereço ou valor que o simulador não representa
+    pass
+
+
+def _parse_address(text, base=16):
+    # base 16: sempre hexadecimal, com ou sem 0x (um endereço só com dígitos continua sendo
+    # hexadecimal); base 10: decimal, ou hexadecimal se tiver o prefixo 0x
+    text = text.strip()
+    if base == 10 and text[:2].lower() == "0x":
+        address = int(text, 16)
+    else:
+        address = int(text, base)
+    if address < 0:
+        raise InvalidRecord(f"endereço negativo: {text}")
+    return address
+
+
+def _parse_value(text):
+    value = int(text, 0)
+    if not 0 <= value <= MAX_VALUE:
+        raise InvalidRecord(f"valor fora de 0..{MAX_VALUE}: {text.strip()}")
+    return value
+
+
+def _timed(records, stats):
+    # Soma apenas o tempo gasto dentro do parser, não o do consumidor (ex.: a simulação)
+    clock = time.perf_counter
+    while True:
+        start = clock()
+        record = next(records, None)
+        stats.elapsed += clock() - start
+        if record is None:
+            return
+        yield record
+
+
+def read_lackey(path, num_processors=4, block_size=64, memory_size=None, stats=None, processor=0):
+    # Saída de `valgrind --tool=lackey --trace-mem=yes`: "I  addr,size", " L addr,size",
+    # " S addr,size" e " M addr,size" (modify = leitura seguida de escrita). O Lackey não
+    # informa a thread, então todos os acessos vão para `processor`.
+    stats = stats if stats is not None else ImportStats()
+    block = AddressMap(block_size, memory_size)
+    proc = processor % num_processors
+
+    def records():
+        value = 0
+        with open_text(path) as file:
+            for line in file:
+                stats.lines += 1
+                if len(line) < 4 or line[0] != " " or line[1] not in "LSM":
+                    stats.skipped += 1
+                    continue
+                kind = line[1]
+                try:
+                    address = block(int(line[3:].split(",", 1)[0], 16))
+                except ValueError:
+                    stats.skipped += 1
+                    continue
+                value = (value + 1) % 1001
+                if kind != "S":
+                    stats.records += 1
+                    yield proc, 0, address, value
+                if kind != "L":
+                    stats.records += 1
+                    yield proc, 1, address, value
+
+    return _timed(records(), stats)
+
+
+def read_pin(path, num_processors=4, block_size=64, memory_size=None, stats=None):
+    # Texto no estilo Pin/DynamoRIO: "tid R|W endereço [valor]" por linha, endereço em
+    # hexadecimal; '#' inicia comentário
+    stats = stats if stats is not None else ImportStats()
+    threads = ThreadMap(num_processors)
+    block = AddressMap(block_size, memory_size)
+
+    def records():
+        with open_text(path) as file:
+            for line in file:
+                stats.lines += 1
+                parts = line.split("#", 1)[0].split()
+                if len(parts) < 3:
+                    stats.skipped += 1
+                    continue
+                try:
+                    tid = int(parts[0], 0)
+                    r_w = _parse_op(parts[1])
+                    address = block(_parse_address(parts[2]))
+                    value = _parse_value(parts[3]) if len(parts) > 3 else stats.records % 1001
+                except InvalidRecord as error:
+                    stats.reject(error)
+                    continue
+                except ValueError:
+                    stats.skipped += 1
+                    continue
+                stats.records += 1
+                yield threads(tid), r_w, address, value
+
+    return _timed(records(), stats)
+
+
+def read_csv(path, num_processors=4, block_size=64, memory_size=None, stats=None,
+             tid_column="tid", op_column="op", address_column="address", value_column="value", address_base=10):
+    # CSV com cabeçalho; a coluna de valor é opcional. Endereços em decimal (ou com 0x), ou
+    # sempre em hexadecimal com address_base=16
+    stats = stats if stats is not None else ImportStats()
+    threads = ThreadMap(num_processors)
+    block = AddressMap(block_size, memory_size)
+
+    def records():
+        with open_text(path) as file:
+            reader = csv.DictReader(file)
+            for row in reader:
+                stats.lines += 1
+                try:
+                    tid = int(row[tid_column], 0)
+                    r_w = _parse_op(row[op_column])
+                    address = block(_parse_address(row[address_column], address_base))
+                    value = row.get(value_column)
+                    value = _parse_value(value) if value else stats.records % 1001
+                except InvalidRecord as error:
+                    stats.reject(error, reader.line_num)
+                    continue
+                except (KeyError, TypeError, ValueError):
+                    stats.skipped += 1
+                    continue
+                stats.records += 1
+                yield threads(tid), r_w, address, value
+
+    return _timed(records(), stats)
+
+
+READERS = {"lackey": read_lackey, "pin": read_pin, "csv": read_csv}
+
+
+def import_to_trace(records, path, num_cores, generator="", memory_size=None):
+    # Converte um trace importado para o formato binário (para replays repetidos)
+    with TraceWriter(path, num_cores, address_width=8, generator=generator, memory_size=memory_size) as writer:
+        writer.write_many(records)
+    return writer.count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa traces externos para o simulador MESI/MOESI")
+    parser.add_argument("formato", choices=sorted(READERS))
+    parser.add_argument("arquivo", help="arquivo de entrada (texto ou .gz)")
+    parser.add_argument("--nucleos", type=int, default=4)
+    parser.add_argument("--bloco", type=int, default=64, help="tamanho do bloco em bytes")
+    parser.add_argument("--memoria", type=int,
+                        help="número de blocos de memória simulada; endereços maiores são dobrados "
+                             "(padrão: todo o espaço de endereços de 64 bits, sem dobrar)")
+    parser.add_argument("--hex", action="store_true", help="endereços do CSV em hexadecimal sem prefixo 0x")
+    parser.add_argument("--protocolo", default="MESI", choices=sorted(PROTOCOLS))
+    parser.add_argument("--saida", help="grava um trace binário em vez de simular")
+    args = parser.parse_args()
+
+    stats = ImportStats()
+    options = {"address_base": 16 if args.hex else 10} if args.formato == "csv" else {}
+    records = READERS[args.formato](args.arquivo, args.nucleos, args.bloco, args.memoria, stats, **options)
+    # A memória paginada só aloca as páginas tocadas, então cobrir o espaço inteiro é barato
+    memory_size = args.memoria or 1 << (64 - (args.bloco.bit_length() - 1))
+    if args.saida:
+        import_to_trace(records, args.saida, args.nucleos, args.formato, memory_size)
+    else:
+        cpu = CPU(args.protocolo, memory_size=memory_size, num_processors=args.nucleos)
+        cpu.run_simulation(records)
+        cpu.print_final_metrics()
+    print(stats)
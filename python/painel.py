@@ -0,0 +1,215 @@
+import argparse
+import multiprocessing
+import queue
+import sys
+
+from MOESIeMESIcomrelatorionofinal import CPU
+from cargas import WORKLOADS, make_workload
+from protocolos import PROTOCOLS
+from serie_temporal import MetricsRecorder
+
+# Painel ao vivo (servidor Bokeh) alimentado pela simulação enquanto ela roda. Cada
+# protocolo roda em um processo trabalhador que, a cada `window` instruções, manda um resumo
+# das métricas por uma fila limitada; se a fila estiver cheia o resumo é descartado, então o
+# simulador nunca espera pela renderização. O painel lê a fila periodicamente e mostra, lado
+# a lado para cada protocolo, a taxa de miss, a utilização do bus e o histograma de estados
+# das linhas em cada núcleo.
+#
+# Bokeh só é importado ao montar o painel. Uso:
+#     python painel.py --protocolos MESI MOESI -n 10000000
+#     bokeh serve painel.py --args --protocolos MESI MOESI -n 10000000
+
+DEFAULT_QUEUE = 256  # Resumos na fila entre os trabalhadores e o painel
+MAX_UPDATES_PER_POLL = 1000  # Limite de resumos lidos a cada atualização do painel
+
+
+def state_histogram(cpu):
+    # Para cada núcleo, o número de linhas válidas em cada estado do protocolo
+    histogram = []
+    for processor in cpu.processors:
+        cache = processor.cache
+        counts = [0] * len(cpu.protocol.valid_states)
+        for slot in range(cache.size):
+            if cache.addresses[slot] != -1:
+                counts[cache.states[slot]] += 1
+        histogram.append(counts)
+    return histogram
+
+
+def stream_metrics(updates, protocol, options, workload, n, seed, window):
+    # Processo trabalhador: executa a simulação e publica um resumo a cada `window` instruções
+    cpu = CPU(protocol, **options)
+    metrics = cpu.bus.metrics
+    recorder = MetricsRecorder(metrics, window, history=1)
+    instruction = cpu.bus.instruction
+    dropped = 0
+
+    def summary(done, new_window=True):
+        # new_window: o resumo traz uma janela ainda não enviada (um ponto novo nos gráficos)
+        recent = recorder.recent
+        if recent["cpi"]:
+            cpi = recent["cpi"][-1][1]
+            miss_rate = recent["miss_rate"][-1][1]
+            cumulative = recent["cumulative_miss_rate"][-1][1]
+            # Fração dos ciclos da janela com o bus ocupado
+            utilization = recent["bus_transactions"][-1][1] * metrics.bus_cycles / cpi if cpi else 0
+        else:
+            miss_rate = cumulative = utilization = 0  # Execução vazia: nenhuma janela
+        return {
+            "protocol": protocol,
+            "instructions": metrics.total_instructions,
+            "miss_rate": miss_rate,
+            "cumulative_miss_rate": cumulative,
+            "bus_utilization": utilization,
+            "histogram": state_histogram(cpu),
+            "dropped": dropped,
+            "done": done,
+            "new_window": new_window,
+        }
+
+    count = 0
+    for proc, r_w, addr, val in make_workload(workload, n, options["num_processors"], options["memory_size"], seed):
+        instruction(proc, r_w, addr, val)
+        count += 1
+        if count == window:
+            count = 0
+            recorder.sample()
+            try:
+                updates.put_nowait(summary(False))
+            except queue.Full:
+                dropped += 1
+    # O último resumo sempre chega; se n é múltiplo da janela ele só marca o fim, sem repetir
+    # o ponto da última janela já enviada
+    updates.put(summary(True, recorder.sample()))
+
+
+def start_workers(protocols, options, workload, n, seed, window, queue_size=DEFAULT_QUEUE):
+    # Um processo por protocolo, todos com a mesma carga e semente; devolve (fila, processos)
+    context = multiprocessing.get_context("spawn")
+    updates = context.Queue(queue_size)
+    workers = [context.Process(target=stream_metrics, args=(updates, protocol, options, workload, n, seed, window),
+                               daemon=True)
+               for protocol in protocols]
+    for worker in workers:
+        worker.start()
+    return updates, workers
+
+
+def build_dashboard(doc, args, period=250, history=2000):
+    from bokeh.layouts import column, row
+    from bokeh.models import Button, ColumnDataSource, Div, FactorRange
+    from bokeh.palettes import Category10
+    from bokeh.plotting import figure
+
+    options = dict(num_sets=args.conjuntos, ways=args.vias, memory_size=args.memoria, seed=args.seed,
+                   num_processors=args.nucleos)
+    updates, workers = start_workers(args.protocolos, options, args.carga, args.n, args.seed, args.janela)
+
+    panels = {}
+    columns = []
+    for protocol in args.protocolos:
+        states = PROTOCOLS[protocol]["states"]
+        series = ColumnDataSource(data=dict(instructions=[], miss_rate=[], cumulative_miss_rate=[],
+                                            bus_utilization=[]))
+        factors = [(f"P{proc}", state) for proc in range(args.nucleos) for state in states]
+        colors = Category10[10][:len(states)] * args.nucleos
+        histogram = ColumnDataSource(data=dict(factors=factors, counts=[0] * len(factors), colors=colors))
+
+        miss = figure(height=300, width=600, title=f"{protocol}: taxa de cache miss",
+                      tools="pan,box_zoom,reset,save,hover")
+        miss.line("instructions", "miss_rate", source=series, legend_label="janela", color="blue")
+        miss.line("instructions", "cumulative_miss_rate", source=series, legend_label="acumulada", color="red",
+                  line_width=2)
+        miss.xaxis.axis_label = "Instruções"
+        miss.legend.location = "bottom_right"
+
+        bus = figure(height=250, width=600, title=f"{protocol}: utilização do bus",
+                     tools="pan,box_zoom,reset,save,hover", x_range=miss.x_range)
+        bus.line("instructions", "bus_utilization", source=series, color="green")
+        bus.y_range.start = 0
+        bus.xaxis.axis_label = "Instruções"
+
+        states_plot = figure(x_range=FactorRange(*factors), height=300, width=600,
+                             title=f"{protocol}: linhas em cada estado por núcleo", tools="save,hover",
+                             tooltips=[("Linhas", "@counts")])
+        states_plot.vbar(x="factors", top="counts", width=0.8, source=histogram, color="colors")
+        states_plot.xgrid.grid_line_color = None
+        states_plot.y_range.start = 0
+
+        status = Div(text=f"{protocol}: iniciando...")
+        panels[protocol] = {"series": series, "histogram": histogram, "status": status}
+        columns.append(column(status, miss, bus, states_plot))
+
+    def stop():
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        for panel in panels.values():
+            panel["status"].text += " (interrompido)"
+
+    button = Button(label="Parar simulação", button_type="danger")
+    button.on_click(stop)
+
+    def poll():
+        # Junta os resumos disponíveis e atualiza cada protocolo de uma vez
+        fields = ("instructions", "miss_rate", "cumulative_miss_rate", "bus_utilization")
+        batches = {}
+        latest = {}
+        for _ in range(MAX_UPDATES_PER_POLL):
+            try:
+                update = updates.get_nowait()
+            except queue.Empty:
+                break
+            protocol = update["protocol"]
+            if update["new_window"]:
+                batch = batches.setdefault(protocol, {name: [] for name in fields})
+                for name in fields:
+                    batch[name].append(update[name])
+            latest[protocol] = update
+        for protocol, update in latest.items():
+            panel = panels[protocol]
+            if protocol in batches:
+                panel["series"].stream(batches[protocol], history)
+            panel["histogram"].patch({"counts": [(slice(None), [count for counts in update["histogram"]
+                                                              for count in counts])]})
+            text = (f"<b>{protocol}</b>: {update['instructions']} instruções, taxa de miss acumulada "
+                    f"{update['cumulative_miss_rate']:.2%}, {update['dropped']} resumos descartados")
+            panel["status"].text = text + (" (fim)" if update["done"] else "")
+
+    doc.add_root(column(button, row(*columns)))
+    doc.title = "Simulação ao vivo: " + " vs ".join(args.protocolos)
+    doc.add_periodic_callback(poll, period)
+    doc.on_session_destroyed(lambda context: stop())
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Painel ao vivo (Bokeh) de uma simulação em andamento")
+    parser.add_argument("--protocolos", nargs="+", default=["MESI", "MOESI"], choices=sorted(PROTOCOLS))
+    parser.add_argument("-n", type=int, default=10000000, help="número de instruções")
+    parser.add_argument("--nucleos", type=int, default=4)
+    parser.add_argument("--memoria", type=int, default=64, help="número de blocos de memória")
+    parser.add_argument("--conjuntos", type=int, default=4)
+    parser.add_argument("--vias", type=int, default=2)
+    parser.add_argument("--carga", default="uniform", help=f"{'/'.join(WORKLOADS)} ou trace:<arquivo>")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--janela", type=int, default=5000, help="instruções entre resumos enviados ao painel")
+    parser.add_argument("--porta", type=int, default=5006)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    from bokeh.server.server import Server
+
+    args = parse_args()
+    server = Server({"/": lambda doc: build_dashboard(doc, args)}, port=args.porta)
+    server.start()
+    print(f"Painel em http://localhost:{args.porta}/")
+    server.io_loop.add_callback(server.show, "/")
+    server.io_loop.start()
+elif __name__.startswith("bokeh_app"):
+    # Executado por `bokeh serve painel.py --args ...`: as funções vêm do módulo painel para
+    # que os trabalhadores (spawn) consigam importá-las
+    from bokeh.io import curdoc
+    from painel import build_dashboard as build, parse_args as parse
+
+    build(curdoc(), parse(sys.argv[1:]))
@@ -0,0 +1,314 @@
+import argparse
+import os
+import time
+from array import array
+from multiprocessing import Pipe, Process
+from multiprocessing.shared_memory import SharedMemory
+
+from checkpoint import restore, snapshot
+from cargas import WORKLOADS, make_workload
+from protocolos import PROTOCOLS
+from varredura import DEFAULTS, build_cpu
+
+# Execução de uma simulação dividida por conjunto da cache. Todas as caches têm a mesma
+# geometria e um endereço sempre cai no conjunto address % num_sets, então coerência,
+# substituição (LRU/PLRU, que são por conjunto) e memória de endereços de conjuntos
+# diferentes não interagem. O processo principal distribui o trace entre as partições
+# (conjunto % partições), cada uma com seus próprios Bus/Processor/Cache em um processo
+# trabalhador, e junta no final os snapshots das partições em uma única CPU.
+#
+# As instruções seguem em blocos de memória compartilhada (registros de 5 int64: posição
+# global, processador, r_w, endereço, valor); pelo pipe de controle só passam o número do
+# bloco e a contagem.
+#
+# O único contador que depende da cache inteira é a separação entre substituições de
+# capacidade e de conflito (a cache toda cheia no momento da substituição). Cada partição
+# registra quando a sua parte de cada cache fica cheia ou deixa de estar e o momento das
+# substituições feitas com a sua parte cheia; no fim, cada uma recebe os intervalos em que
+# as outras estavam cheias e classifica as suas substituições, o que dá o mesmo resultado
+# da execução serial.
+
+RECORD = 5  # int64 por instrução no bloco compartilhado
+DEFAULT_BLOCK = 65536  # Instruções por bloco
+BLOCKS_PER_SHARD = 4
+
+
+def decomposable(config, workers):
+    # Motivo pelo qual a configuração não pode ser dividida, ou None
+    if workers < 2:
+        return "apenas um trabalhador"
+    if config["num_sets"] < 2:
+        return "a cache tem um único conjunto"
+    if config["replacement"].upper() == "RANDOM":
+        return "a substituição aleatória usa um único gerador por cache"
+    return None
+
+
+class ShardTracker:
+    # Acompanha, para cada cache da partição, as mudanças de "parte da cache cheia" e as
+    # substituições feitas com a parte cheia. Instala-se no lugar de Cache.fill,
+    # Cache.invalidate e Processor.evict; `time` é a posição global da instrução atual.
+    def __init__(self, cpu, owned_lines):
+        self.time = 0
+        self.owned_lines = owned_lines
+        self.changes = []  # Por processador: posições em que a parte cheia alterna (começa vazia)
+        self.full_evictions = []  # Por processador: posições das substituições com a parte cheia
+        for processor in cpu.processors:
+            changes = array("q")
+            evictions = array("q")
+            self.changes.append(changes)
+            self.full_evictions.append(evictions)
+            self._install(processor, changes, evictions)
+
+    def _install(self, processor, changes, evictions):
+        tracker = self
+        cache = processor.cache
+        fill, invalidate, evict = cache.fill, cache.invalidate, processor.evict
+        owned = self.owned_lines
+
+        def flip():
+            # Substituição seguida de preenchimento na mesma instrução não muda nada
+            if changes and changes[-1] == tracker.time:
+                changes.pop()
+            else:
+                changes.append(tracker.time)
+
+        def tracked_fill(slot, address):
+            fill(slot, address)
+            if cache.valid_lines == owned:
+                flip()
+
+        def tracked_invalidate(slot):
+            if cache.valid_lines == owned:
+                flip()
+            invalidate(slot)
+
+        def tracked_evict(slot):
+            if cache.valid_lines == owned:
+                evictions.append(tracker.time)
+            evict(slot)
+
+        cache.fill = tracked_fill
+        cache.invalidate = tracked_invalidate
+        processor.evict = tracked_evict
+
+
+def _others_full(changes_by_shard, shard):
+    # Posições em que "todas as outras partições estão cheias" alterna, a partir de falso
+    # (cada posição pertence a uma única partição, então não há empates)
+    events = sorted((position, other) for other, changes in enumerate(changes_by_shard) if other != shard
+                    for position in changes)
+    full = [False] * len(changes_by_shard)
+    not_full = len(changes_by_shard) - 1
+    result = array("q")
+    for position, other in events:
+        full[other] = not full[other]
+        not_full += -1 if full[other] else 1
+        if (not_full == 0) != (len(result) % 2 == 1):
+            result.append(position)
+    return result
+
+
+def _count_capacity(evictions, others):
+    # Substituições em posições em que as outras partições estavam todas cheias
+    capacity = 0
+    index = 0
+    count = len(others)
+    for position in evictions:
+        while index < count and others[index] <= position:
+            index += 1
+        if index % 2:
+            capacity += 1
+    return capacity
+
+
+def _worker(config, shard, shards, connection, block_names):
+    cpu = build_cpu(config)
+    owned_sets = len(range(shard, config["num_sets"], shards))
+    tracker = ShardTracker(cpu, owned_sets * config["ways"])
+    blocks = [SharedMemory(name) for name in block_names]
+    views = [block.buf.cast("q") for block in blocks]
+    instruction = cpu.bus.instruction
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        block, count = message
+        records = views[block][:count * RECORD].tolist()
+        connection.send(block)
+        iterator = iter(records)
+        for position, proc, r_w, addr, val in zip(iterator, iterator, iterator, iterator, iterator):
+            tracker.time = position
+            instruction(proc, r_w, addr, val)
+    for view in views:
+        view.release()
+    for block in blocks:
+        block.close()
+
+    connection.send((snapshot(cpu), list(tracker.changes)))
+    others = connection.recv()
+    capacity = sum(_count_capacity(evictions, others_full)
+                   for evictions, others_full in zip(tracker.full_evictions, others))
+    connection.send(capacity)
+    connection.close()
+
+
+def merge(states, capacity, num_sets, shards):
+    # Um snapshot da CPU inteira a partir dos snapshots das partições
+    merged = states[0]
+    config = merged["config"]
+    ways = config["ways"]
+    merged["position"] = sum(state["position"] for state in states)
+    for state in states[1:]:
+        for name, value in state["metrics"].items():
+            merged["metrics"][name] += value
+        for counters, others in zip(merged["traffic"]["per_processor"], state["traffic"]["per_processor"]):
+            for field, value in enumerate(others):
+                counters[field] += value
+        merged["traffic"]["per_address"].update(state["traffic"]["per_address"])  # Endereços disjuntos
+        memory = merged["memory"]
+        for number, page in state["memory"]["pages"].items():
+            if number not in memory["pages"]:
+                memory["pages"][number] = page
+                memory["dirty"][number] = state["memory"]["dirty"][number]
+                continue
+            target = memory["pages"][number]
+            for offset, value in enumerate(page):
+                if value >= 0:
+                    target[offset] = value
+            dirty = memory["dirty"][number]
+            for index, bits in enumerate(state["memory"]["dirty"][number]):
+                dirty[index] |= bits
+    metrics = merged["metrics"]
+    metrics["capacity_evictions"] = capacity
+    metrics["conflict_evictions"] = metrics["evictions"] - capacity
+
+    # Linhas de cada cache: cada conjunto vem da partição dona dele
+    for number, processor in enumerate(merged["processors"]):
+        processor["clock"] = sum(state["processors"][number]["clock"] for state in states)
+        processor["stall_cycles"] = sum(state["processors"][number]["stall_cycles"] for state in states)
+        replacement = processor["replacement"]
+        for set_index in range(num_sets):
+            source = states[set_index % shards]["processors"][number]
+            for slot in range(set_index * ways, (set_index + 1) * ways):
+                processor["addresses"][slot] = source["addresses"][slot]
+                processor["values"][slot] = source["values"][slot]
+                processor["states"][slot] = source["states"][slot]
+                if "stamps" in replacement:
+                    replacement["stamps"][slot] = source["replacement"]["stamps"][slot]
+            if "bits" in replacement:
+                replacement["bits"][set_index] = source["replacement"]["bits"][set_index]
+        if "clock" in replacement:
+            replacement["clock"] = max(state["processors"][number]["replacement"]["clock"] for state in states)
+    return merged
+
+
+def run_sharded(config, instructions, workers=None, block_size=DEFAULT_BLOCK):
+    # Executa as instruções dividindo a simulação por conjunto. Devolve a CPU resultante
+    # (métricas e estados das linhas iguais aos da execução serial; só os valores iniciais
+    # sorteados da memória diferem) e o número de partições. Configurações que não podem
+    # ser divididas rodam em série (uma partição).
+    config = dict(DEFAULTS, **config)
+    workers = min(workers or os.cpu_count(), config["num_sets"])
+    if decomposable(config, workers) is not None:
+        cpu = build_cpu(config)
+        cpu.run_simulation(instructions)
+        return cpu, 1
+
+    shards = workers
+    num_sets = config["num_sets"]
+    record_bytes = RECORD * 8
+    blocks = [[SharedMemory(create=True, size=block_size * record_bytes) for _ in range(BLOCKS_PER_SHARD)]
+              for _ in range(shards)]
+    connections = []
+    processes = []
+    try:
+        for shard in range(shards):
+            parent, child = Pipe()
+            process = Process(target=_worker, args=(config, shard, shards, child, [block.name for block in blocks[shard]]),
+                              daemon=True)
+            process.start()
+            child.close()
+            connections.append(parent)
+            processes.append(process)
+
+        free = [list(range(BLOCKS_PER_SHARD)) for _ in range(shards)]
+        pending = [array("q") for _ in range(shards)]
+        limit = block_size * RECORD
+
+        def send(shard):
+            if not free[shard]:
+                free[shard].append(connections[shard].recv())
+            block = free[shard].pop()
+            data = pending[shard]
+            blocks[shard][block].buf[:len(data) * 8] = data.tobytes()
+            connections[shard].send((block, len(data) // RECORD))
+            pending[shard] = array("q")
+
+        position = 0
+        for proc, r_w, addr, val in instructions:
+            position += 1
+            shard = addr % num_sets % shards
+            buffer = pending[shard]
+            buffer.extend((position, proc, r_w, addr, val))
+            if len(buffer) >= limit:
+                send(shard)
+        for shard in range(shards):
+            if pending[shard]:
+                send(shard)
+            connections[shard].send(None)
+
+        results = []
+        for connection in connections:
+            message = connection.recv()
+            while isinstance(message, int):  # Confirmações de blocos ainda não lidas
+                message = connection.recv()
+            results.append(message)
+        changes = [changes for _, changes in results]
+        for shard, connection in enumerate(connections):
+            # Para cada processador, quando as outras partições estavam todas cheias
+            connection.send([_others_full([shard_changes[number] for shard_changes in changes], shard)
+                             for number in range(config["num_processors"])])
+        capacity = sum(connection.recv() for connection in connections)
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for shard_blocks in blocks:
+            for block in shard_blocks:
+                block.close()
+                block.unlink()
+
+    state = merge([state for state, _ in results], capacity, num_sets, shards)
+    return restore(state), shards
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa uma simulação grande dividida por conjuntos da cache")
+    parser.add_argument("-n", type=int, default=1000000, help="número de instruções")
+    parser.add_argument("--protocolo", default="MESI", choices=sorted(PROTOCOLS))
+    parser.add_argument("--nucleos", type=int, default=4)
+    parser.add_argument("--memoria", type=int, default=4096, help="número de blocos de memória")
+    parser.add_argument("--conjuntos", type=int, default=64)
+    parser.add_argument("--vias", type=int, default=4)
+    parser.add_argument("--substituicao", default="LRU", choices=["LRU", "PLRU", "RANDOM"])
+    parser.add_argument("--coerencia", default="broadcast", choices=["broadcast", "directory"])
+    parser.add_argument("--carga", default="uniform", help=f"{'/'.join(WORKLOADS)} ou trace:<arquivo>")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trabalhadores", type=int, help="número de partições (padrão: núcleos da máquina)")
+    args = parser.parse_args()
+
+    config = {"protocol": args.protocolo, "num_processors": args.nucleos, "memory_size": args.memoria,
+              "num_sets": args.conjuntos, "ways": args.vias, "replacement": args.substituicao,
+              "coherence": args.coerencia, "seed": args.seed}
+    reason = decomposable(dict(DEFAULTS, **config), min(args.trabalhadores or os.cpu_count(), args.conjuntos))
+    if reason:
+        print(f"Execução serial: {reason}")
+    start = time.perf_counter()
+    cpu, shards = run_sharded(config, make_workload(args.carga, args.n, args.nucleos, args.memoria, args.seed),
+                              args.trabalhadores)
+    elapsed = time.perf_counter() - start
+    print(f"{args.n} instruções em {shards} partições: {elapsed:.2f}s ({args.n / elapsed:,.0f} instruções/s)")
+    cpu.print_final_metrics()
@@ -0,0 +1,245 @@
+import argparse
+import os
+
+from MOESIeMESIcomrelatorionofinal import CPU, Processor
+from cargas import WORKLOADS, make_workload
+from protocolos import PROTOCOLS
+
+# Prefetchers guiados pelos endereços acessados. Cada processador recebe uma PrefetchUnit
+# que observa os acessos, treina o prefetcher e traz as linhas previstas com
+# Processor.prefetch, isto é, por um BusRd normal do protocolo de coerência. A unidade
+# mede precisão (prefetches usados / emitidos), cobertura (misses evitados / misses sem
+# prefetch), pontualidade (prefetches usados com antecedência de pelo menos
+# `timely_distance` acessos do processador) e o tráfego extra de bus. Linhas prefetchadas
+# que saem da cache (substituídas ou invalidadas) antes de qualquer uso contam como inúteis.
+#
+# As instruções do simulador não têm PC: a tabela de stride é indexada por PC, mas todos os
+# acessos usam o PC 0, o que equivale a uma entrada por processador.
+
+
+class StridePrefetcher:
+    # Tabela por PC: [último endereço, passo, confiança]. Com confiança >= 2 (o mesmo passo
+    # visto duas vezes seguidas) prevê `degree` endereços a partir de `distance` passos à frente.
+    def __init__(self, degree=2, distance=1, table_size=64):
+        self.degree = degree
+        self.distance = distance
+        self.table_size = table_size
+        self.table = {}
+
+    def observe(self, pc, address, miss):
+        entry = self.table.pop(pc, None)
+        if entry is None:
+            if len(self.table) >= self.table_size:
+                del self.table[next(iter(self.table))]  # Remove a entrada usada há mais tempo
+            self.table[pc] = [address, 0, 0]
+            return ()
+        self.table[pc] = entry
+        stride = address - entry[0]
+        if stride == entry[1] and stride:
+            entry[2] = min(entry[2] + 1, 3)
+        else:
+            entry[1] = stride
+            entry[2] = max(entry[2] - 1, 0)
+        entry[0] = address
+        if entry[2] < 2:
+            return ()
+        return [address + stride * step for step in range(self.distance, self.distance + self.degree)]
+
+
+class GHBPrefetcher:
+    # Global History Buffer com correlação de deltas (G/DC). O buffer circular guarda os
+    # endereços dos misses; a tabela de índice aponta, para cada par de deltas consecutivos,
+    # a posição mais recente do buffer em que o par apareceu. Num novo miss, o par atual é
+    # procurado e os deltas que vieram depois da ocorrência anterior são repetidos a partir
+    # do endereço atual (em ciclo, se a previsão for além do miss atual); os `degree`
+    # endereços a partir do `distance`-ésimo são previstos.
+    def __init__(self, degree=2, distance=1, size=256, index_size=256):
+        self.degree = degree
+        self.distance = distance
+        self.size = size
+        self.index_size = index_size
+        self.buffer = [0] * size
+        self.count = 0  # Posição global do próximo miss (a entrada é count % size)
+        self.index = {}
+
+    def observe(self, pc, address, miss):
+        if not miss:
+            return ()
+        buffer = self.buffer
+        size = self.size
+        position = self.count
+        buffer[position % size] = address
+        self.count += 1
+        if position < 2:
+            return ()
+        key = (buffer[(position - 1) % size] - buffer[(position - 2) % size], address - buffer[(position - 1) % size])
+        previous = self.index.pop(key, None)
+        if len(self.index) >= self.index_size:
+            del self.index[next(iter(self.index))]
+        self.index[key] = position
+        if previous is None or previous <= position - size:
+            return ()  # Par novo ou já sobrescrito no buffer circular
+        targets = []
+        target = address
+        period = position - previous
+        for step in range(self.distance + self.degree - 1):
+            entry = previous + step % period
+            target += buffer[(entry + 1) % size] - buffer[entry % size]
+            if step >= self.distance - 1:
+                targets.append(target)
+        return targets
+
+
+PREFETCHERS = {"stride": StridePrefetcher, "ghb": GHBPrefetcher}
+
+# Arquivo lido por GHB e Stride/plotagemo3.py (executado a partir daquela pasta)
+RESULTS_PATH = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "GHB e Stride",
+                                            "resultados.txt"))
+
+
+class PrefetchUnit:
+    # Instala-se no lugar de Processor.access do processador: sem prefetcher o caminho
+    # normal não muda nada
+    def __init__(self, processor, prefetcher, timely_distance=2):
+        self.processor = processor
+        self.prefetcher = prefetcher
+        self.timely_distance = timely_distance
+        self.pending = {}  # Endereço prefetchado ainda não usado -> acesso em que foi emitido
+        self.accesses = 0
+        self.issued = 0
+        self.useful = 0
+        self.useless = 0  # Prefetches que saíram da cache sem uso
+        self.timely = 0
+        self.lead = 0  # Soma das antecedências (em acessos) dos prefetches usados
+        self.bus_transactions = 0  # Transações de bus causadas pelos prefetches
+        self.writebacks = 0  # Write-backs de linhas substituídas por prefetches
+        processor.access = self.access
+
+    def access(self, r_w, address, value=0):
+        processor = self.processor
+        miss = address not in processor.cache.slots
+        issued = self.pending.pop(address, None)
+        if issued is not None and not miss:
+            # Primeiro uso de uma linha trazida por prefetch: conta como miss para o treino
+            self.useful += 1
+            lead = self.accesses - issued
+            self.lead += lead
+            if lead >= self.timely_distance:
+                self.timely += 1
+            miss = True
+        result = Processor.access(processor, r_w, address, value)
+        self.accesses += 1
+
+        targets = self.prefetcher.observe(0, address, miss)
+        if targets:
+            metrics = processor.bus.metrics
+            before = (metrics.bus_transactions, metrics.writebacks)
+            size = processor.memory.size
+            for target in targets:
+                if 0 <= target < size and processor.prefetch(target):
+                    self.pending[target] = self.accesses
+                    self.issued += 1
+            self.bus_transactions += metrics.bus_transactions - before[0]
+            self.writebacks += metrics.writebacks - before[1]
+        return result
+
+    def drop(self, address):
+        # A linha saiu da cache; se era um prefetch ainda não usado, foi inútil
+        if self.pending.pop(address, None) is not None:
+            self.useless += 1
+
+
+def attach_prefetchers(cpu, name, timely_distance=2, **options):
+    # Uma PrefetchUnit (com seu próprio prefetcher) por processador; as linhas que saem de
+    # cada cache (Bus.track_drop) são avisadas à unidade do processador
+    if name not in PREFETCHERS:
+        raise ValueError(f"Prefetcher desconhecido: {name}")
+    units = [PrefetchUnit(processor, PREFETCHERS[name](**options), timely_distance) for processor in cpu.processors]
+    bus = cpu.bus
+    track_drop = bus.track_drop
+
+    def prefetch_track_drop(processor_no, address):
+        track_drop(processor_no, address)
+        units[processor_no].drop(address)
+
+    bus.track_drop = prefetch_track_drop
+    return units
+
+
+def prefetch_report(cpu, units):
+    metrics = cpu.bus.metrics
+    issued = sum(unit.issued for unit in units)
+    useful = sum(unit.useful for unit in units)
+    useless = sum(unit.useless for unit in units)
+    timely = sum(unit.timely for unit in units)
+    instructions = metrics.total_instructions
+    return {
+        "instructions": instructions,
+        "cache_misses": metrics.cache_misses,
+        "miss_rate": metrics.cache_misses / instructions if instructions else 0,
+        "issued": issued,
+        "useful": useful,
+        "useless": useless,
+        "accuracy": useful / issued if issued else 0,
+        # Misses que o prefetch evitou sobre os que haveria sem ele
+        "coverage": useful / (useful + metrics.cache_misses) if useful + metrics.cache_misses else 0,
+        "timeliness": timely / useful if useful else 0,
+        "mean_lead": sum(unit.lead for unit in units) / useful if useful else 0,
+        "extra_bus_transactions": sum(unit.bus_transactions for unit in units),
+        "extra_writebacks": sum(unit.writebacks for unit in units),
+    }
+
+
+def write_results(path, baseline, reports):
+    # Formato lido por GHB e Stride/plotagemo3.py: "Chave valor" por linha, taxas em %
+    lines = [f"Taxa_Cache_Miss_Base {baseline['miss_rate'] * 100:.2f}",
+             f"Cache_Misses_Base {baseline['cache_misses']}"]
+    for label, report in reports.items():
+        lines += [f"Taxa_Cache_Miss_{label} {report['miss_rate'] * 100:.2f}",
+                  f"Cache_Misses_{label} {report['cache_misses']}",
+                  f"Precisao_{label} {report['accuracy'] * 100:.2f}",
+                  f"Cobertura_{label} {report['coverage'] * 100:.2f}",
+                  f"Pontualidade_{label} {report['timeliness'] * 100:.2f}",
+                  f"Trafego_Extra_{label} {report['extra_bus_transactions']}"]
+    lines.append(f"Total_Instrucoes {baseline['instructions']}")
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara os prefetchers Stride e GHB e grava os resultados")
+    parser.add_argument("-n", type=int, default=15000, help="número de instruções")
+    parser.add_argument("--protocolo", default="MESI", choices=sorted(PROTOCOLS))
+    parser.add_argument("--nucleos", type=int, default=4)
+    parser.add_argument("--memoria", type=int, default=1024, help="número de blocos de memória")
+    parser.add_argument("--conjuntos", type=int, default=16)
+    parser.add_argument("--vias", type=int, default=4)
+    parser.add_argument("--carga", default="strided", help=f"{'/'.join(WORKLOADS)} ou trace:<arquivo>")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--grau", type=int, default=2, help="linhas previstas por acesso")
+    parser.add_argument("--distancia", type=int, default=4, help="quantos passos à frente começa a previsão")
+    parser.add_argument("--saida", default=RESULTS_PATH, help="padrão: GHB e Stride/resultados.txt")
+    args = parser.parse_args()
+
+    def build():
+        return CPU(args.protocolo, args.conjuntos, args.vias, memory_size=args.memoria, seed=args.seed,
+                   num_processors=args.nucleos)
+
+    def workload():
+        return make_workload(args.carga, args.n, args.nucleos, args.memoria, args.seed)
+
+    cpu = build()
+    cpu.run_simulation(workload())
+    baseline = prefetch_report(cpu, [])
+    print(f"Sem prefetch: taxa de miss {baseline['miss_rate']:.2%}")
+    reports = {}
+    for label, name in [("Stride", "stride"), ("GHB", "ghb")]:
+        cpu = build()
+        units = attach_prefetchers(cpu, name, degree=args.grau, distance=args.distancia)
+        cpu.run_simulation(workload())
+        report = reports[label] = prefetch_report(cpu, units)
+        print(f"{label}: taxa de miss {report['miss_rate']:.2%}, precisão {report['accuracy']:.2%} "
+              f"({report['useless']} inúteis), cobertura {report['coverage']:.2%}, "
+              f"pontualidade {report['timeliness']:.2%}, tráfego extra {report['extra_bus_transactions']} transações")
+    write_results(args.saida, baseline, reports)
+    print(f"Resultados gravados em {args.saida}")
@@ -0,0 +1,167 @@
+# Tabelas de transição dos protocolos de coerência.
+#
+# Cada protocolo é declarado só com dados: a classe Protocol (no simulador) compila a
+# tabela para arrays indexados por inteiros, usados no caminho quente. O estado "I" é
+# sempre o primeiro (código 0) e corresponde a uma linha ausente da cache.
+#
+# "local": (estado, evento do processador) -> (ação de bus, próximo estado se outra cache
+#          tem a linha, próximo estado se não tem, custo em ciclos)
+#          O custo é o nome de um campo de custo do Metrics; a ação de bus soma bus_cycles.
+# "snoop": (estado, evento de bus) -> (próximo estado, resposta)
+#          Resposta: None (não fornece o dado), "supply" (fornece cache-a-cache, a memória
+#          continua desatualizada) ou "flush" (fornece e escreve na memória).
+#          Pares ausentes mantêm o estado. No BusUpd as cópias recebem o novo valor.
+# "dirty": estados em que a memória está desatualizada (write-back ao substituir).
+
+# Eventos do processador
+READ = 0
+WRITE = 1
+LOCAL_EVENTS = {"read": READ, "write": WRITE}
+
+# Ações/eventos de bus
+NONE = 0
+BUS_RD = 1
+BUS_RDX = 2
+BUS_UPGR = 3
+BUS_UPD = 4
+BUS_RD_UPD = 5  # BusRd seguido de BusUpd se a linha for compartilhada (write miss no Dragon)
+BUS_EVENTS = 5  # Eventos vistos pelo snoop: BUS_RD..BUS_UPD
+BUS_ACTIONS = {None: NONE, "BusRd": BUS_RD, "BusRdX": BUS_RDX, "BusUpgr": BUS_UPGR, "BusUpd": BUS_UPD,
+               "BusRd+BusUpd": BUS_RD_UPD}
+
+# Respostas de snoop
+SUPPLY = 1
+FLUSH = 2
+SNOOP_RESPONSES = {None: 0, "supply": SUPPLY, "flush": FLUSH}
+
+HIT = "cache_access_cycles"
+MISS = "memory_access_cycles"
+
+
+MSI = {
+    "states": ["I", "S", "M"],
+    "dirty": ["M"],
+    "local": {
+        ("I", "read"): ("BusRd", "S", "S", MISS),
+        ("I", "write"): ("BusRdX", "M", "M", MISS),
+        ("S", "read"): (None, "S", "S", HIT),
+        ("S", "write"): ("BusUpgr", "M", "M", HIT),
+        ("M", "read"): (None, "M", "M", HIT),
+        ("M", "write"): (None, "M", "M", HIT),
+    },
+    "snoop": {
+        ("S", "BusRdX"): ("I", None),
+        ("S", "BusUpgr"): ("I", None),
+        ("M", "BusRd"): ("S", "flush"),
+        ("M", "BusRdX"): ("I", "supply"),
+    },
+}
+
+MESI = {
+    "states": ["I", "S", "E", "M"],
+    "dirty": ["M"],
+    "local": {
+        ("I", "read"): ("BusRd", "S", "E", MISS),
+        ("I", "write"): ("BusRdX", "M", "M", MISS),
+        ("S", "read"): (None, "S", "S", HIT),
+        ("S", "write"): ("BusUpgr", "M", "M", HIT),
+        ("E", "read"): (None, "E", "E", HIT),
+        ("E", "write"): (None, "M", "M", HIT),
+        ("M", "read"): (None, "M", "M", HIT),
+        ("M", "write"): (None, "M", "M", HIT),
+    },
+    "snoop": {
+        ("S", "BusRdX"): ("I", None),
+        ("S", "BusUpgr"): ("I", None),
+        ("E", "BusRd"): ("S", None),
+        ("E", "BusRdX"): ("I", None),
+        ("M", "BusRd"): ("S", "flush"),
+        ("M", "BusRdX"): ("I", "supply"),
+    },
+}
+
+# MOESI: o dono de uma linha suja passa a O em vez de escrever na memória
+MOESI = {
+    "states": ["I", "S", "E", "O", "M"],
+    "dirty": ["O", "M"],
+    "local": {
+        ("I", "read"): ("BusRd", "S", "E", MISS),
+        ("I", "write"): ("BusRdX", "M", "M", MISS),
+        ("S", "read"): (None, "S", "S", HIT),
+        ("S", "write"): ("BusUpgr", "M", "M", HIT),
+        ("E", "read"): (None, "E", "E", HIT),
+        ("E", "write"): (None, "M", "M", HIT),
+        ("O", "read"): (None, "O", "O", HIT),
+        ("O", "write"): ("BusUpgr", "M", "M", HIT),
+        ("M", "read"): (None, "M", "M", HIT),
+        ("M", "write"): (None, "M", "M", HIT),
+    },
+    "snoop": {
+        ("S", "BusRdX"): ("I", None),
+        ("S", "BusUpgr"): ("I", None),
+        ("E", "BusRd"): ("S", None),
+        ("E", "BusRdX"): ("I", None),
+        ("O", "BusRd"): ("O", "supply"),
+        ("O", "BusRdX"): ("I", "supply"),
+        ("O", "BusUpgr"): ("I", None),
+        ("M", "BusRd"): ("O", "supply"),
+        ("M", "BusRdX"): ("I", "supply"),
+    },
+}
+
+# MESIF: a cópia mais recente fica em F e é a única que responde ao BusRd
+MESIF = {
+    "states": ["I", "S", "E", "F", "M"],
+    "dirty": ["M"],
+    "local": {
+        ("I", "read"): ("BusRd", "F", "E", MISS),
+        ("I", "write"): ("BusRdX", "M", "M", MISS),
+        ("S", "read"): (None, "S", "S", HIT),
+        ("S", "write"): ("BusUpgr", "M", "M", HIT),
+        ("E", "read"): (None, "E", "E", HIT),
+        ("E", "write"): (None, "M", "M", HIT),
+        ("F", "read"): (None, "F", "F", HIT),
+        ("F", "write"): ("BusUpgr", "M", "M", HIT),
+        ("M", "read"): (None, "M", "M", HIT),
+        ("M", "write"): (None, "M", "M", HIT),
+    },
+    "snoop": {
+        ("S", "BusRdX"): ("I", None),
+        ("S", "BusUpgr"): ("I", None),
+        ("E", "BusRd"): ("S", "supply"),
+        ("E", "BusRdX"): ("I", None),
+        ("F", "BusRd"): ("S", "supply"),
+        ("F", "BusRdX"): ("I", None),
+        ("F", "BusUpgr"): ("I", None),
+        ("M", "BusRd"): ("S", "flush"),
+        ("M", "BusRdX"): ("I", "supply"),
+    },
+}
+
+# Dragon: protocolo de atualização; escritas em linhas compartilhadas enviam o novo valor
+# (BusUpd) às outras cópias em vez de invalidá-las. Sc = compartilhada limpa,
+# Sm = compartilhada modificada (dona).
+DRAGON = {
+    "states": ["I", "Sc", "E", "Sm", "M"],
+    "dirty": ["Sm", "M"],
+    "local": {
+        ("I", "read"): ("BusRd", "Sc", "E", MISS),
+        ("I", "write"): ("BusRd+BusUpd", "Sm", "M", MISS),
+        ("Sc", "read"): (None, "Sc", "Sc", HIT),
+        ("Sc", "write"): ("BusUpd", "Sm", "M", HIT),
+        ("E", "read"): (None, "E", "E", HIT),
+        ("E", "write"): (None, "M", "M", HIT),
+        ("Sm", "read"): (None, "Sm", "Sm", HIT),
+        ("Sm", "write"): ("BusUpd", "Sm", "M", HIT),
+        ("M", "read"): (None, "M", "M", HIT),
+        ("M", "write"): (None, "M", "M", HIT),
+    },
+    "snoop": {
+        ("E", "BusRd"): ("Sc", None),
+        ("Sm", "BusRd"): ("Sm", "supply"),
+        ("Sm", "BusUpd"): ("Sc", None),
+        ("M", "BusRd"): ("Sm", "supply"),
+    },
+}
+
+PROTOCOLS = {"MSI": MSI, "MESI": MESI, "MOESI": MOESI, "MESIF": MESIF, "DRAGON": DRAGON}
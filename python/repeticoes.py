@@ -0,0 +1,184 @@
+import argparse
+import os
+import time
+
+from amostragem import WindowStats
+from cache_resultados import ResultCache
+from cargas import WORKLOADS
+from protocolos import PROTOCOLS
+from varredura import DEFAULTS, run_sweep
+
+# Repetições adaptativas: em vez de adivinhar quantas execuções são necessárias, roda
+# repetições com sementes config["seed"], config["seed"] + 1, ... e atualiza média e
+# variância de cada métrica de forma incremental (Welford, como na amostragem). Para assim
+# que a meia largura do intervalo de confiança de todas as métricas fica abaixo do alvo.
+#
+# Com dois protocolos e `difference`, cada repetição roda os dois com a mesma semente (mesma
+# carga) e a estatística é a diferença protocolo[0] - protocolo[1] por semente; o
+# pareamento tira a variação da carga e costuma precisar de bem menos repetições.
+#
+# As repetições rodam em lotes de `workers` sementes pela varredura (varredura.run_sweep,
+# com o mesmo cache de resultados opcional), mas entram nas estatísticas em ordem de
+# semente, então o resultado não depende do número de processos: repetições de um lote
+# posteriores à parada são descartadas. Só cargas geradas a partir da semente fazem
+# sentido: um trace é o mesmo em toda repetição e é recusado.
+
+METRICS = ["miss_rate", "total_cycles"]
+
+
+class AdaptiveReplicates:
+    def __init__(self, config, protocols, metrics=None, confidence=0.95, target_error=0.02, targets=None,
+                 difference=False, min_replicates=5, max_replicates=1000):
+        if difference and len(protocols) != 2:
+            raise ValueError("A diferença exige exatamente dois protocolos")
+        if min_replicates < 2:
+            raise ValueError("São necessárias pelo menos 2 repetições para estimar a variância")
+        self.config = dict(DEFAULTS, **config)
+        if self.config["workload"].startswith("trace:"):
+            # Um trace é o mesmo em toda repetição: a variância seria 0 e o intervalo, falso
+            raise ValueError("Repetições exigem uma carga gerada a partir da semente, não um trace")
+        self.protocols = list(protocols)
+        self.metrics = list(metrics or METRICS)
+        self.confidence = confidence
+        self.target_error = target_error  # Meia largura do intervalo / |média|
+        self.targets = targets or {}  # Métrica -> meia largura absoluta (substitui o erro relativo)
+        self.difference = difference
+        self.min_replicates = min_replicates
+        self.max_replicates = max_replicates
+        if difference:
+            self.series = [f"{protocols[0]}-{protocols[1]}:{metric}" for metric in self.metrics]
+        else:
+            self.series = [f"{protocol}:{metric}" for protocol in protocols for metric in self.metrics]
+        self.stats = {name: WindowStats() for name in self.series}
+        self.replicates = 0
+        self.simulations = 0  # Simulações executadas, incluindo as descartadas no fim
+        self.cached = 0
+
+    def add(self, results):
+        # Uma repetição: protocolo -> métricas de CPU.get_metrics
+        if self.difference:
+            first, second = self.protocols
+            values = [results[first][metric] - results[second][metric] for metric in self.metrics]
+        else:
+            values = [results[protocol][metric] for protocol in self.protocols for metric in self.metrics]
+        for name, value in zip(self.series, values):
+            self.stats[name].add(value)
+        self.replicates += 1
+
+    def relative_error(self, name):
+        stats = self.stats[name]
+        half_width = stats.half_width(self.confidence)
+        if not stats.mean:
+            return 0.0 if half_width == 0 else float("inf")
+        return half_width / abs(stats.mean)
+
+    def within_target(self, name):
+        metric = name.rpartition(":")[2]
+        if metric in self.targets:
+            return self.stats[name].half_width(self.confidence) <= self.targets[metric]
+        return self.relative_error(name) <= self.target_error
+
+    def converged(self):
+        return self.replicates >= self.min_replicates and all(self.within_target(name) for name in self.series)
+
+    def run(self, workers=None, cache=None):
+        # Gera o número de repetições aceitas após cada lote, até convergir ou chegar a
+        # max_replicates
+        workers = workers or os.cpu_count()
+        seed = self.config["seed"]
+        while not self.converged() and self.replicates < self.max_replicates:
+            first = seed + self.replicates
+            count = min(max(workers, self.min_replicates - self.replicates), self.max_replicates - self.replicates)
+            points = [dict(self.config, protocol=protocol, seed=first + offset)
+                      for offset in range(count) for protocol in self.protocols]
+            results = {}
+            for result in run_sweep(points, workers, cache=cache):
+                config = result["config"]
+                if "error" in result:
+                    raise RuntimeError(f"Repetição {config['protocol']} seed={config['seed']} falhou: "
+                                       f"{result['error']}")
+                results[config["seed"], config["protocol"]] = result["metrics"]
+                self.cached += bool(result.get("cached"))
+            self.simulations += len(points)
+            for offset in range(count):
+                self.add({protocol: results[first + offset, protocol] for protocol in self.protocols})
+                if self.converged():
+                    break
+            yield self.replicates
+
+    def report(self):
+        estimates = {}
+        for name in self.series:
+            stats = self.stats[name]
+            estimates[name] = {"mean": stats.mean, "half_width": stats.half_width(self.confidence),
+                               "relative_error": self.relative_error(name), "within_target": self.within_target(name)}
+        return {
+            "replicates": self.replicates,
+            "simulations": self.simulations,
+            "cached": self.cached,
+            "confidence": self.confidence,
+            "target_error": self.target_error,
+            "targets": self.targets,
+            "converged": self.converged(),
+            "estimates": estimates,
+        }
+
+
+def print_replicates(report, max_replicates=None):
+    print("\nRepetições adaptativas")
+    print("=" * 30)
+    print(f"Repetições aceitas: {report['replicates']} ({report['simulations']} simulações, "
+          f"{report['cached']} do cache)")
+    for name, estimate in report["estimates"].items():
+        print(f"{name}: {estimate['mean']:.6g} ± {estimate['half_width']:.4g} ({report['confidence']:.0%}, "
+              f"erro relativo {estimate['relative_error']:.2%}){'' if estimate['within_target'] else ' (fora do alvo)'}")
+    if not report["converged"]:
+        print("Precisão alvo não atingida no limite de repetições")
+    elif max_replicates:
+        print(f"Parou com {report['replicates']} de no máximo {max_replicates} repetições "
+              f"({1 - report['replicates'] / max_replicates:.0%} a menos)")
+
+
+def parse_target(text):
+    # "metrica=meia_largura"
+    metric, _, value = text.partition("=")
+    return metric, float(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Repete a simulação até o intervalo de confiança ficar estreito")
+    parser.add_argument("--protocolos", nargs="+", default=["MESI"], choices=sorted(PROTOCOLS))
+    parser.add_argument("--diferenca", action="store_true", help="estima protocolo[0] - protocolo[1] pareado por semente")
+    parser.add_argument("--metricas", nargs="+", default=METRICS)
+    parser.add_argument("-n", type=int, default=DEFAULTS["n"], help="instruções por repetição")
+    parser.add_argument("--nucleos", type=int, default=DEFAULTS["num_processors"])
+    parser.add_argument("--memoria", type=int, default=DEFAULTS["memory_size"], help="número de blocos de memória")
+    parser.add_argument("--conjuntos", type=int, default=DEFAULTS["num_sets"])
+    parser.add_argument("--vias", type=int, default=DEFAULTS["ways"])
+    parser.add_argument("--carga", default=DEFAULTS["workload"], choices=sorted(WORKLOADS),
+                        help="carga gerada a partir da semente (traces não variam entre repetições)")
+    parser.add_argument("--seed", type=int, default=DEFAULTS["seed"], help="semente da primeira repetição")
+    parser.add_argument("--confianca", type=float, default=0.95)
+    parser.add_argument("--erro", type=float, default=0.02, help="erro relativo alvo")
+    parser.add_argument("--alvo", type=parse_target, nargs="+", default=[],
+                        help="meia largura absoluta por métrica, ex.: miss_rate=0.002")
+    parser.add_argument("--minimo", type=int, default=5, help="repetições mínimas")
+    parser.add_argument("--maximo", type=int, default=1000, help="repetições máximas")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--cache", help="banco SQLite de resultados já calculados (cache_resultados.py)")
+    parser.add_argument("--cache-max-mb", type=float, default=256)
+    args = parser.parse_args()
+
+    config = {"num_processors": args.nucleos, "memory_size": args.memoria, "num_sets": args.conjuntos,
+              "ways": args.vias, "workload": args.carga, "n": args.n, "seed": args.seed}
+    runner = AdaptiveReplicates(config, args.protocolos, args.metricas, args.confianca, args.erro, dict(args.alvo),
+                                args.diferenca, args.minimo, args.maximo)
+    cache = ResultCache(args.cache, int(args.cache_max_mb * 1024 * 1024)) if args.cache else None
+    start = time.perf_counter()
+    for replicates in runner.run(args.workers, cache):
+        worst = max(runner.series, key=runner.relative_error)
+        print(f"{replicates} repetições, maior erro relativo {runner.relative_error(worst):.2%} ({worst})")
+    print_replicates(runner.report(), args.maximo)
+    print(f"Tempo: {time.perf_counter() - start:.1f}s")
+    if cache:
+        cache.close()
@@ -0,0 +1,267 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from MOESIeMESIcomrelatorionofinal import COST_FIELDS, Metrics, Protocol
+from protocolos import BUS_EVENTS, BUS_RD_UPD, BUS_UPD, FLUSH, PROTOCOLS
+
+# Motor de réplicas em paralelo com NumPy. Em vez de um grafo de objetos por simulação,
+# o estado de todas as réplicas fica em arrays com o eixo da réplica na frente: endereços,
+# estados, valores e carimbos LRU de cada linha de cada cache, o mapa endereço -> linha de
+# cada cache (o equivalente denso de Cache.slots), a memória e os contadores do Metrics.
+# Cada passo do trace aplica uma instrução a todas as réplicas de uma vez, com as mesmas
+# tabelas compiladas por Protocol usadas como tabelas de consulta vetorizadas.
+#
+# Para um mesmo fluxo de instruções, os contadores de cada réplica são iguais aos de
+# CPU.run_simulation com substituição LRU e coerência por broadcast. Só protocolos de
+# invalidação são aceitos (BusUpd atualiza as cópias e exigiria um passo a mais por
+# snoop); o tráfego por processador/endereço não é acompanhado. O mapa de linhas ocupa
+# réplicas x processadores x blocos de memória, então a memória deve ser pequena.
+
+COUNTERS = ["total_cycles", "store_instructions", "cache_misses", "evictions", "capacity_evictions", "writebacks",
+            "bus_transactions"]
+
+DEFAULT_CHUNK = 4096
+
+
+class ReplicateEngine:
+    def __init__(self, protocol_type="MESI", replicates=1000, num_sets=4, ways=2, memory_size=4, num_processors=4,
+                 costs=None, seed=None):
+        protocol = Protocol(protocol_type)
+        if BUS_UPD in protocol.action or BUS_RD_UPD in protocol.action:
+            raise ValueError(f"O motor de réplicas só aceita protocolos de invalidação ({protocol_type} usa BusUpd)")
+        metrics = Metrics()
+        for name, value in (costs or {}).items():
+            if name not in COST_FIELDS:
+                raise ValueError(f"Custo desconhecido: {name}")
+            setattr(metrics, name, value)
+        protocol.bind_costs(metrics)
+        self.protocol = protocol
+        self.costs = {name: getattr(metrics, name) for name in COST_FIELDS}
+
+        # Tabelas do protocolo como arrays para consultas vetorizadas. O custo de cada
+        # transição local já inclui bus_cycles quando ela gera uma transação.
+        self.action = np.array(protocol.action, np.int64)
+        self.cost = np.array(protocol.cost, np.int64) + (self.action != 0) * self.costs["bus_cycles"]
+        self.next_shared = np.array(protocol.next_shared, np.int8)
+        self.next_alone = np.array(protocol.next_alone, np.int8)
+        self.dirty = np.array(protocol.dirty, bool)
+        self.snoop_next = np.array(protocol.snoop_next, np.int8)
+        self.snoop_response = np.array(protocol.snoop_response, np.int8)
+
+        self.replicates = replicates
+        self.num_processors = num_processors
+        self.num_sets = num_sets
+        self.ways = ways
+        self.lines = num_sets * ways
+        self.memory_size = memory_size
+        # Arrays planos. A cache do processador p na réplica r é a cache c = r * num_processors + p
+        # e a linha global c * lines + slot; mapas e memória usam c * memory_size + endereço e
+        # r * memory_size + endereço. Os arrays de linhas têm uma posição a mais no fim, sempre
+        # vazia e em I, para que a linha -1 (ausente) possa ser consultada sem máscara.
+        caches = replicates * num_processors
+        self.addresses = np.full(caches * self.lines + 1, -1, np.int64)  # -1 indica linha vazia
+        self.states = np.zeros(caches * self.lines + 1, np.int8)
+        self.values = np.zeros(caches * self.lines + 1, np.int64)
+        self.stamps = np.zeros(caches * self.lines + 1, np.int64)  # Último acesso de cada linha (LRU)
+        self.valid_lines = np.zeros(caches, np.int64)
+        # Linha global de cada endereço presente em cada cache (-1 = ausente)
+        self.line_of = np.full(caches * memory_size, -1, np.int32 if caches * self.lines < 2 ** 31 else np.int64)
+        self.memory = np.random.default_rng(seed).integers(0, 1001, replicates * memory_size)
+        # Contadores por réplica; os demais campos do Metrics são derivados em get_metrics
+        # (todas as réplicas executam o mesmo número de instruções)
+        self.counters = {name: np.zeros(replicates, np.int64) for name in COUNTERS}
+        self.first_cache = np.arange(replicates) * num_processors
+        self.processor_offsets = (np.arange(num_processors) * memory_size)[:, None]
+        self.time = 0
+
+    def step(self, proc, r_w, address, value):
+        # Uma instrução em cada réplica (arrays de tamanho `replicates`)
+        counters = self.counters
+        memory_size = self.memory_size
+        addresses, states, values, line_of = self.addresses, self.states, self.values, self.line_of
+        self.time += 1
+
+        cache = self.first_cache + proc
+        line = line_of[cache * memory_size + address].astype(np.int64)
+        miss = line < 0
+        index = states[line] * 2 + r_w
+        counters["store_instructions"] += r_w
+        counters["cache_misses"] += miss
+        counters["total_cycles"] += self.cost[index]
+        next_state = self.next_alone[index]
+
+        action = self.action[index]
+        active = np.flatnonzero(action)
+        if active.size:
+            event = action[active]
+            bus_address = address[active]
+            counters["bus_transactions"] += action != 0
+
+            # Snoop: a linha do endereço em cada cache da réplica (processador x transação ativa).
+            # A própria cache só aparece nos hits (BusUpgr) e é excluída pela comparação.
+            target_lines = line_of[(self.first_cache[active] * memory_size + bus_address)
+                                   + self.processor_offsets].astype(np.int64)
+            present = (target_lines >= 0) & (target_lines != line[active])
+            shared = np.logical_or.reduce(present)
+            memory_index = active * memory_size + bus_address
+            data = self.memory[memory_index]
+            pairs = np.flatnonzero(present)
+            if pairs.size:
+                row = pairs % active.size
+                snooped = target_lines.ravel()[pairs]
+                snoop_index = states[snooped] * BUS_EVENTS + event[row]
+                response = self.snoop_response[snoop_index]
+                supplied = np.flatnonzero(response)
+                data[row[supplied]] = values[snooped[supplied]]
+                flushed = supplied[response[supplied] == FLUSH]
+                if flushed.size:
+                    self.memory[memory_index[row[flushed]]] = values[snooped[flushed]]
+                    counters["total_cycles"][active[row[flushed]]] += self.costs["memory_access_cycles"]
+                snoop_next = self.snoop_next[snoop_index]
+                states[snooped] = snoop_next
+                dropped = np.flatnonzero(snoop_next == 0)
+                if dropped.size:
+                    dropped_lines = snooped[dropped]
+                    dropped_caches = dropped_lines // self.lines
+                    addresses[dropped_lines] = -1
+                    line_of[dropped_caches * memory_size + bus_address[row[dropped]]] = -1
+                    self.valid_lines[dropped_caches] -= 1
+            next_state[active] = np.where(shared, self.next_shared[index[active]], next_state[active])
+
+            # Misses: escolhe a via (livre ou LRU) e substitui a linha se o conjunto estiver cheio
+            missed = np.flatnonzero(miss[active])
+            if missed.size:
+                lanes = active[missed]
+                fill_cache = cache[lanes]
+                fill_address = bus_address[missed]
+                base = fill_cache * self.lines + (fill_address % self.num_sets) * self.ways
+                fill_line, evicted = self._victims(base)
+                if evicted.size:
+                    self._evict(lanes[evicted], fill_cache[evicted], fill_line[evicted])
+                addresses[fill_line] = fill_address
+                line_of[fill_cache * memory_size + fill_address] = fill_line
+                values[fill_line] = data[missed]
+                self.valid_lines[fill_cache] += 1
+                line[lanes] = fill_line
+
+        states[line] = next_state
+        writes = np.flatnonzero(r_w)
+        values[line[writes]] = value[writes]
+        self.stamps[line] = self.time
+
+    def _victims(self, base):
+        # Primeira via livre de cada conjunto ou, sem via livre, a usada há mais tempo. As
+        # vias são percorridas uma a uma: com poucas vias isso é mais rápido que reduções
+        # ao longo de um eixo curto.
+        addresses, stamps = self.addresses, self.stamps
+        free = np.full(len(base), -1)
+        oldest = base.copy()
+        oldest_stamp = stamps[base]
+        for way in range(self.ways - 1, -1, -1):
+            line = base + way
+            free = np.where(addresses[line] == -1, line, free)
+            if way:
+                stamp = stamps[line]
+                older = stamp < oldest_stamp
+                oldest = np.where(older, line, oldest)
+                oldest_stamp = np.where(older, stamp, oldest_stamp)
+        full = free < 0
+        return np.where(full, oldest, free), np.flatnonzero(full)
+
+    def _evict(self, lanes, caches, lines):
+        counters = self.counters
+        counters["evictions"][lanes] += 1
+        counters["capacity_evictions"][lanes] += self.valid_lines[caches] == self.lines
+        victims = self.addresses[lines]
+        dirty = np.flatnonzero(self.dirty[self.states[lines]])
+        if dirty.size:
+            counters["writebacks"][lanes[dirty]] += 1
+            counters["total_cycles"][lanes[dirty]] += self.costs["memory_access_cycles"]
+            self.memory[lanes[dirty] * self.memory_size + victims[dirty]] = self.values[lines[dirty]]
+        self.line_of[caches * self.memory_size + victims] = -1
+        self.states[lines] = 0
+        self.valid_lines[caches] -= 1
+
+    def run(self, chunks):
+        # chunks: blocos (processadores, r_w, endereços, valores), cada array com forma
+        # (instruções, réplicas)
+        step = self.step
+        for procs, writes, addresses, values in chunks:
+            for t in range(len(procs)):
+                step(procs[t], writes[t], addresses[t], values[t])
+
+    def get_metrics(self):
+        # Métricas por réplica (arrays), com as mesmas chaves de CPU.get_metrics
+        metrics = {name: counter.copy() for name, counter in self.counters.items()}
+        instructions = np.full(self.replicates, self.time, np.int64)
+        metrics["total_instructions"] = instructions
+        metrics["load_instructions"] = instructions - metrics["store_instructions"]
+        metrics["compute_cycles"] = instructions * self.costs["compute_cost"]
+        metrics["idle_cycles"] = metrics["total_cycles"] - metrics["compute_cycles"]
+        metrics["conflict_evictions"] = metrics["evictions"] - metrics["capacity_evictions"]
+        metrics["snoop_lookups"] = metrics["bus_transactions"] * (self.num_processors - 1)
+        metrics["miss_rate"] = metrics["cache_misses"] / max(self.time, 1)
+        return metrics
+
+    def summary(self, names=("miss_rate", "total_cycles"), percentiles=(5, 50, 95)):
+        # Distribuição de cada métrica entre as réplicas
+        metrics = self.get_metrics()
+        summary = {}
+        for name in names:
+            values = metrics[name].astype(np.float64)
+            summary[name] = {"mean": values.mean(), "std": values.std(ddof=1) if len(values) > 1 else 0.0,
+                             "min": values.min(), "max": values.max(),
+                             **{f"p{p}": value for p, value in zip(percentiles, np.percentile(values, percentiles))}}
+        return summary
+
+
+def uniform_lanes(n, replicates, num_processors, memory_size, seed=None, chunk_size=DEFAULT_CHUNK):
+    # Fluxo uniforme independente para cada réplica, gerado em blocos (instruções, réplicas)
+    rng = np.random.default_rng(seed)
+    for first in range(0, n, chunk_size):
+        shape = (min(chunk_size, n - first), replicates)
+        yield (rng.integers(0, num_processors, shape), rng.integers(0, 2, shape, np.int8),
+               rng.integers(0, memory_size, shape), rng.integers(0, 1001, shape))
+
+
+def stack_streams(streams, n, chunk_size=DEFAULT_CHUNK):
+    # Junta fluxos de instruções comuns (um por réplica, como os de cargas.py) em blocos de lanes
+    streams = [iter(stream) for stream in streams]
+    for first in range(0, n, chunk_size):
+        size = min(chunk_size, n - first)
+        block = np.array([[next(stream) for _ in range(size)] for stream in streams], np.int64)
+        yield block[:, :, 0].T.copy(), block[:, :, 1].T.copy(), block[:, :, 2].T.copy(), block[:, :, 3].T.copy()
+
+
+if __name__ == "__main__":
+    invalidation = sorted(name for name, table in PROTOCOLS.items()
+                          if not any(action and "BusUpd" in action for action, *_ in table["local"].values()))
+    parser = argparse.ArgumentParser(description="Simula milhares de réplicas independentes em paralelo com NumPy")
+    parser.add_argument("--replicas", type=int, default=10000)
+    parser.add_argument("-n", type=int, default=1000, help="instruções por réplica")
+    parser.add_argument("--protocolo", default="MESI", choices=invalidation)
+    parser.add_argument("--nucleos", type=int, default=4)
+    parser.add_argument("--memoria", type=int, default=4, help="número de blocos de memória")
+    parser.add_argument("--conjuntos", type=int, default=4)
+    parser.add_argument("--vias", type=int, default=2)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--saida", help="grava as métricas de cada réplica em JSON")
+    args = parser.parse_args()
+
+    engine = ReplicateEngine(args.protocolo, args.replicas, args.conjuntos, args.vias, args.memoria, args.nucleos,
+                             seed=args.seed)
+    start = time.perf_counter()
+    engine.run(uniform_lanes(args.n, args.replicas, args.nucleos, args.memoria, args.seed))
+    elapsed = time.perf_counter() - start
+    print(f"{args.replicas} réplicas x {args.n} instruções em {elapsed:.2f}s "
+          f"({args.replicas * args.n / elapsed:,.0f} instruções/s)")
+    labels = {"miss_rate": "Taxa de Cache Miss", "total_cycles": "Ciclos Totais"}
+    for name, stats in engine.summary().items():
+        print(f"{labels[name]}: média {stats['mean']:.4f}, desvio {stats['std']:.4f}, "
+              f"p5 {stats['p5']:.4f}, p50 {stats['p50']:.4f}, p95 {stats['p95']:.4f}")
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as file:
+            json.dump({name: values.tolist() for name, values in engine.get_metrics().items()}, file)
@@ -0,0 +1,96 @@
+from collections import deque
+
+# Séries temporais de métricas com memória limitada. As métricas são amostradas a cada
+# `window` instruções; as últimas janelas ficam em um buffer circular e a série completa
+# é mantida decimada (min, max e média por balde), com no máximo `max_buckets` baldes
+# independentemente do tamanho da execução.
+
+
+class DecimatedSeries:
+    # Cada balde é [primeira instrução, amostras, mínimo, máximo, soma]. Quando o número de
+    # baldes passa de max_buckets, baldes vizinhos são fundidos dois a dois e a largura
+    # (amostras por balde) dobra.
+    def __init__(self, max_buckets=1000):
+        self.max_buckets = max(2, max_buckets)
+        self.width = 1
+        self.buckets = []
+
+    def add(self, position, value):
+        buckets = self.buckets
+        if buckets and buckets[-1][1] < self.width:
+            bucket = buckets[-1]
+            bucket[1] += 1
+            if value < bucket[2]:
+                bucket[2] = value
+            if value > bucket[3]:
+                bucket[3] = value
+            bucket[4] += value
+            return
+        buckets.append([position, 1, value, value, value])
+        if len(buckets) > self.max_buckets:
+            self._merge()
+
+    def _merge(self):
+        merged = []
+        for index in range(0, len(self.buckets) - 1, 2):
+            first, second = self.buckets[index], self.buckets[index + 1]
+            merged.append([first[0], first[1] + second[1], min(first[2], second[2]), max(first[3], second[3]),
+                           first[4] + second[4]])
+        if len(self.buckets) % 2:
+            merged.append(self.buckets[-1])
+        self.buckets = merged
+        self.width *= 2
+
+    def points(self):
+        # Listas (posições, mínimos, máximos, médias) prontas para plotar
+        positions = [bucket[0] for bucket in self.buckets]
+        minimums = [bucket[2] for bucket in self.buckets]
+        maximums = [bucket[3] for bucket in self.buckets]
+        means = [bucket[4] / bucket[1] for bucket in self.buckets]
+        return positions, minimums, maximums, means
+
+
+class MetricsRecorder:
+    # Séries gravadas: taxa de miss da janela, taxa de miss acumulada, transações de bus por
+    # instrução e ciclos por instrução (CPI)
+    SERIES = ("miss_rate", "cumulative_miss_rate", "bus_transactions", "cpi")
+
+    def __init__(self, metrics, window=100, max_buckets=1000, history=64):
+        self.metrics = metrics
+        self.window = max(1, window)
+        self.recent = {name: deque(maxlen=history) for name in self.SERIES}
+        self.series = {name: DecimatedSeries(max_buckets) for name in self.SERIES}
+        self.last = (0, 0, 0, 0)
+
+    def sample(self):
+        # Fecha a janela atual com as diferenças desde a última amostra; devolve se havia
+        # instruções novas (uma janela vazia não é gravada)
+        metrics = self.metrics
+        current = (metrics.total_instructions, metrics.cache_misses, metrics.bus_transactions, metrics.total_cycles)
+        instructions = current[0] - self.last[0]
+        if instructions <= 0:
+            return False
+        values = {
+            "miss_rate": (current[1] - self.last[1]) / instructions,
+            "cumulative_miss_rate": current[1] / current[0],
+            "bus_transactions": (current[2] - self.last[2]) / instructions,
+            "cpi": (current[3] - self.last[3]) / instructions,
+        }
+        for name, value in values.items():
+            self.recent[name].append((current[0], value))
+            self.series[name].add(current[0], value)
+        self.last = current
+        return True
+
+    def run(self, cpu, instructions):
+        # Executa as instruções na CPU amostrando a cada `window` instruções
+        instruction = cpu.bus.instruction
+        window = self.window
+        count = 0
+        for proc, r_w, addr, val in instructions:
+            instruction(proc, r_w, addr, val)
+            count += 1
+            if count == window:
+                self.sample()
+                count = 0
+        self.sample()
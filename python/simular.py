@@ -0,0 +1,84 @@
+import argparse
+import csv
+import json
+import os
+import sys
+
+from MOESIeMESIcomrelatorionofinal import CPU
+from cargas import WORKLOADS, make_workload
+from protocolos import PROTOCOLS
+
+# Execução em lote, sem perguntas: tudo vem das opções da linha de comando e as métricas
+# saem em JSON ou CSV (na saída padrão ou em arquivo). Gráficos são opcionais e gravados
+# em arquivo; matplotlib só é importado quando --grafico é usado. Sem --seed uma semente é
+# sorteada uma vez, então todos os protocolos rodam sobre a mesma carga, e ela sai nas métricas.
+
+
+def run(protocol, args, recorder_window=None):
+    options = dict(num_sets=args.conjuntos, ways=args.vias, memory_size=args.memoria, seed=args.seed,
+                   num_processors=args.nucleos, track_addresses=False)
+    if recorder_window:
+        # A série temporal da taxa de miss só é necessária para o gráfico de um protocolo
+        from MOESI_MESI_relatorioindividual import CPU as RecordingCPU
+        cpu = RecordingCPU(protocol, recorder_window, **options)
+    else:
+        cpu = CPU(protocol, **options)
+    cpu.run_simulation(make_workload(args.carga, args.n, args.nucleos, args.memoria, args.seed))
+    return cpu
+
+
+def write_json(file, results):
+    json.dump(results, file, indent=2)
+    file.write("\n")
+
+
+def write_csv(file, results):
+    # Uma linha por protocolo; o tráfego entra pelos totais (traffic_<campo>)
+    rows = []
+    for result in results:
+        metrics = dict(result["metrics"])
+        traffic = metrics.pop("traffic")
+        row = {"protocol": result["protocol"], **metrics}
+        row.update({f"traffic_{name}": value for name, value in traffic["totals"].items()})
+        rows.append(row)
+    writer = csv.DictWriter(file, fieldnames=list(rows[0]), lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa o simulador em lote e grava as métricas em JSON ou CSV")
+    parser.add_argument("--protocolo", nargs="+", default=["MESI"], choices=sorted(PROTOCOLS))
+    parser.add_argument("-n", type=int, default=10000, help="número de instruções")
+    parser.add_argument("--seed", type=int, help="semente comum a todos os protocolos (padrão: sorteada)")
+    parser.add_argument("--nucleos", type=int, default=4)
+    parser.add_argument("--memoria", type=int, default=4, help="número de blocos de memória")
+    parser.add_argument("--conjuntos", type=int, default=4)
+    parser.add_argument("--vias", type=int, default=2)
+    parser.add_argument("--carga", default="uniform", help=f"{'/'.join(WORKLOADS)} ou trace:<arquivo>")
+    parser.add_argument("--formato", choices=["json", "csv"], help="padrão: extensão de --saida, senão json")
+    parser.add_argument("--saida", default="-", help="arquivo de métricas (- para a saída padrão)")
+    parser.add_argument("--grafico", help="grava um gráfico (PNG, SVG, PDF...) da taxa de miss")
+    parser.add_argument("--janela", type=int, default=100, help="instruções por ponto do gráfico de um protocolo")
+    args = parser.parse_args()
+    if args.seed is None:
+        args.seed = int.from_bytes(os.urandom(4), "little")
+
+    output_format = args.formato or ("csv" if args.saida.endswith(".csv") else "json")
+    single_plot = args.grafico and len(args.protocolo) == 1
+    cpus = {protocol: run(protocol, args, args.janela if single_plot else None) for protocol in args.protocolo}
+    results = [{"protocol": protocol, "n": args.n, "seed": args.seed, "workload": args.carga,
+                "metrics": cpu.get_metrics(per_address=False)} for protocol, cpu in cpus.items()]
+
+    write = write_csv if output_format == "csv" else write_json
+    if args.saida == "-":
+        write(sys.stdout, results)
+    else:
+        with open(args.saida, "w", encoding="utf-8", newline="") as file:
+            write(file, results)
+
+    if single_plot:
+        cpus[args.protocolo[0]].plot_miss_rate(args.grafico)
+    elif args.grafico:
+        from graficos import plot_miss_rates
+        plot_miss_rates({result["protocol"]: result["metrics"] for result in results}, args.grafico)
@@ -0,0 +1,203 @@
+import argparse
+import heapq
+from collections import deque
+
+from MOESIeMESIcomrelatorionofinal import CPU, ACTION_BIT_NAMES
+from cargas import WORKLOADS, make_workload
+from protocolos import PROTOCOLS
+
+# Modelo temporizado por eventos discretos. Cada processador tem seu próprio relógio e
+# emite a próxima instrução quando termina a anterior; um escalonador (heap ordenado pelo
+# relógio) escolhe sempre o processador mais atrasado. O efeito funcional da instrução
+# (estados, valores e métricas) continua sendo o de Bus.instruction; o modelo só decide
+# quando ela acontece. O bus é um recurso compartilhado atômico: uma transação ocupa o bus
+# por um número de ciclos que depende do tipo, e quem pede o bus ocupado espera na fila
+# (ordem de chegada; empates pela ordem em que os processadores entraram no heap). A
+# latência vista pelo processador é o custo fixo do Metrics mais a espera na fila.
+#
+# O fluxo único é distribuído em filas por processador à medida que cada um precisa da sua
+# próxima instrução, guardando no máximo `lookahead` instruções por fila. Se a fila de
+# outro núcleo enche antes de aparecer uma instrução do processador que pediu, ele espera
+# (sem avançar o relógio próprio) até aquela fila cair à metade; assim um trace
+# desbalanceado (ex.: tudo no núcleo 0) nunca fica inteiro na memória.
+
+# Ciclos de ocupação do bus por tipo de transação (nomes de describe_actions)
+DEFAULT_OCCUPANCY = {
+    "BusRd": 10,  # Endereço + transferência da linha
+    "BusRdX": 10,
+    "BusUpgr": 2,  # Só o endereço
+    "BusUpd": 4,  # Endereço + palavra
+    "Flush": 10,  # Linha suja escrita na memória ao responder um snoop
+    "WB": 10,  # Write-back de uma linha substituída
+}
+
+
+class BusArbiter:
+    def __init__(self, occupancy=None):
+        occupancy = dict(DEFAULT_OCCUPANCY, **(occupancy or {}))
+        for name in occupancy:
+            if name not in DEFAULT_OCCUPANCY:
+                raise ValueError(f"Tipo de transação desconhecido: {name}")
+        self.occupancy = occupancy
+        # Ocupação de cada combinação de bits de last_bus_action, calculada uma vez
+        self.cycles = [sum(occupancy[name] for bit, name in ACTION_BIT_NAMES if actions & bit)
+                       for actions in range(1 << len(ACTION_BIT_NAMES))]
+        self.free_at = 0  # Ciclo em que o bus fica livre
+        self.busy_cycles = 0
+        self.grants = 0
+        self.queue_cycles = 0  # Soma das esperas pelo bus
+        self.max_queue = 0
+
+    def request(self, time, actions):
+        # Concede o bus para uma transação pedida em `time`. Retorna a espera na fila.
+        start = time if time > self.free_at else self.free_at
+        occupancy = self.cycles[actions]
+        self.free_at = start + occupancy
+        self.busy_cycles += occupancy
+        self.grants += 1
+        wait = start - time
+        if wait:
+            self.queue_cycles += wait
+            if wait > self.max_queue:
+                self.max_queue = wait
+        return wait
+
+
+class TimedSimulation:
+    def __init__(self, cpu, occupancy=None, lookahead=4096):
+        if lookahead < 1:
+            raise ValueError("lookahead deve ser pelo menos 1")
+        self.cpu = cpu
+        self.arbiter = BusArbiter(occupancy)
+        self.lookahead = lookahead
+        self.queues = [deque() for _ in cpu.processors]  # Instruções ainda não emitidas de cada processador
+        self.waiting = [[] for _ in cpu.processors]  # Processadores esperando a fila de cada núcleo esvaziar
+        self.instructions = [0] * len(cpu.processors)
+        self.lookahead_waits = 0
+
+    def _refill(self, stream, proc):
+        # Distribui o fluxo entre as filas até o processador `proc` ter uma instrução. Retorna
+        # o núcleo cuja fila encheu antes disso, ou None (instrução encontrada ou fim do fluxo).
+        queues = self.queues
+        limit = self.lookahead
+        for instruction in stream:
+            target = instruction[0]
+            queue = queues[target]
+            queue.append(instruction)
+            if target == proc:
+                return None
+            if len(queue) >= limit:
+                return target
+        return None
+
+    def run(self, instructions):
+        cpu = self.cpu
+        bus = cpu.bus
+        metrics = bus.metrics
+        processors = cpu.processors
+        queues = self.queues
+        waiting = self.waiting
+        resume = self.lookahead // 2
+        counts = self.instructions
+        arbiter = self.arbiter
+        stream = iter(instructions)
+        # Custo de um hit: o que passar disso (memória, bus, fila) é tempo parado
+        hit = metrics.compute_cost + metrics.cache_access_cycles
+
+        order = 0
+        heap = []
+        for processor in processors:
+            heap.append((processor.clock, order, processor.processor_number))
+            order += 1
+        heapq.heapify(heap)
+        while heap:
+            clock, _, proc = heapq.heappop(heap)
+            queue = queues[proc]
+            if not queue:
+                blocker = self._refill(stream, proc)
+                if not queue:
+                    if blocker is not None:
+                        waiting[blocker].append(proc)
+                        self.lookahead_waits += 1
+                    continue  # Sem blocker o processador terminou suas instruções
+            _, r_w, addr, val = queue.popleft()
+            if waiting[proc] and len(queue) <= resume:
+                # A fila esvaziou o bastante: quem esperava por ela volta a partir de agora
+                for other in waiting[proc]:
+                    heapq.heappush(heap, (clock, order, other))
+                    order += 1
+                waiting[proc].clear()
+            before = metrics.total_cycles
+            bus.instruction(proc, r_w, addr, val)
+            latency = metrics.compute_cost + metrics.total_cycles - before
+            actions = bus.last_bus_action
+            if actions:
+                latency += arbiter.request(clock, actions)
+            processor = processors[proc]
+            processor.clock = clock + latency
+            if latency > hit:
+                processor.stall_cycles += latency - hit
+            counts[proc] += 1
+            heapq.heappush(heap, (processor.clock, order, proc))
+            order += 1
+
+    def report(self):
+        processors = self.cpu.processors
+        arbiter = self.arbiter
+        makespan = max(processor.clock for processor in processors)
+        instructions = sum(self.instructions)
+        return {
+            "cycles": makespan,
+            "instructions": instructions,
+            "ipc": instructions / makespan if makespan else 0,
+            "bus_busy_cycles": arbiter.busy_cycles,
+            "bus_utilization": arbiter.busy_cycles / makespan if makespan else 0,
+            "bus_grants": arbiter.grants,
+            "queue_cycles": arbiter.queue_cycles,
+            "mean_queue_delay": arbiter.queue_cycles / arbiter.grants if arbiter.grants else 0,
+            "max_queue_delay": arbiter.max_queue,
+            "lookahead_waits": self.lookahead_waits,
+            "cores": [{"processor": processor.processor_number, "cycles": processor.clock,
+                       "instructions": count, "stall_cycles": processor.stall_cycles}
+                      for processor, count in zip(processors, self.instructions)],
+        }
+
+
+def print_timing(report):
+    print("\nModelo temporizado")
+    print("=" * 30)
+    print(f"Ciclos (último núcleo a terminar): {report['cycles']}")
+    print(f"Instruções por ciclo: {report['ipc']:.3f}")
+    print(f"Utilização do bus: {report['bus_utilization']:.2%} ({report['bus_busy_cycles']} ciclos)")
+    print(f"Espera média pelo bus: {report['mean_queue_delay']:.2f} ciclos (máxima: {report['max_queue_delay']})")
+    for core in report["cores"]:
+        print(f"Processador {core['processor']}: {core['instructions']} instruções, {core['cycles']} ciclos, "
+              f"{core['stall_cycles']} parado")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulação temporizada com disputa pelo bus")
+    parser.add_argument("-n", type=int, default=10000, help="número de instruções")
+    parser.add_argument("--protocolo", default="MESI", choices=sorted(PROTOCOLS))
+    parser.add_argument("--nucleos", type=int, default=4)
+    parser.add_argument("--memoria", type=int, default=4, help="número de blocos de memória")
+    parser.add_argument("--conjuntos", type=int, default=4)
+    parser.add_argument("--vias", type=int, default=2)
+    parser.add_argument("--carga", default="uniform", help=f"{'/'.join(WORKLOADS)} ou trace:<arquivo>")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--antecipacao", type=int, default=4096,
+                        help="instruções guardadas por núcleo à frente do fluxo")
+    parser.add_argument("--ocupacao", nargs="+", default=[], metavar="TIPO=CICLOS",
+                        help=f"ocupação do bus por transação ({', '.join(DEFAULT_OCCUPANCY)})")
+    args = parser.parse_args()
+
+    occupancy = {}
+    for item in args.ocupacao:
+        name, _, cycles = item.partition("=")
+        occupancy[name] = int(cycles)
+    cpu = CPU(args.protocolo, args.conjuntos, args.vias, memory_size=args.memoria, seed=args.seed,
+              num_processors=args.nucleos)
+    simulation = TimedSimulation(cpu, occupancy, args.antecipacao)
+    simulation.run(make_workload(args.carga, args.n, args.nucleos, args.memoria, args.seed))
+    cpu.print_final_metrics()
+    print_timing(simulation.report())
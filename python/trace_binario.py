@@ -0,0 +1,208 @@
+import argparse
+import mmap
+import struct
+
+from MOESIeMESIcomrelatorionofinal import CPU, uniform_instructions
+from protocolos import PROTOCOLS
+
+# Formato binário de trace: um cabeçalho fixo de 72 bytes seguido de registros de
+# largura fixa (processador, r_w, endereço, valor), todos little-endian.
+#
+# Cabeçalho: magic, versão, número de núcleos, largura do endereço em bytes (4 ou 8),
+# flags (bit 0: semente presente), semente, número de registros, número de blocos de
+# memória (0 se desconhecido), nome do gerador. Traces da versão 1 (cabeçalho de 64
+# bytes, sem o tamanho da memória) continuam legíveis.
+MAGIC = b"MOESITRC"
+VERSION = 2
+HEADER = struct.Struct("<8sHHBBQQQ32s2x")
+HEADER_V1 = struct.Struct("<8sHHBBQQ32s2x")
+FLAG_SEED = 1
+RECORD_FORMATS = {4: "<HBxII", 8: "<HBxQI"}  # registros de 12 e 16 bytes
+
+DEFAULT_CHUNK = 65536  # Registros por bloco entregue ao simulador
+
+
+class TraceWriter:
+    def __init__(self, path, num_cores, address_width=4, seed=None, generator="", memory_size=None,
+                 buffer_records=DEFAULT_CHUNK):
+        if address_width not in RECORD_FORMATS:
+            raise ValueError(f"Largura de endereço inválida: {address_width} (use 4 ou 8)")
+        self.path = path
+        self.num_cores = num_cores
+        self.address_width = address_width
+        self.seed = seed
+        self.generator = generator
+        self.memory_size = memory_size
+        self.record = struct.Struct(RECORD_FORMATS[address_width])
+        self.buffer = bytearray()
+        self.buffer_bytes = buffer_records * self.record.size
+        self.count = 0
+        self.file = open(path, "wb")
+        self.file.write(self._header())
+
+    def _header(self):
+        flags = 0 if self.seed is None else FLAG_SEED
+        seed = 0 if self.seed is None else self.seed
+        return HEADER.pack(MAGIC, VERSION, self.num_cores, self.address_width, flags, seed,
+                           self.count, self.memory_size or 0, self.generator.encode()[:32])
+
+    def write(self, proc, r_w, address, value):
+        self.buffer += self.record.pack(proc, r_w, address, value)
+        self.count += 1
+        if len(self.buffer) >= self.buffer_bytes:
+            self.flush()
+
+    def write_many(self, instructions):
+        pack = self.record.pack
+        buffer = self.buffer
+        for proc, r_w, address, value in instructions:
+            buffer += pack(proc, r_w, address, value)
+            self.count += 1
+            if len(buffer) >= self.buffer_bytes:
+                self.flush()
+
+    def write_records(self, data):
+        # Registros já empacotados no formato do arquivo (ex.: arrays estruturados do NumPy)
+        if len(data) % self.record.size:
+            raise ValueError("Tamanho dos dados não é múltiplo do tamanho do registro")
+        self.flush()
+        self.file.write(data)
+        self.count += len(data) // self.record.size
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        # O número de registros só é conhecido no final: reescreve o cabeçalho
+        self.file.seek(0)
+        self.file.write(self._header())
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TraceReader:
+    # Lê o trace mapeando o arquivo em memória; os registros são decodificados bloco a
+    # bloco, então o uso de memória não depende do tamanho do trace
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER_V1.size:
+            self.close()
+            raise ValueError(f"{path}: arquivo menor que o cabeçalho do trace")
+        magic, version = struct.unpack_from("<8sH", self.map)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path}: não é um trace do simulador")
+        if version == 1:
+            self.header_size = HEADER_V1.size
+            magic, version, num_cores, address_width, flags, seed, count, generator = HEADER_V1.unpack_from(self.map)
+            memory_size = 0
+        elif version == VERSION and len(self.map) >= HEADER.size:
+            self.header_size = HEADER.size
+            (magic, version, num_cores, address_width, flags, seed, count, memory_size,
+             generator) = HEADER.unpack_from(self.map)
+        else:
+            self.close()
+            raise ValueError(f"{path}: versão de trace não suportada ({version})")
+        self.num_cores = num_cores
+        self.address_width = address_width
+        self.seed = seed if flags & FLAG_SEED else None
+        self.memory_size = memory_size or None
+        self.generator = generator.rstrip(b"\0").decode()
+        self.record = struct.Struct(RECORD_FORMATS[address_width])
+        # Um trace cujo escritor foi interrompido tem contagem 0 no cabeçalho:
+        # nesse caso vale o número de registros completos no arquivo
+        available = (len(self.map) - self.header_size) // self.record.size
+        self.count = min(count, available) if count else available
+
+    def __len__(self):
+        return self.count
+
+    def chunks(self, chunk_size=DEFAULT_CHUNK, start=0):
+        # Gera blocos de até chunk_size instruções a partir do registro start. As views do
+        # mmap são liberadas antes de cada yield, então close() funciona mesmo com um
+        # gerador suspenso (que falha se for retomado depois)
+        size = self.record.size
+        offset = self.header_size
+        for first in range(start, self.count, chunk_size):
+            last = min(first + chunk_size, self.count)
+            with memoryview(self.map) as view, view[offset + first * size:offset + last * size] as chunk:
+                records = list(self.record.iter_unpack(chunk))
+            yield records
+
+    def __iter__(self):
+        for chunk in self.chunks():
+            yield from chunk
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def save_instructions(path, instructions, num_cores, seed=None, generator="", address_width=4, memory_size=None):
+    with TraceWriter(path, num_cores, address_width, seed, generator, memory_size) as writer:
+        writer.write_many(instructions)
+    return writer.count
+
+
+def write_uniform_trace(path, n, num_cores=4, memory_size=4, seed=None):
+    # Gera o mesmo fluxo de CPU.generate_instructions direto para o arquivo, sem montar a lista
+    address_width = 4 if memory_size <= 2 ** 32 else 8
+    return save_instructions(path, uniform_instructions(n, num_cores, memory_size, seed),
+                             num_cores, seed, "uniform", address_width, memory_size)
+
+
+def run_trace(cpu, path, chunk_size=DEFAULT_CHUNK):
+    with TraceReader(path) as reader:
+        if reader.num_cores > len(cpu.processors):
+            raise ValueError(f"O trace usa {reader.num_cores} núcleos, mas a CPU tem {len(cpu.processors)}")
+        for chunk in reader.chunks(chunk_size):
+            cpu.run_simulation(chunk)
+        return reader.count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera e executa traces binários do simulador MESI/MOESI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("gerar", help="gera um trace uniforme")
+    generate.add_argument("arquivo")
+    generate.add_argument("-n", type=int, required=True, help="número de instruções")
+    generate.add_argument("--nucleos", type=int, default=4)
+    generate.add_argument("--memoria", type=int, default=4, help="número de blocos de memória")
+    generate.add_argument("--seed", type=int)
+
+    run = commands.add_parser("executar", help="executa um trace")
+    run.add_argument("arquivo")
+    run.add_argument("--protocolo", default="MESI", choices=sorted(PROTOCOLS))
+    run.add_argument("--memoria", type=int, help="número de blocos de memória (padrão: o gravado no trace)")
+
+    args = parser.parse_args()
+    if args.command == "gerar":
+        total = write_uniform_trace(args.arquivo, args.n, args.nucleos, args.memoria, args.seed)
+        print(f"{total} instruções escritas em {args.arquivo}")
+    else:
+        with TraceReader(args.arquivo) as reader:
+            num_cores = reader.num_cores
+            memory_size = args.memoria or reader.memory_size
+        if memory_size is None:
+            parser.error("o trace não registra o tamanho da memória; informe --memoria")
+        cpu = CPU(args.protocolo, memory_size=memory_size, num_processors=num_cores)
+        run_trace(cpu, args.arquivo)
+        cpu.print_final_metrics()
@@ -0,0 +1,214 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from MOESIeMESIcomrelatorionofinal import CPU, COST_FIELDS
+from cache_resultados import ResultCache
+from cargas import make_workload
+from protocolos import PROTOCOLS
+
+# Varredura de parâmetros: cada ponto da grade é uma simulação independente, executada
+# em um pool de processos. Os resultados são devolvidos (e gravados) à medida que terminam.
+
+# Parâmetros de um ponto e seus valores padrão
+DEFAULTS = {
+    "protocol": "MESI",
+    "num_processors": 4,
+    "memory_size": 4,
+    "num_sets": 4,
+    "ways": 2,
+    "replacement": "LRU",
+    "coherence": "broadcast",
+    "workload": "uniform",
+    "n": 10000,
+    "seed": 0,
+}
+
+
+def expand_grid(grid):
+    # {"protocol": ["MESI", "MOESI"], "seed": [0, 1]} -> lista com um dict por combinação.
+    # Custos do Metrics (ex.: "memory_access_cycles") vão para config["costs"].
+    for name in grid:
+        if name not in DEFAULTS and name not in COST_FIELDS:
+            raise ValueError(f"Parâmetro de varredura desconhecido: {name}")
+    names = list(grid)
+    points = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        config = dict(DEFAULTS)
+        config["costs"] = {}
+        for name, value in zip(names, values):
+            if name in COST_FIELDS:
+                config["costs"][name] = value
+            else:
+                config[name] = value
+        points.append(config)
+    return points
+
+
+def build_cpu(config):
+    # O tráfego por endereço não entra nos resultados da varredura: o rastreio fica desligado
+    return CPU(config["protocol"], config["num_sets"], config["ways"], config["replacement"],
+               config["memory_size"], config["seed"], config["num_processors"], config["coherence"],
+               config.get("costs"), track_addresses=False)
+
+
+def run_point(config):
+    # Executa um ponto da varredura (roda dentro do processo trabalhador)
+    start = time.perf_counter()
+    cpu = build_cpu(config)
+    cpu.run_simulation(make_workload(config["workload"], config["n"], config["num_processors"],
+                                     config["memory_size"], config["seed"]))
+    return {"config": config, "metrics": cpu.get_metrics(per_address=False), "elapsed": time.perf_counter() - start}
+
+
+def _key(config):
+    return json.dumps(config, sort_keys=True)
+
+
+def load_results(path):
+    # Resultados já gravados por uma varredura anterior (linhas incompletas são ignoradas)
+    results = []
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    results.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass
+    return results
+
+
+def _result(future, config):
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        raise
+    except Exception as error:
+        return {"config": config, "error": f"{type(error).__name__}: {error}"}
+
+
+def _run_isolated(configs, workers):
+    # Cada ponto roda em um pool próprio de um processo: se ele derrubar o trabalhador,
+    # não leva os outros pontos junto
+    for first in range(0, len(configs), workers):
+        batch = configs[first:first + workers]
+        pools = [ProcessPoolExecutor(max_workers=1) for _ in batch]
+        futures = [pool.submit(run_point, config) for pool, config in zip(pools, batch)]
+        for pool, future, config in zip(pools, futures, batch):
+            try:
+                yield _result(future, config)
+            except BrokenProcessPool:
+                yield {"config": config, "error": "BrokenProcessPool: o processo trabalhador morreu"}
+            pool.shutdown()
+
+
+def run_sweep(points, workers=None, output=None, cache=None):
+    # Gera os resultados na ordem em que terminam. Com `output`, cada resultado é anexado
+    # a um arquivo JSON Lines assim que chega, e pontos já presentes no arquivo são pulados.
+    # Se um trabalhador morre, os resultados já recebidos são mantidos e os pontos que
+    # estavam pendentes são refeitos isoladamente, um processo por ponto. Com `cache`
+    # (cache_resultados.ResultCache), pontos já calculados antes vêm do cache, marcados
+    # com "cached", e só os demais vão para o pool.
+    workers = workers or os.cpu_count()
+    done = {_key(result["config"]) for result in load_results(output) if "metrics" in result}
+    pending = [config for config in points if _key(config) not in done]
+    crashed = []
+    log = open(output, "a", encoding="utf-8") if output else None
+
+    def record(result):
+        if cache is not None and "metrics" in result and not result.get("cached"):
+            cache.put(result["config"], result)
+        if log:
+            log.write(json.dumps(result) + "\n")
+            log.flush()
+        return result
+
+    try:
+        if cache is not None:
+            missing = []
+            for config in pending:
+                result = cache.get(config)
+                if result is None:
+                    missing.append(config)
+                else:
+                    yield record(dict(result, config=config, cached=True))
+            pending = missing
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_point, config): config for config in pending}
+            for future in as_completed(futures):
+                config = futures[future]
+                try:
+                    yield record(_result(future, config))
+                except BrokenProcessPool:
+                    crashed.append(config)
+        for result in _run_isolated(crashed, workers):
+            yield record(result)
+    finally:
+        if log:
+            log.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Varredura paralela de parâmetros do simulador MESI/MOESI")
+    parser.add_argument("--protocolos", nargs="+", default=["MESI", "MOESI"], choices=sorted(PROTOCOLS))
+    parser.add_argument("--nucleos", nargs="+", type=int, default=[DEFAULTS["num_processors"]])
+    parser.add_argument("--memoria", nargs="+", type=int, default=[DEFAULTS["memory_size"]],
+                        help="número de blocos de memória")
+    parser.add_argument("--conjuntos", nargs="+", type=int, default=[DEFAULTS["num_sets"]])
+    parser.add_argument("--vias", nargs="+", type=int, default=[DEFAULTS["ways"]])
+    parser.add_argument("--substituicao", nargs="+", default=[DEFAULTS["replacement"]])
+    parser.add_argument("--coerencia", nargs="+", default=[DEFAULTS["coherence"]])
+    parser.add_argument("--carga", nargs="+", default=[DEFAULTS["workload"]],
+                        help="nome da carga ou trace:<arquivo>")
+    parser.add_argument("--seeds", nargs="+", type=int, default=[DEFAULTS["seed"]])
+    parser.add_argument("-n", type=int, default=DEFAULTS["n"], help="instruções por simulação")
+    parser.add_argument("--ciclos-memoria", nargs="+", type=int)
+    parser.add_argument("--ciclos-cache", nargs="+", type=int)
+    parser.add_argument("--ciclos-bus", nargs="+", type=int)
+    parser.add_argument("--custo-computacao", nargs="+", type=int)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--saida", default="varredura.jsonl", help="arquivo JSON Lines com os resultados")
+    parser.add_argument("--cache", help="banco SQLite de resultados já calculados (cache_resultados.py)")
+    parser.add_argument("--cache-max-mb", type=float, default=256)
+    args = parser.parse_args()
+
+    grid = {
+        "protocol": args.protocolos,
+        "num_processors": args.nucleos,
+        "memory_size": args.memoria,
+        "num_sets": args.conjuntos,
+        "ways": args.vias,
+        "replacement": args.substituicao,
+        "coherence": args.coerencia,
+        "workload": args.carga,
+        "seed": args.seeds,
+        "n": [args.n],
+    }
+    for name, values in [("memory_access_cycles", args.ciclos_memoria), ("cache_access_cycles", args.ciclos_cache),
+                         ("bus_cycles", args.ciclos_bus), ("compute_cost", args.custo_computacao)]:
+        if values:
+            grid[name] = values
+
+    points = expand_grid(grid)
+    print(f"{len(points)} pontos, {args.workers} processos, resultados em {args.saida}")
+    cache = ResultCache(args.cache, int(args.cache_max_mb * 1024 * 1024)) if args.cache else None
+    start = time.perf_counter()
+    for count, result in enumerate(run_sweep(points, args.workers, args.saida, cache), 1):
+        config = result["config"]
+        if "error" in result:
+            status = f"ERRO {result['error']}"
+        else:
+            status = f"miss rate {result['metrics']['miss_rate']:.2%}, ciclos {result['metrics']['total_cycles']}"
+            if result.get("cached"):
+                status += " (cache)"
+        print(f"[{count}] {config['protocol']} nucleos={config['num_processors']} "
+              f"cache={config['num_sets']}x{config['ways']} seed={config['seed']}: {status}")
+    print(f"Concluído em {time.perf_counter() - start:.1f}s")
+    if cache:
+        print(f"Cache: {cache.hits} reaproveitados, {cache.misses} calculados, "
+              f"{cache.bypassed} sem semente (fora do cache)")
+        cache.close()